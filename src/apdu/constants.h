@@ -24,9 +24,24 @@
 #define P2_NO_CHAINCODE 0x00
 #define P2_CHAINCODE    0x01
 #define P1_MASK_ORDER   0x01u
+#define P1_MASK_OFFSET  0x02u
 #define P1_MASK_MORE    0x80u
 #define P2_SECP256K1    0x40u
 #define P2_ED25519      0x80u
+#define P2_COMPRESSED   0x01u
+
+// GET_VERSION parameters
+#define P1_VERSION        0x00  // version only
+#define P1_VERSION_LIMITS 0x01  // version, then the limits of the device
+
+// COSIGN_BATCH parameters
+#define P1_COSIGN_NEXT 0x02  // next cosignatures of an approved batch
+
+// GET_VERSION capability flags
+#define CAPABILITY_STREAMED_AGGREGATES 0x01  // aggregates are not limited by MAX_RAW_TX
+#define CAPABILITY_RESUMABLE_SIGNING   0x02  // sign packets can carry their offset (P1_MASK_OFFSET)
+#define CAPABILITY_COSIGN_BATCH        0x04  // COSIGN_BATCH is supported
+#define CAPABILITY_COMPRESSED_UPLOAD   0x08  // sign requests can use references (P2_COMPRESSED)
 
 #define OFFSET_CLA   0  // Offset of instruction class
 #define OFFSET_INS   1  // Offset of instruction code
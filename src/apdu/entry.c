@@ -20,6 +20,8 @@
 #include "messages/get_public_key.h"
 #include "messages/sign_transaction.h"
 #include "messages/get_app_configuration.h"
+#include "messages/cosign_batch.h"
+#include "messages/get_profile.h"
 
 unsigned char lastINS = 0;
 
@@ -41,13 +43,27 @@ int handle_apdu(const ApduCommand_t* cmd) {
             return handle_public_key(cmd);
         }
 
+        case GET_PUBLIC_KEY_RANGE: {
+            return handle_public_key_range(cmd);
+        }
+
         case SIGN_TX: {
             return handle_sign(cmd);
         }
 
+        case COSIGN_BATCH: {
+            return handle_cosign_batch(cmd);
+        }
+
         case GET_VERSION: {
-            return handle_app_configuration();
+            return handle_app_configuration(cmd);
+        }
+
+#ifdef HAVE_PROFILING
+        case GET_PROFILE: {
+            return handle_profile(cmd);
         }
+#endif
 
         default: {
             return handle_error(TRANSACTION_REJECTED);
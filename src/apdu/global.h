@@ -33,13 +33,33 @@ typedef enum {
     IDLE,
     WAITING_FOR_MORE,
     PENDING_REVIEW,
+    SENDING_SIGNATURES,  ///< cosignatures of an approved batch are being sent
 } sign_state_e;
 
+typedef enum {
+    TXN_HEADER,      ///< waiting for the transaction header
+    TXN_BUFFERED,    ///< transaction is buffered, and parsed with its last chunk
+    TXN_INNER_TXNS,  ///< aggregate inner transactions are parsed as they are received
+    TXN_TRAILER,     ///< aggregate payload is parsed, remaining data is dropped
+} txn_parse_state_e;
+
 typedef struct {
     uint8_t pathLength;
     uint32_t bip32Path[MAX_BIP32_PATH];
     uint8_t rawTx[MAX_RAW_TX];
-    uint32_t rawTxLength;
+    uint32_t rawTxLength;     ///< bytes stored in rawTx
+    uint32_t signDataLength;  ///< bytes to sign, from the start of rawTx
+    uint32_t parsedLength;    ///< rawTx bytes already parsed: aggregate header and field data
+    uint32_t payloadSize;     ///< aggregate payload size
+    uint32_t payloadOffset;   ///< aggregate payload bytes already parsed
+    uint32_t innerTxSize;     ///< sum of the sizes of the parsed inner transactions
+    uint32_t receivedLength;  ///< transaction bytes received, acknowledged to resume uploads
+    uint8_t parseState;       ///< one of txn_parse_state_e
+    uint8_t signedCount;      ///< cosignatures of an approved batch already sent
+    uint8_t compressed;       ///< whether the transaction is uploaded with references
+    uint8_t nextReference;    ///< index of the next value defined by a compressed upload
+    uint8_t referenceLengths[MAX_UPLOAD_REFERENCES];
+    uint8_t references[MAX_UPLOAD_REFERENCES][MAX_UPLOAD_REFERENCE_LEN];
     uint8_t curve;
 } transaction_context_t;
 
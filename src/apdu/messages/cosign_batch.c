@@ -0,0 +1,219 @@
+/*******************************************************************************
+ *    DHP Wallet
+ *    (c) 2023 dHealth
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *      http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ ********************************************************************************/
+#include "cosign_batch.h"
+#include <os.h>
+#include "global.h"
+#include "sign_transaction.h"
+#include "ui/main/idle_menu.h"
+#include "ui/transaction/review_menu.h"
+#include "transaction/transaction.h"
+#include "printers.h"
+#include "io.h"
+#include "crypto.h"
+#include "profile.h"
+
+// rawTx: number of hashes (1) || hashes (32 each)
+#define COSIGN_BATCH_COUNT_LENGTH 1
+
+static ApduResponse_t send_cosignatures(void) {
+    const uint8_t count = transactionContext.rawTx[0];
+    uint8_t signatures = count - transactionContext.signedCount;
+    if (signatures > COSIGNATURES_PER_RESPONSE) {
+        signatures = COSIGNATURES_PER_RESPONSE;
+    }
+
+    cx_ecfp_private_key_t privateKey;
+    unsigned char response[COSIGNATURES_PER_RESPONSE * DHP_SIGNATURE_LENGTH];
+
+    io_seproxyhal_io_heartbeat();
+
+    BEGIN_TRY {
+        TRY {
+            crypto_derive_private_key(transactionContext.bip32Path,
+                                      transactionContext.pathLength,
+                                      transactionContext.curve,
+                                      &privateKey);
+            io_seproxyhal_io_heartbeat();
+
+            for (uint8_t i = 0; i < signatures; i++) {
+                const uint8_t* hash =
+                    transactionContext.rawTx + COSIGN_BATCH_COUNT_LENGTH +
+                    (transactionContext.signedCount + i) * DHP_TRANSACTION_HASH_LENGTH;
+                int r = cx_eddsa_sign_no_throw(&privateKey,
+                                               CX_SHA512,
+                                               hash,
+                                               DHP_TRANSACTION_HASH_LENGTH,
+                                               response + i * DHP_SIGNATURE_LENGTH,
+                                               DHP_SIGNATURE_LENGTH);
+                if (r != CX_OK) {
+                    THROW(r);
+                }
+                profile_count(PROFILE_SIGN, DHP_TRANSACTION_HASH_LENGTH);
+            }
+        }
+        CATCH_OTHER(e) {
+            reset_transaction_context();
+            THROW(e);
+        }
+        FINALLY {
+            explicit_bzero(&privateKey, sizeof(privateKey));
+        }
+    }
+    END_TRY;
+
+    // Reset transaction context once all the cosignatures have been sent
+    transactionContext.signedCount += signatures;
+    if (transactionContext.signedCount == count) {
+        reset_transaction_context();
+    }
+
+    buffer_t buffer = {response, (size_t) signatures * DHP_SIGNATURE_LENGTH, 0};
+    const int succ = io_send_response(&buffer, OK);
+    explicit_bzero(response, sizeof(response));
+    return ((succ != -1) ? OK : INTERNAL_ERROR);
+}
+
+static void cosign_batch() {
+    if (signState != PENDING_REVIEW) {
+        reset_transaction_context();
+        display_idle_menu();
+        return;
+    }
+
+    signState = SENDING_SIGNATURES;
+    const ApduResponse_t result = send_cosignatures();
+    if (OK != result) {
+        handle_error(result);
+    }
+
+    display_review_done(OK == result);
+}
+
+static void reject_cosign_batch() {
+    if (signState != PENDING_REVIEW) {
+        reset_transaction_context();
+        display_idle_menu();
+        return;
+    }
+
+    // notify of rejected transactions
+    handle_error(TRANSACTION_REJECTED);
+
+    display_review_done(false);
+}
+
+static ApduResponse_t handle_cosign_batch_content(const uint8_t* data,
+                                                  size_t length,
+                                                  bool lastPacket) {
+    if (transactionContext.rawTxLength + length >
+        COSIGN_BATCH_COUNT_LENGTH + MAX_COSIGN_BATCH * DHP_TRANSACTION_HASH_LENGTH) {
+        return SIGNING_DATA_TOO_LARGE;
+    }
+    memcpy(transactionContext.rawTx + transactionContext.rawTxLength, data, length);
+    transactionContext.rawTxLength += length;
+
+    if (!lastPacket) {
+        // Reply to sender with status OK, so that next packet is sent
+        signState = WAITING_FOR_MORE;
+        const int succ = io_send_response(NULL, OK);
+        return ((succ != -1) ? OK : INTERNAL_ERROR);
+    }
+
+    buffer_t rawTxData = {transactionContext.rawTx, transactionContext.rawTxLength, 0};
+    switch (parse_cosign_batch(&rawTxData, &fields)) {
+        case E_TOO_MANY_FIELDS: {
+            return TOO_MANY_TRANSACTION_FIELDS;
+        }
+        case E_NOT_ENOUGH_DATA:
+        case E_INVALID_DATA: {
+            return INVALID_SIGNING_DATA;
+        }
+        default:  // E_SUCCESS
+            break;
+    }
+    profile_count(PROFILE_PARSE, transactionContext.rawTxLength);
+    profile_track(fields.numFields, transactionContext.rawTxLength);
+
+    // All hashes received, present them to user
+    signState = PENDING_REVIEW;
+    review_transaction(&fields, cosign_batch, reject_cosign_batch);
+    return OK;
+}
+
+static ApduResponse_t handle_first_cosign_packet(const ApduCommand_t* cmd) {
+    if ((cmd->p1 & P1_MASK_ORDER) != 0) {
+        return INVALID_SIGNING_PACKET_ORDER;
+    }
+
+    // Reset old transaction data that might still remain
+    reset_transaction_context();
+    profile_begin();
+
+    // transaction hashes are cosigned with ED25519
+    if (cmd->p2 != P2_ED25519) {
+        return INVALID_P1_OR_P2;
+    }
+    transactionContext.curve = CURVE_Ed25519;
+
+    // convert apdu data to bip32 path
+    const buffer_t buffer = {cmd->data, cmd->lc, 0};
+    transactionContext.pathLength = buffer_get_bip32_path(&buffer, transactionContext.bip32Path);
+    if (0 == transactionContext.pathLength) {
+        return INVALID_BIP32_PATH_LENGTH;
+    }
+
+    const size_t bip32PathSize = transactionContext.pathLength * 4 + 1;
+    return handle_cosign_batch_content(&cmd->data[bip32PathSize],
+                                       cmd->lc - bip32PathSize,
+                                       (cmd->p1 & P1_MASK_MORE) == 0);
+}
+
+int handle_cosign_batch(const ApduCommand_t* cmd) {
+    ApduResponse_t result;
+
+    switch (signState) {
+        case IDLE: {
+            result = handle_first_cosign_packet(cmd);
+            break;
+        }
+        case WAITING_FOR_MORE: {
+            if ((cmd->p1 & P1_MASK_ORDER) == 0) {
+                result = INVALID_SIGNING_PACKET_ORDER;
+                break;
+            }
+            result = handle_cosign_batch_content(cmd->data, cmd->lc, (cmd->p1 & P1_MASK_MORE) == 0);
+            break;
+        }
+        case SENDING_SIGNATURES: {
+            if (cmd->p1 != P1_COSIGN_NEXT) {
+                result = INVALID_SIGNING_PACKET_ORDER;
+                break;
+            }
+            result = send_cosignatures();
+            break;
+        }
+        default: {
+            THROW(INVALID_INTERNAL_SIGNING_STATE);
+        }
+    }
+
+    if (OK != result) {
+        return handle_error(result);
+    }
+
+    return 0;
+}
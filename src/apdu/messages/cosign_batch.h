@@ -0,0 +1,53 @@
+/*******************************************************************************
+ *    DHP Wallet
+ *    (c) 2023 dHealth
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *      http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ ********************************************************************************/
+#ifndef LEDGER_APP_DHP_COSIGNBATCH_H
+#define LEDGER_APP_DHP_COSIGNBATCH_H
+
+#include <stdint.h>
+#include "limitations.h"
+#include "dhp/dhp_helpers.h"
+#include "types.h"
+
+// Transactions of a batch: each hash is a field of the review, after the number of hashes,
+// and the number of hashes and the hashes are stored in rawTx
+#define MAX_COSIGN_BATCH_FIELDS  (MAX_FIELD_COUNT - 1)
+#define MAX_COSIGN_BATCH_STORAGE ((MAX_RAW_TX - 1) / DHP_TRANSACTION_HASH_LENGTH)
+#define MAX_COSIGN_BATCH                                                          \
+    (MAX_COSIGN_BATCH_FIELDS < MAX_COSIGN_BATCH_STORAGE ? MAX_COSIGN_BATCH_FIELDS \
+                                                        : MAX_COSIGN_BATCH_STORAGE)
+
+// Cosignatures sent in each response, within the 255 bytes of a short response
+#define COSIGNATURES_PER_RESPONSE 3
+
+/**
+ * Processes a COSIGN_BATCH APDU command: cosigns the hashes of many aggregate bonded
+ * transactions, after a single review of all of them.
+ *
+ * The command data is the BIP32 path, then the number of hashes (1 byte), then the hashes
+ * (32 bytes each), split in packets as for SIGN_TX (P1_MASK_ORDER, P1_MASK_MORE). Once the
+ * batch is approved, the last packet is answered with the first COSIGNATURES_PER_RESPONSE
+ * cosignatures, and each command with P1_COSIGN_NEXT is answered with the next ones.
+ *
+ * @param[in] cmd
+ *   Structured APDU command (CLA, INS, P1, P2, Lc, Command data).
+ *
+ * @return zero or positive integer if success, negative integer otherwise.
+ *
+ */
+int handle_cosign_batch(const ApduCommand_t* cmd);
+
+#endif  // LEDGER_APP_DHP_COSIGNBATCH_H
@@ -19,17 +19,54 @@
 #include <os.h>
 #include "io.h"
 #include "types.h"
+#include "apdu/global.h"
+#include "cosign_batch.h"
+
+#define VERSION_LENGTH        4
+#define VERSION_LIMITS_LENGTH (VERSION_LENGTH + 9)
 
 /*
  * LEDGER_MAJOR_VERSION, LEDGER_MINOR_VERSION, LEDGER_PATCH_VERSION defined in Makefile
+ *
+ * With P1_VERSION_LIMITS, the version is followed by:
+ *   MAX_RAW_TX (2, big endian) ||
+ *   MAX_FIELD_COUNT (1) ||
+ *   MAX_FIELD_LEN (2, big endian) ||
+ *   maximum APDU command data length (1) ||
+ *   capability flags (1) ||
+ *   maximum number of transactions of a COSIGN_BATCH (1) ||
+ *   values a compressed sign request can refer to (1)
  */
-int handle_app_configuration() {
-    unsigned char data[4];
+int handle_app_configuration(const ApduCommand_t* cmd) {
+    if ((cmd->p1 != P1_VERSION) && (cmd->p1 != P1_VERSION_LIMITS)) {
+        return handle_error(INVALID_P1_OR_P2);
+    }
+
+    unsigned char data[VERSION_LIMITS_LENGTH];
     data[0] = 0x00;
     data[1] = LEDGER_MAJOR_VERSION;
     data[2] = LEDGER_MINOR_VERSION;
     data[3] = LEDGER_PATCH_VERSION;
 
-    buffer_t buffer = {data, 4, 0};
+    if (cmd->p1 == P1_VERSION) {
+        buffer_t buffer = {data, VERSION_LENGTH, 0};
+        return io_send_response(&buffer, OK);
+    }
+
+    // command data length is a single byte
+    const size_t maxDataLength = IO_APDU_BUFFER_SIZE - OFFSET_CDATA;
+
+    data[4] = (MAX_RAW_TX >> 8) & 0xFF;
+    data[5] = MAX_RAW_TX & 0xFF;
+    data[6] = MAX_FIELD_COUNT;
+    data[7] = (MAX_FIELD_LEN >> 8) & 0xFF;
+    data[8] = MAX_FIELD_LEN & 0xFF;
+    data[9] = maxDataLength > 0xFF ? 0xFF : maxDataLength;
+    data[10] = CAPABILITY_STREAMED_AGGREGATES | CAPABILITY_RESUMABLE_SIGNING |
+               CAPABILITY_COSIGN_BATCH | CAPABILITY_COMPRESSED_UPLOAD;
+    data[11] = MAX_COSIGN_BATCH;
+    data[12] = MAX_UPLOAD_REFERENCES;
+
+    buffer_t buffer = {data, VERSION_LIMITS_LENGTH, 0};
     return io_send_response(&buffer, OK);
 }
@@ -19,7 +19,13 @@
 #define LEDGER_APP_DHP_GETAPPCONFIGURATION_H
 
 #include <stdint.h>
+#include "types.h"
 
-int handle_app_configuration();
+/**
+ * Sends the version of the application and, with P1_VERSION_LIMITS, the limits of the device.
+ *
+ * @param[in] cmd  APDU command
+ */
+int handle_app_configuration(const ApduCommand_t* cmd);
 
 #endif  // LEDGER_APP_DHP_GETAPPCONFIGURATION_H
\ No newline at end of file
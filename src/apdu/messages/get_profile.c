@@ -0,0 +1,59 @@
+/*******************************************************************************
+ *    DHP Wallet
+ *    (c) 2023 dHealth
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *      http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ ********************************************************************************/
+#include "get_profile.h"
+
+#ifdef HAVE_PROFILING
+#include <os.h>
+#include "io.h"
+#include "apdu/global.h"
+#include "profile.h"
+
+#define PROFILE_STAGE_LENGTH 6
+#define PROFILE_LENGTH       (1 + PROFILE_STAGE_COUNT * PROFILE_STAGE_LENGTH + 1 + 2 + 2)
+
+static size_t put_u16(uint8_t* data, size_t offset, uint32_t value) {
+    // saturate values which do not fit
+    if (value > 0xFFFF) {
+        value = 0xFFFF;
+    }
+    data[offset] = (value >> 8) & 0xFF;
+    data[offset + 1] = value & 0xFF;
+    return offset + 2;
+}
+
+int handle_profile(const ApduCommand_t* cmd) {
+    if ((cmd->p1 != 0) || (cmd->p2 != 0)) {
+        return handle_error(INVALID_P1_OR_P2);
+    }
+
+    unsigned char data[PROFILE_LENGTH];
+    size_t offset = 0;
+    data[offset++] = PROFILE_STAGE_COUNT;
+    for (uint8_t i = 0; i < PROFILE_STAGE_COUNT; i++) {
+        const profile_stage_t* stage = &profile.stages[i];
+        offset = put_u16(data, offset, stage->calls);
+        U4BE_ENCODE(data, offset, stage->units);
+        offset += 4;
+    }
+    data[offset++] = profile.maxFields;
+    offset = put_u16(data, offset, profile.maxRawTxLength);
+    offset = put_u16(data, offset, profile_stack_usage());
+
+    buffer_t buffer = {data, offset, 0};
+    return io_send_response(&buffer, OK);
+}
+#endif  // HAVE_PROFILING
@@ -0,0 +1,40 @@
+/*******************************************************************************
+ *    DHP Wallet
+ *    (c) 2023 dHealth
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *      http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ ********************************************************************************/
+#ifndef LEDGER_APP_DHP_GETPROFILE_H
+#define LEDGER_APP_DHP_GETPROFILE_H
+
+#include <stdint.h>
+#include "types.h"
+
+#ifdef HAVE_PROFILING
+/**
+ * Sends the counters of the last operation, in debug builds only:
+ *   number of stages (1) ||
+ *   for each stage of profile_stage_e: calls (2, big endian) || units (4, big endian) ||
+ *   high-water mark of the number of fields (1) ||
+ *   high-water mark of the bytes stored in rawTx (2, big endian) ||
+ *   stack bytes used (2, big endian)
+ *
+ * The operation is the last GET_PUBLIC_KEY, GET_PUBLIC_KEY_RANGE, SIGN_TX or COSIGN_BATCH,
+ * from its first packet.
+ *
+ * @param[in] cmd  APDU command
+ */
+int handle_profile(const ApduCommand_t* cmd);
+#endif
+
+#endif  // LEDGER_APP_DHP_GETPROFILE_H
@@ -23,6 +23,7 @@
 #include "types.h"
 #include "io.h"
 #include "crypto.h"
+#include "profile.h"
 
 uint8_t G_dhp_public_key[DHP_PUBLIC_KEY_LENGTH];
 
@@ -172,6 +173,7 @@ int handle_public_key(const ApduCommand_t* cmd) {
     if (OK != result) {
         return handle_error(result);
     }
+    profile_begin();
 
     // get the public key
     char address[DHP_PRETTY_ADDRESS_LENGTH + 1];
@@ -186,3 +188,44 @@ int handle_public_key(const ApduCommand_t* cmd) {
                    ///< either confirms or rejects address.
     }
 }
+
+int handle_public_key_range(const ApduCommand_t* cmd) {
+    // command data is a GET_PUBLIC_KEY one, followed by the number of keys
+    if (cmd->lc != DHP_PKG_GETPUBLICKEY_LENGTH + 1) {
+        return handle_error(INVALID_PKG_KEY_LENGTH);
+    }
+
+    // keys are never confirmed by user
+    if (cmd->p1 != P1_NON_CONFIRM) {
+        return handle_error(INVALID_P1_OR_P2);
+    }
+
+    KeyData_t keyData;
+    const ApduResponse_t result =
+        extract_parameters(cmd->p1, cmd->p2, cmd->data, DHP_PKG_GETPUBLICKEY_LENGTH, &keyData);
+    if (OK != result) {
+        return handle_error(result);
+    }
+
+    // the last index must stay in the same (hardened or not) range for every key
+    const uint8_t count = cmd->data[DHP_PKG_GETPUBLICKEY_LENGTH];
+    const uint32_t lastIndex = keyData.bip32Path[keyData.bip32PathLength - 1];
+    if ((count == 0) || (count > MAX_PUBLIC_KEY_RANGE) ||
+        ((lastIndex & 0x7FFFFFFFu) > 0x7FFFFFFFu - (count - 1u))) {
+        return handle_error(WRONG_APDU_DATA_LENGTH);
+    }
+    profile_begin();
+
+    // the command data has been extracted, the response can be built in place
+    char address[DHP_PRETTY_ADDRESS_LENGTH + 1];
+    size_t tx = 0;
+    G_io_apdu_buffer[tx++] = count;
+    for (uint8_t i = 0; i < count; i++) {
+        get_public_key(&keyData, G_io_apdu_buffer + tx, address);
+        tx += DHP_PUBLIC_KEY_LENGTH;
+        keyData.bip32Path[keyData.bip32PathLength - 1]++;
+    }
+    buffer_t buffer = {G_io_apdu_buffer, tx, 0};
+
+    return io_send_response(&buffer, OK);
+}
@@ -32,4 +32,17 @@
  */
 int handle_public_key(const ApduCommand_t* cmd);
 
+/**
+ * Processes the APDU command and returns, without user confirmation, the public keys of
+ * consecutive BIP32 paths: the last path index of the command data is incremented once per key.
+ *
+ * @param[in] cmd
+ *   Structured APDU command (CLA, INS, P1, P2, Lc, Command data).
+ *   Command data is the BIP32 path and network type of GET_PUBLIC_KEY, followed by the key count.
+ *
+ * @return zero or positive integer if success, negative integer otherwise.
+ *
+ */
+int handle_public_key_range(const ApduCommand_t* cmd);
+
 #endif  // LEDGER_APP_DHP_GETPUBLICKEY_H
\ No newline at end of file
@@ -25,14 +25,16 @@
 #include "printers.h"
 #include "io.h"
 #include "crypto.h"
+#include "profile.h"
 
-#define PREFIX_LENGTH 4
+fields_array_t fields;  ///< extracted data from the transaction is used to fill this structure,
+                        ///< which is displayed to user for confirmation
 
-buffer_t rawTxData;     ///< transaction data is extracted from this buffer
-fields_array_t fields;  ///< extracted data from rawTxData is used to fill this structure, which is
-                        ///< displayed to user for confirmation
+#define PACKET_OFFSET_LENGTH 4
 
-ApduResponse_t handle_packet_content(const buffer_t* buffer, const bool lastPacket);
+ApduResponse_t handle_packet_content(const buffer_t* buffer,
+                                     const bool lastPacket,
+                                     const bool acknowledge);
 
 void sign_transaction() {
     if (signState != PENDING_REVIEW) {
@@ -42,7 +44,7 @@ void sign_transaction() {
     }
 
     // Abort if we accidentally end up here again after the transaction has already been signed
-    if (rawTxData.ptr == NULL) {
+    if (transactionContext.signDataLength == 0) {
         display_idle_menu();
         return;
     }
@@ -66,13 +68,14 @@ void sign_transaction() {
             int r = cx_eddsa_sign_no_throw(&privateKey,
                                            CX_SHA512,
                                            transactionContext.rawTx,
-                                           transactionContext.rawTxLength,
+                                           transactionContext.signDataLength,
                                            signature,
                                            IO_APDU_BUFFER_SIZE);
 
             if (r != CX_OK) {
                 THROW(r);
             }
+            profile_count(PROFILE_SIGN, transactionContext.signDataLength);
 
             size_t size;
             cx_ecdomain_parameters_length(privateKey.curve, &size);
@@ -119,6 +122,31 @@ bool hasMore(uint8_t p1) {
     return (p1 & P1_MASK_MORE) != 0;
 }
 
+bool hasOffset(uint8_t p1) {
+    return (p1 & P1_MASK_OFFSET) != 0;
+}
+
+/*
+ * With P1_MASK_OFFSET, packets are resumable: subsequent packets start with the offset of
+ * their data in the transaction (4 bytes, big endian), and packets which are not the last one
+ * are answered with the number of transaction bytes received (4 bytes, big endian).
+ *
+ * A packet whose answer was lost can then be sent again: the data already received is
+ * skipped, and the sender continues from the acknowledged length.
+ */
+ApduResponse_t send_acknowledgement() {
+    const uint32_t length = transactionContext.receivedLength;
+    unsigned char data[PACKET_OFFSET_LENGTH];
+    data[0] = (length >> 24) & 0xFF;
+    data[1] = (length >> 16) & 0xFF;
+    data[2] = (length >> 8) & 0xFF;
+    data[3] = length & 0xFF;
+
+    buffer_t response = {data, PACKET_OFFSET_LENGTH, 0};
+    const int succ = io_send_response(&response, OK);
+    return ((succ != -1) ? OK : INTERNAL_ERROR);
+}
+
 ApduResponse_t handle_first_packet(const ApduCommand_t* cmd) {
     // check that its the first packet
     if (!isFirst(cmd->p1)) {
@@ -127,6 +155,7 @@ ApduResponse_t handle_first_packet(const ApduCommand_t* cmd) {
 
     // Reset old transaction data that might still remain
     reset_transaction_context();
+    profile_begin();
 
     // check that p2 is set to either SECP256K1 or ED25519
     if ((((cmd->p2 & P2_SECP256K1) == 0) && ((cmd->p2 & P2_ED25519) == 0)) ||
@@ -143,61 +172,86 @@ ApduResponse_t handle_first_packet(const ApduCommand_t* cmd) {
 
     // set curve
     transactionContext.curve = (((cmd->p2 & P2_ED25519) != 0) ? CURVE_Ed25519 : CURVE_256K1);
+    transactionContext.compressed = (cmd->p2 & P2_COMPRESSED) != 0;
 
     const size_t bip32PathSize = transactionContext.pathLength * 4 + 1;
     buffer_t serializedData = {&cmd->data[bip32PathSize],
                                cmd->lc - bip32PathSize,
                                0};  // buffer without the bip32 path
-    return handle_packet_content(&serializedData, !hasMore(cmd->p1));
+    return handle_packet_content(&serializedData, !hasMore(cmd->p1), hasOffset(cmd->p1));
 }
 
 ApduResponse_t handle_subsequent_packet(const ApduCommand_t* cmd) {
     if (isFirst(cmd->p1)) {
         THROW(INVALID_SIGNING_PACKET_ORDER);
     }
-    buffer_t serializedData = {cmd->data, cmd->lc, 0};  // buffer without the bip32 path
-    return handle_packet_content(&serializedData, !hasMore(cmd->p1));
+    if (!hasOffset(cmd->p1)) {
+        buffer_t serializedData = {cmd->data, cmd->lc, 0};  // buffer without the bip32 path
+        return handle_packet_content(&serializedData, !hasMore(cmd->p1), false);
+    }
+
+    if (cmd->lc < PACKET_OFFSET_LENGTH) {
+        return WRONG_APDU_DATA_LENGTH;
+    }
+    const uint32_t offset = ((uint32_t) cmd->data[0] << 24) | ((uint32_t) cmd->data[1] << 16) |
+                            ((uint32_t) cmd->data[2] << 8) | cmd->data[3];
+    const size_t length = cmd->lc - PACKET_OFFSET_LENGTH;
+    if (offset > transactionContext.receivedLength) {
+        // Data is missing before this packet
+        return INVALID_SIGNING_PACKET_ORDER;
+    }
+
+    // Skip the data of a packet sent again which was already received
+    const size_t received = transactionContext.receivedLength - offset;
+    if (received >= length && hasMore(cmd->p1)) {
+        return send_acknowledgement();
+    }
+    const size_t skipped = received < length ? received : length;
+    buffer_t serializedData = {&cmd->data[PACKET_OFFSET_LENGTH + skipped], length - skipped, 0};
+    return handle_packet_content(&serializedData, !hasMore(cmd->p1), true);
 }
 
-ApduResponse_t handle_packet_content(const buffer_t* buffer, const bool lastPacket) {
-    uint16_t totalLength = PREFIX_LENGTH + transactionContext.rawTxLength + buffer->size;
-    if (totalLength > MAX_RAW_TX) {
-        // Abort if the user is trying to sign a too large transaction
-        return SIGNING_DATA_TOO_LARGE;
+ApduResponse_t handle_packet_content(const buffer_t* buffer,
+                                     const bool lastPacket,
+                                     const bool acknowledge) {
+    // Parse received data as it arrives, the fields are complete after the last packet
+    int status = transactionContext.compressed
+                     ? parse_compressed_txn_chunk(buffer, lastPacket, &fields)
+                     : parse_txn_chunk(buffer, lastPacket, &fields);
+
+    switch (status) {
+        case E_DATA_TOO_LARGE: {
+            // Abort if the user is trying to sign a too large transaction
+            return SIGNING_DATA_TOO_LARGE;
+        }
+        case E_TOO_MANY_FIELDS: {
+            // Abort if there are too many fields to show on Ledger device
+            return TOO_MANY_TRANSACTION_FIELDS;
+        }
+        case E_NOT_ENOUGH_DATA:
+        case E_INVALID_DATA: {
+            return INVALID_SIGNING_DATA;
+        }
+        default:  // E_SUCCESS
+            break;
     }
+    profile_count(PROFILE_PARSE, buffer->size);
+    profile_track(fields.numFields, transactionContext.rawTxLength);
 
-    // Append received data to stored transaction data
-    memcpy(transactionContext.rawTx + transactionContext.rawTxLength, buffer->ptr, buffer->size);
-    transactionContext.rawTxLength += buffer->size;
+    transactionContext.receivedLength += buffer->size;
 
     if (!lastPacket) {
         // Reply to sender with status OK, so that next packet is sent
         signState = WAITING_FOR_MORE;
+        if (acknowledge) {
+            return send_acknowledgement();
+        }
         const int succ = io_send_response(NULL, OK);
         return ((succ != -1) ? OK : INTERNAL_ERROR);
     } else {
-        // All data received, prepare transaction fields to be presented to user
+        // All data received, present transaction fields to user
         signState = PENDING_REVIEW;
 
-        rawTxData.ptr = transactionContext.rawTx;
-        rawTxData.size = transactionContext.rawTxLength;
-        rawTxData.offset = 0;
-
-        int status = parse_txn_context(&rawTxData, &fields);
-
-        switch (status) {
-            case E_TOO_MANY_FIELDS: {
-                // Abort if there are too many fields to show on Ledger device
-                return TOO_MANY_TRANSACTION_FIELDS;
-            }
-            case E_NOT_ENOUGH_DATA:
-            case E_INVALID_DATA: {
-                return INVALID_SIGNING_DATA;
-            }
-            default:  // E_SUCCESS
-                break;
-        }
-
         review_transaction(&fields, sign_transaction, reject_transaction);
 
         return OK;
@@ -213,7 +267,12 @@ int handle_sign(const ApduCommand_t* cmd) {
             break;
         }
         case WAITING_FOR_MORE: {
-            result = handle_subsequent_packet(cmd);
+            if (isFirst(cmd->p1) && hasOffset(cmd->p1)) {
+                // The answer to the first packet was lost, start again
+                result = handle_first_packet(cmd);
+            } else {
+                result = handle_subsequent_packet(cmd);
+            }
             break;
         }
         default: {
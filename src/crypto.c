@@ -17,9 +17,114 @@
 #include "crypto.h"
 #include "dhp_helpers.h"
 #include "limitations.h"
+#include "profile.h"
 
 #include <string.h>
 
+#ifdef HAVE_DERIVATION_CACHE
+// m/44'/coin'/account'
+#define DERIVATION_CACHE_PREFIX_LEN 3
+// 30 seconds of ticker events, which come every 100 ms
+#define DERIVATION_CACHE_TIMEOUT_TICKS 300
+#define HARDENED_INDEX                 0x80000000
+
+typedef struct {
+    bool valid;
+    uint16_t idleTicks;
+    uint32_t prefix[DERIVATION_CACHE_PREFIX_LEN];
+    uint8_t privateKey[DHP_PRIVATE_KEY_LENGTH];
+    uint8_t chainCode[32];
+} derivation_cache_t;
+
+static derivation_cache_t derivationCache;
+
+void crypto_wipe_derivation_cache(void) {
+    explicit_bzero(&derivationCache, sizeof(derivationCache));
+}
+
+void crypto_derivation_cache_tick(void) {
+    if (derivationCache.valid && ++derivationCache.idleTicks >= DERIVATION_CACHE_TIMEOUT_TICKS) {
+        crypto_wipe_derivation_cache();
+    }
+}
+
+static bool is_cacheable(const uint32_t* bip32_path, uint8_t bip32_path_len) {
+    if (bip32_path_len <= DERIVATION_CACHE_PREFIX_LEN) {
+        return false;
+    }
+    // SLIP-10 only defines hardened children of Ed25519 keys
+    for (uint8_t i = 0; i < bip32_path_len; i++) {
+        if ((bip32_path[i] & HARDENED_INDEX) == 0) {
+            return false;
+        }
+    }
+    return true;
+}
+
+/*
+ * Derives the Ed25519 key of a path accepted by is_cacheable(), from the cached node of its
+ * prefix. The node is derived from the seed first if the cache holds another prefix.
+ *
+ * Returns CX_OK, or the error of the derivation.
+ */
+static int derive_from_cache(const uint32_t* bip32_path,
+                             uint8_t bip32_path_len,
+                             unsigned char* seed_key,
+                             size_t seed_key_len,
+                             uint8_t* raw_private_key) {
+    // private key || chain code, then the HMAC input: 0x00 || private key || index
+    uint8_t node[64];
+    uint8_t data[1 + DHP_PRIVATE_KEY_LENGTH + 4];
+
+    if (!derivationCache.valid ||
+        memcmp(derivationCache.prefix, bip32_path, sizeof(derivationCache.prefix)) != 0) {
+        crypto_wipe_derivation_cache();
+        int r = os_derive_bip32_with_seed_no_throw(HDW_ED25519_SLIP10,
+                                                   CX_CURVE_Ed25519,
+                                                   bip32_path,
+                                                   DERIVATION_CACHE_PREFIX_LEN,
+                                                   raw_private_key,
+                                                   derivationCache.chainCode,
+                                                   seed_key,
+                                                   seed_key_len);
+        if (r != CX_OK) {
+            crypto_wipe_derivation_cache();
+            return r;
+        }
+        memcpy(derivationCache.privateKey, raw_private_key, DHP_PRIVATE_KEY_LENGTH);
+        memcpy(derivationCache.prefix, bip32_path, sizeof(derivationCache.prefix));
+        derivationCache.valid = true;
+    }
+    derivationCache.idleTicks = 0;
+
+    memcpy(node, derivationCache.privateKey, DHP_PRIVATE_KEY_LENGTH);
+    memcpy(node + DHP_PRIVATE_KEY_LENGTH, derivationCache.chainCode, 32);
+    for (uint8_t i = DERIVATION_CACHE_PREFIX_LEN; i < bip32_path_len; i++) {
+        data[0] = 0;
+        memcpy(data + 1, node, DHP_PRIVATE_KEY_LENGTH);
+        U4BE_ENCODE(data, 1 + DHP_PRIVATE_KEY_LENGTH, bip32_path[i]);
+        // SLIP-10 hardened child: HMAC-SHA512(chain code, data) = private key || chain code
+        size_t length = cx_hmac_sha512(node + DHP_PRIVATE_KEY_LENGTH,
+                                       32,
+                                       data,
+                                       sizeof(data),
+                                       raw_private_key,
+                                       sizeof(node));
+        memcpy(node, raw_private_key, sizeof(node));
+        if (length != CX_SHA512_SIZE) {
+            explicit_bzero(node, sizeof(node));
+            explicit_bzero(data, sizeof(data));
+            return CX_INTERNAL_ERROR;
+        }
+    }
+    // raw_private_key is wiped by the caller
+    memcpy(raw_private_key, node, DHP_PRIVATE_KEY_LENGTH);
+    explicit_bzero(node, sizeof(node));
+    explicit_bzero(data, sizeof(data));
+    return CX_OK;
+}
+#endif  // HAVE_DERIVATION_CACHE
+
 void crypto_derive_private_key(const uint32_t* bip32_path,
                                const uint8_t bip32_path_len,
                                const CurveType_t curve_type,
@@ -31,8 +136,19 @@ void crypto_derive_private_key(const uint32_t* bip32_path,
             // derive the seed with bip32_path
             if (curve_type == CURVE_Ed25519) {
                 unsigned char seed_key[] = "ed25519 seed";
+                int r;
 
-                int r = os_derive_bip32_with_seed_no_throw(HDW_ED25519_SLIP10,
+#ifdef HAVE_DERIVATION_CACHE
+                if (is_cacheable(bip32_path, bip32_path_len)) {
+                    r = derive_from_cache(bip32_path,
+                                          bip32_path_len,
+                                          seed_key,
+                                          sizeof(seed_key) - 1,
+                                          raw_private_key);
+                } else
+#endif
+                {
+                    r = os_derive_bip32_with_seed_no_throw(HDW_ED25519_SLIP10,
                                                            CX_CURVE_Ed25519,
                                                            bip32_path,
                                                            bip32_path_len,
@@ -40,6 +156,7 @@ void crypto_derive_private_key(const uint32_t* bip32_path,
                                                            NULL,
                                                            seed_key,
                                                            sizeof(seed_key) - 1);
+                }
 
                 if (r != CX_OK) {
                     THROW(r);
@@ -61,6 +178,7 @@ void crypto_derive_private_key(const uint32_t* bip32_path,
                                               raw_private_key,
                                               DHP_PRIVATE_KEY_LENGTH,
                                               private_key);
+            profile_count(PROFILE_DERIVE, bip32_path_len);
         }
         CATCH_OTHER(e) {
             THROW(e);
@@ -45,8 +45,27 @@ typedef enum {
  * @param[out] private_key
  *   The derived private key result.
  *
+ * With HAVE_DERIVATION_CACHE, the node of the first three (hardened) levels of an Ed25519
+ * path is kept in RAM, and the keys of the following hardened levels are derived from it.
+ *
  */
 void crypto_derive_private_key(const uint32_t* bip32_path,
                                const uint8_t bip32_path_len,
                                const CurveType_t curve_type,
-                               cx_ecfp_private_key_t* private_key);
\ No newline at end of file
+                               cx_ecfp_private_key_t* private_key);
+
+#ifdef HAVE_DERIVATION_CACHE
+/**
+ * Wipe the cached m/44'/coin'/account' node, see crypto_derive_private_key().
+ */
+void crypto_wipe_derivation_cache(void);
+
+/**
+ * Count a ticker event: wipe the cached node once it has not been used for
+ * DERIVATION_CACHE_TIMEOUT_TICKS events.
+ */
+void crypto_derivation_cache_tick(void);
+#else
+#define crypto_wipe_derivation_cache()
+#define crypto_derivation_cache_tick()
+#endif
@@ -35,7 +35,7 @@ void dhp_print_amount(uint64_t amount,
     // If the amount can't be represented safely in JavaScript, signal an error
     // if (MAX_SAFE_INTEGER < amount) THROW(0x6a80);
 
-    memset(buffer, 0, AMOUNT_MAX_SIZE);
+    // digits are written from the least significant one, then copied in order to 'out'
     for (i = 0; dVal > 0 || i < MAX_DIVISIBILITY + 1; i++) {
         if (dVal > 0) {
             buffer[i] = (dVal % 10) + '0';
@@ -65,6 +65,7 @@
 #define DHP_TRANSACTION_HASH_LENGTH  32
 #define DHP_PKG_GETPUBLICKEY_LENGTH  22
 #define DHP_AGGREGATE_SIGNING_LENGTH 84
+#define DHP_SIGNATURE_LENGTH         64
 
 void dhp_print_amount(uint64_t amount,
                       uint8_t divisibility,
@@ -42,6 +42,7 @@ void resolve_fieldname(const field_t *field, char *dst) {
             CASE_FIELDNAME(DHP_UINT8_MD_RESTRICT_FLAG, "Restrictable")
             CASE_FIELDNAME(DHP_UINT8_MAM_ADD_COUNT, "Address Add Num")
             CASE_FIELDNAME(DHP_UINT8_MAM_DEL_COUNT, "Address Del Num")
+            CASE_FIELDNAME(DHP_UINT8_COSIGN_COUNT, "Cosignatures")
         }
     }
 
@@ -59,6 +59,7 @@
 #define DHP_UINT8_AA_RESTRICTION   0x1C
 #define DHP_UINT8_AM_RESTRICTION   0x1D
 #define DHP_UINT8_AO_RESTRICTION   0x1E
+#define DHP_UINT8_COSIGN_COUNT     0x1F
 
 #define DHP_INT16_VALUE_DELTA 0x20
 
@@ -26,6 +26,10 @@
 #include "common.h"
 #include "base32.h"
 
+#if defined(FUZZ)
+#include <bsd/string.h>
+#endif
+
 typedef void (*field_formatter_t)(const field_t *field, char *dst);
 
 static void int8_formatter(const field_t *field, char *dst) {
@@ -35,7 +39,7 @@ static void int8_formatter(const field_t *field, char *dst) {
     } else if (value < 0) {
         SNPRINTF(dst, "%s %d %s", "Remove", ~value + 1, "address(es)");
     } else {
-        SNPRINTF(dst, "%s", "Not change");
+        STRCPY(dst, "Not change");
     }
 }
 
@@ -46,7 +50,7 @@ static void int16_formatter(const field_t *field, char *dst) {
     } else if (value < 0) {
         SNPRINTF(dst, "%s %d %s", "Decrease", ~value + 1, "byte(s)");
     } else {
-        SNPRINTF(dst, "%s", "Not change");
+        STRCPY(dst, "Not change");
     }
 }
 
@@ -56,56 +60,56 @@ static void uint8_formatter(const field_t *field, char *dst) {
         SNPRINTF(dst, "Found %d", value);
     } else if (field->id == DHP_UINT8_TXN_MESSAGE_TYPE) {
         if (value == 0x00) {
-            SNPRINTF(dst, "%s", "Plain text");
+            STRCPY(dst, "Plain text");
         } else if (value == 0x01) {
-            SNPRINTF(dst, "%s", "Encrypted text");
+            STRCPY(dst, "Encrypted text");
         } else if (value == 0xFE) {
-            SNPRINTF(dst, "%s", "Persistent harvesting delegation");
+            STRCPY(dst, "Persistent harvesting delegation");
         }
     } else if (field->id == DHP_UINT8_AA_TYPE) {
         if (value == 0) {
-            SNPRINTF(dst, "%s", "Unlink address");
+            STRCPY(dst, "Unlink address");
         } else if (value == 1) {
-            SNPRINTF(dst, "%s", "Link address");
+            STRCPY(dst, "Link address");
         }
     } else if (field->id == DHP_UINT8_KL_TYPE) {
         if (value == 0x00) {
-            SNPRINTF(dst, "%s", "Unlink");
+            STRCPY(dst, "Unlink");
         } else if (value == 0x01) {
-            SNPRINTF(dst, "%s", "Link");
+            STRCPY(dst, "Link");
         }
     } else if (field->id == DHP_UINT8_NS_REG_TYPE) {
         if (value == 0) {
-            SNPRINTF(dst, "%s", "Root namespace");
+            STRCPY(dst, "Root namespace");
         } else if (value == 1) {
-            SNPRINTF(dst, "%s", "Sub namespace");
+            STRCPY(dst, "Sub namespace");
         }
     } else if (field->id == DHP_UINT8_MSC_ACTION) {
         if (value == 0) {
-            SNPRINTF(dst, "%s", "Decrease");
+            STRCPY(dst, "Decrease");
         } else if (value == 1) {
-            SNPRINTF(dst, "%s", "Increase");
+            STRCPY(dst, "Increase");
         }
     } else if (field->id == DHP_UINT8_MD_SUPPLY_FLAG) {
         if ((value & 0x01) != 0) {
-            SNPRINTF(dst, "%s", "Yes");
+            STRCPY(dst, "Yes");
         } else {
-            SNPRINTF(dst, "%s", "No");
+            STRCPY(dst, "No");
         }
     } else if (field->id == DHP_UINT8_MD_TRANS_FLAG) {
         if ((value & 0x02) != 0) {
-            SNPRINTF(dst, "%s", "Yes");
+            STRCPY(dst, "Yes");
         } else {
-            SNPRINTF(dst, "%s", "No");
+            STRCPY(dst, "No");
         }
     } else if (field->id == DHP_UINT8_MD_RESTRICT_FLAG) {
         if ((value & 0x04) != 0) {
-            SNPRINTF(dst, "%s", "Yes");
+            STRCPY(dst, "Yes");
         } else {
-            SNPRINTF(dst, "%s", "No");
+            STRCPY(dst, "No");
         }
     } else {
-        SNPRINTF(dst, "%d", value);
+        snprintf_number(dst, MAX_FIELD_LEN, value);
     }
 }
 
@@ -120,7 +124,7 @@ static void uint8_custom_formatter(const field_t *field, char *dst) {
             SNPRINTF(dst, "%d %s", value, "operation(s)");
         }
     } else {
-        SNPRINTF(dst, "%s", "Not change");
+        STRCPY(dst, "Not change");
     }
 }
 
@@ -128,23 +132,23 @@ static void uint16_formatter(const field_t *field, char *dst) {
     uint16_t value = read_uint16(field->data);
     if (field->id == DHP_UINT16_AR_RESTRICT_TYPE) {
         if ((value & 0x0001) != 0) {
-            SNPRINTF(dst, "%s", "Address");
+            STRCPY(dst, "Address");
         } else if ((value & 0x0002) != 0) {
-            SNPRINTF(dst, "%s", "Mosaic");
+            STRCPY(dst, "Mosaic");
         } else if ((value & 0x0004) != 0) {
-            SNPRINTF(dst, "%s", "Transaction Type");
+            STRCPY(dst, "Transaction Type");
         }
     } else if (field->id == DHP_UINT16_AR_RESTRICT_DIRECTION) {
         if ((value & 0x4000) != 0) {
-            SNPRINTF(dst, "%s", "Outgoing");
+            STRCPY(dst, "Outgoing");
         } else {
-            SNPRINTF(dst, "%s", "Incoming");
+            STRCPY(dst, "Incoming");
         }
     } else if (field->id == DHP_UINT16_AR_RESTRICT_OPERATION) {
         if ((value & 0x8000) != 0) {
-            SNPRINTF(dst, "%s", "Block");
+            STRCPY(dst, "Block");
         } else {
-            SNPRINTF(dst, "%s", "Allow");
+            STRCPY(dst, "Allow");
         }
     } else {
         switch (value) {
@@ -173,7 +177,7 @@ static void uint16_formatter(const field_t *field, char *dst) {
             CASE_FIELDVALUE(DHP_TXN_SECRET_LOCK, "Secret Lock")
             CASE_FIELDVALUE(DHP_TXN_SECRET_PROOF, "Secret Proof")
             default:
-                SNPRINTF(dst, "%s", "Unknown");
+                STRCPY(dst, "Unknown");
         }
     }
 }
@@ -181,7 +185,7 @@ static void uint16_formatter(const field_t *field, char *dst) {
 static void uint32_formatter(const field_t *field, char *dst) {
     uint32_t value = read_uint32(field->data);
     if ((field->id == DHP_UINT32_VKL_START_POINT) || (field->id == DHP_UINT32_VKL_END_POINT)) {
-        SNPRINTF(dst, "%d", value);
+        snprintf_number(dst, MAX_FIELD_LEN, value);
     }
 }
 
@@ -193,7 +197,7 @@ static void uint64_formatter(const field_t *field, char *dst) {
     if (field->id == DHP_UINT64_DURATION) {
         uint64_t duration = read_uint64(field->data);
         if (duration == 0) {
-            SNPRINTF(dst, "%s", "Unlimited");
+            STRCPY(dst, "Unlimited");
         } else {
             uint16_t day = duration / 2880;
             uint8_t hour = (duration % 2880) / 120;
@@ -244,7 +248,7 @@ static void hex_msg_formatter(const field_t *field, char *dst) {
 
 static void msg_formatter(const field_t *field, char *dst) {
     if (field->length == 0) {
-        SNPRINTF(dst, "%s", "<empty msg>");
+        STRCPY(dst, "<empty msg>");
     } else if (field->length >= MAX_FIELD_LEN) {
         snprintf_ascii(dst, MAX_FIELD_LEN, &field->data[0], MAX_FIELD_LEN - 1);
     } else {
@@ -254,9 +258,9 @@ static void msg_formatter(const field_t *field, char *dst) {
 
 static void string_formatter(const field_t *field, char *dst) {
     if (field->id == DHP_UNKNOWN_MOSAIC) {
-        SNPRINTF(dst, "%s", "Divisibility and levy cannot be shown");
+        STRCPY(dst, "Divisibility and levy cannot be shown");
     } else if (field->id == DHP_STR_RECIPIENT_ADDRESS) {
-        SNPRINTF(dst, "%s", "alias to a namespace");
+        STRCPY(dst, "alias to a namespace");
     } else if (field->length > MAX_FIELD_LEN) {
         snprintf_ascii(dst, MAX_FIELD_LEN, field->data, MAX_FIELD_LEN - 1);
     } else {
@@ -303,17 +307,19 @@ static field_formatter_t get_formatter(const field_t *field) {
 }
 
 void format_field(const field_t *field, char *dst) {
-    memset(dst, 0, MAX_FIELD_LEN);
+    // Formatters write a terminated string, or nothing
+    dst[0] = '\0';
 
     field_formatter_t formatter = get_formatter(field);
     if (formatter != NULL) {
         formatter(field, dst);
     } else {
-        SNPRINTF(dst, "%s", "[Not implemented]");
+        STRCPY(dst, "[Not implemented]");
     }
 
     // Replace a zero-length string with a space because of rendering issues
     if (dst[0] == 0x00) {
         dst[0] = ' ';
+        dst[1] = '\0';
     }
 }
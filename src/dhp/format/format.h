@@ -21,10 +21,12 @@
 #include "fields.h"
 
 #define SNPRINTF(strbuf, ...) snprintf(strbuf, MAX_FIELD_LEN, __VA_ARGS__)
+// Constant strings are copied, without going through snprintf
+#define STRCPY(strbuf, src) strlcpy(strbuf, src, MAX_FIELD_LEN)
 // Simple macro for building more readable switch statements
-#define CASE_FIELDVALUE(v, src)   \
-    case v:                       \
-        SNPRINTF(dst, "%s", src); \
+#define CASE_FIELDVALUE(v, src) \
+    case v:                     \
+        STRCPY(dst, src);       \
         return;
 
 void format_field(const field_t *field, char *dst);
@@ -47,21 +47,20 @@ int snprintf_number(char *dst, uint16_t len, uint64_t value) {
     return n;
 }
 
-/** Convert 1 hex byte to 2 characters */
-char hex2ascii(uint8_t input) {
-    return input > 9 ? (char) (input + 55) : (char) (input + 48);
-}
+static const char HEX_DIGITS[] = "0123456789ABCDEF";
 
-int snprintf_hex2ascii(char *dst, uint16_t maxLen, const uint8_t *src, uint16_t dataLength) {
-    if (2 * dataLength > maxLen - 1 || maxLen < 1 || dataLength < 1) {
-        return E_NOT_ENOUGH_DATA;
-    }
+/** Write 'dataLength' bytes of 'src' as 2 hex characters each, from its last byte if 'reverse' */
+static char *write_hex(char *dst, const uint8_t *src, uint16_t dataLength, uint8_t reverse) {
     for (uint16_t i = 0; i < dataLength; i++) {
-        dst[2 * i] = hex2ascii((src[i] & 0xf0) >> 4);
-        dst[2 * i + 1] = hex2ascii(src[i] & 0x0f);
+        const uint8_t value = reverse == 1 ? src[dataLength - 1 - i] : src[i];
+        *dst++ = HEX_DIGITS[value >> 4];
+        *dst++ = HEX_DIGITS[value & 0x0f];
     }
-    dst[2 * dataLength] = '\0';
-    return 2 * dataLength;
+    return dst;
+}
+
+int snprintf_hex2ascii(char *dst, uint16_t maxLen, const uint8_t *src, uint16_t dataLength) {
+    return snprintf_hex(dst, maxLen, src, dataLength, 0);
 }
 
 int snprintf_hex(char *dst,
@@ -72,13 +71,7 @@ int snprintf_hex(char *dst,
     if (2 * dataLength > maxLen - 1 || maxLen < 1 || dataLength < 1) {
         return E_NOT_ENOUGH_DATA;
     }
-    for (uint16_t i = 0; i < dataLength; i++) {
-        snprintf(dst + 2 * i,
-                 maxLen - 2 * i,
-                 "%02X",
-                 reverse == 1 ? src[dataLength - 1 - i] : src[i]);
-    }
-    dst[2 * dataLength] = '\0';
+    *write_hex(dst, src, dataLength, reverse) = '\0';
     return 2 * dataLength;
 }
 
@@ -108,17 +101,25 @@ int snprintf_ascii(char *dst, uint16_t maxLen, const uint8_t *src, uint16_t data
 }
 
 int snprintf_mosaic(char *dst, uint16_t maxLen, const mosaic_t *mosaic, char *asset) {
-    if (snprintf_number(dst, maxLen, mosaic->amount) < 1) {
+    // amount || " " || asset || " 0x" || mosaic id, written in a single pass
+    int n = snprintf_number(dst, maxLen, mosaic->amount);
+    if (n < 1) {
         return E_NOT_ENOUGH_DATA;
-    };
-    strlcat(dst, " ", maxLen);
-    strlcat(dst, asset, maxLen);
-    strlcat(dst, " 0x", maxLen);
-    uint16_t len = strlen(dst);
-    const uint8_t *mosaicId = (const uint8_t *) &mosaic->mosaicId;
-    char *mosaicHex = dst + len;
-    if (snprintf_hex(mosaicHex, maxLen - len, mosaicId, sizeof(uint64_t), 1) < 1) {
+    }
+    const size_t assetLength = strlen(asset);
+    const size_t length = n + 1 + assetLength + 3 + 2 * sizeof(uint64_t);
+    if (length > (size_t) maxLen - 1) {
         return E_NOT_ENOUGH_DATA;
-    };
-    return strlen(dst);
+    }
+
+    char *p = dst + n;
+    *p++ = ' ';
+    memcpy(p, asset, assetLength);
+    p += assetLength;
+    *p++ = ' ';
+    *p++ = '0';
+    *p++ = 'x';
+    p = write_hex(p, (const uint8_t *) &mosaic->mosaicId, sizeof(uint64_t), 1);
+    *p = '\0';
+    return length;
 }
@@ -146,6 +146,43 @@ typedef struct {
         if (err) return err; \
     }
 
+// Data types of the fields, packed as their index in this table
+static const uint8_t FIELD_DATA_TYPES[] = {STI_INT8,
+                                           STI_UINT8,
+                                           STI_INT16,
+                                           STI_UINT16,
+                                           STI_UINT32,
+                                           STI_UINT64,
+                                           STI_HASH256,
+                                           STI_PUBLIC_KEY,
+                                           STI_STR,
+                                           STI_DHP,
+                                           STI_MOSAIC_CURRENCY,
+                                           STI_MESSAGE,
+                                           STI_ADDRESS,
+                                           STI_HEX_MESSAGE,
+                                           STI_UINT8_ADDITION,
+                                           STI_UINT8_DELETION};
+
+#define FIELD_TYPE_SHIFT  12
+#define FIELD_LENGTH_MASK 0x0FFF
+
+_Static_assert(sizeof(FIELD_DATA_TYPES) <= 16, "field data type indexes must fit in 4 bits");
+_Static_assert(MAX_FIELD_LEN <= FIELD_LENGTH_MASK,
+               "field data lengths must not be capped below what is displayed");
+
+static uint16_t field_length(const packed_field_t* field) {
+    return field->typeLength & FIELD_LENGTH_MASK;
+}
+
+void fields_get(const fields_array_t* fields, uint8_t index, field_t* field) {
+    const packed_field_t* packed = &fields->arr[index];
+    field->id = packed->id;
+    field->dataType = FIELD_DATA_TYPES[packed->typeLength >> FIELD_TYPE_SHIFT];
+    field->length = field_length(packed);
+    field->data = fields->base + packed->offset;
+}
+
 static int add_new_field(fields_array_t* fields,
                          uint8_t id,
                          uint8_t data_type,
@@ -159,12 +196,22 @@ static int add_new_field(fields_array_t* fields,
     if (data == NULL) {
         return E_NOT_ENOUGH_DATA;
     }
+    if (data < fields->base || data - fields->base > UINT16_MAX) {
+        return E_INVALID_DATA;
+    }
+
+    uint8_t type = 0;
+    while (FIELD_DATA_TYPES[type] != data_type) {
+        if (++type == sizeof(FIELD_DATA_TYPES)) {
+            return E_INVALID_DATA;
+        }
+    }
 
-    field_t* field = &fields->arr[idx];
+    packed_field_t* field = &fields->arr[idx];
+    field->offset = data - fields->base;
     field->id = id;
-    field->dataType = data_type;
-    field->length = length;
-    field->data = data;
+    field->typeLength =
+        (type << FIELD_TYPE_SHIFT) | (length > FIELD_LENGTH_MASK ? FIELD_LENGTH_MASK : length);
 
     fields->numFields++;
 
@@ -1273,136 +1320,152 @@ static int parseWithFee(buffer_t* rawTxData,
     return E_SUCCESS;
 }
 
-static int parse_inner_txn_content(buffer_t* rawTxData,
-                                   uint32_t len,
-                                   bool isCosigning,
-                                   fields_array_t* fields) {
-    uint32_t totalSize = 0;
+static uint32_t inner_txn_padding(uint32_t size) {
+    return size % ALIGNMENT_BYTES == 0 ? 0 : ALIGNMENT_BYTES - (size % ALIGNMENT_BYTES);
+}
 
-    do {
-        // get header
-        const inner_tx_header_t* txn = (const inner_tx_header_t*) buffer_offset_ptr_and_seek(
-            rawTxData,
-            sizeof(inner_tx_header_t));  // Read data and security check
-        if (!txn) {
-            return E_NOT_ENOUGH_DATA;
-        }
+static int parse_inner_txn(buffer_t* rawTxData,
+                           bool isCosigning,
+                           fields_array_t* fields,
+                           uint32_t* size) {
+    // get header
+    const inner_tx_header_t* txn = (const inner_tx_header_t*) buffer_offset_ptr_and_seek(
+        rawTxData,
+        sizeof(inner_tx_header_t));  // Read data and security check
+    if (!txn) {
+        return E_NOT_ENOUGH_DATA;
+    }
 
-        totalSize += txn->size;
+    *size = txn->size;
 
-        // Show Transaction type
-        BAIL_IF(add_new_field(
-            fields,
-            isCosigning ? DHP_UINT16_TRANSACTION_DETAIL_TYPE : DHP_UINT16_INNER_TRANSACTION_TYPE,
-            STI_UINT16,
-            sizeof(uint16_t),
-            (const uint8_t*) &txn->innerTxType));
-        switch (txn->innerTxType) {
-            case DHP_TXN_TRANSFER: {
-                BAIL_IF(parse_transfer_txn_content(rawTxData, fields));
-                break;
-            }
-            case DHP_TXN_MOSAIC_DEFINITION: {
-                BAIL_IF(parse_mosaic_definition_txn_content(rawTxData, fields));
-                break;
-            }
-            case DHP_TXN_MOSAIC_SUPPLY_CHANGE: {
-                BAIL_IF(parse_mosaic_supply_change_txn_content(rawTxData, fields));
-                break;
-            }
-            case DHP_TXN_MODIFY_MULTISIG_ACCOUNT: {
-                BAIL_IF(parse_multisig_account_modification_txn_content(rawTxData, fields));
-                break;
-            }
-            case DHP_TXN_REGISTER_NAMESPACE: {
-                BAIL_IF(parse_namespace_registration_txn_content(rawTxData, fields));
-                break;
-            }
-            case DHP_TXN_ACCOUNT_METADATA: {
-                BAIL_IF(parse_account_metadata_txn_content(rawTxData, fields));
-                break;
-            }
-            case DHP_TXN_MOSAIC_METADATA: {
-                BAIL_IF(parse_mosaic_metadata_txn_content(rawTxData, fields));
-                break;
-            }
-            case DHP_TXN_NAMESPACE_METADATA: {
-                BAIL_IF(parse_namespace_metadata_txn_content(rawTxData, fields));
-                break;
-            }
-
-            case DHP_TXN_ADDRESS_ALIAS: {
-                BAIL_IF(parse_address_alias_txn_content(rawTxData, fields));
-                break;
-            }
-            case DHP_TXN_MOSAIC_ALIAS: {
-                BAIL_IF(parse_mosaic_alias_txn_content(rawTxData, fields));
-                break;
-            }
+    // Show Transaction type
+    BAIL_IF(add_new_field(
+        fields,
+        isCosigning ? DHP_UINT16_TRANSACTION_DETAIL_TYPE : DHP_UINT16_INNER_TRANSACTION_TYPE,
+        STI_UINT16,
+        sizeof(uint16_t),
+        (const uint8_t*) &txn->innerTxType));
+    switch (txn->innerTxType) {
+        case DHP_TXN_TRANSFER: {
+            BAIL_IF(parse_transfer_txn_content(rawTxData, fields));
+            break;
+        }
+        case DHP_TXN_MOSAIC_DEFINITION: {
+            BAIL_IF(parse_mosaic_definition_txn_content(rawTxData, fields));
+            break;
+        }
+        case DHP_TXN_MOSAIC_SUPPLY_CHANGE: {
+            BAIL_IF(parse_mosaic_supply_change_txn_content(rawTxData, fields));
+            break;
+        }
+        case DHP_TXN_MODIFY_MULTISIG_ACCOUNT: {
+            BAIL_IF(parse_multisig_account_modification_txn_content(rawTxData, fields));
+            break;
+        }
+        case DHP_TXN_REGISTER_NAMESPACE: {
+            BAIL_IF(parse_namespace_registration_txn_content(rawTxData, fields));
+            break;
+        }
+        case DHP_TXN_ACCOUNT_METADATA: {
+            BAIL_IF(parse_account_metadata_txn_content(rawTxData, fields));
+            break;
+        }
+        case DHP_TXN_MOSAIC_METADATA: {
+            BAIL_IF(parse_mosaic_metadata_txn_content(rawTxData, fields));
+            break;
+        }
+        case DHP_TXN_NAMESPACE_METADATA: {
+            BAIL_IF(parse_namespace_metadata_txn_content(rawTxData, fields));
+            break;
+        }
 
-            case DHP_TXN_ACCOUNT_ADDRESS_RESTRICTION: {
-                BAIL_IF(parse_account_address_restriction_txn_content(rawTxData, fields));
-                break;
-            }
-            case DHP_TXN_ACCOUNT_MOSAIC_RESTRICTION: {
-                BAIL_IF(parse_account_mosaic_restriction_txn_content(rawTxData, fields));
-                break;
-            }
-            case DHP_TXN_ACCOUNT_OPERATION_RESTRICTION: {
-                BAIL_IF(parse_account_operation_restriction_txn_content(rawTxData, fields));
-                break;
-            }
+        case DHP_TXN_ADDRESS_ALIAS: {
+            BAIL_IF(parse_address_alias_txn_content(rawTxData, fields));
+            break;
+        }
+        case DHP_TXN_MOSAIC_ALIAS: {
+            BAIL_IF(parse_mosaic_alias_txn_content(rawTxData, fields));
+            break;
+        }
 
-            case DHP_TXN_ACCOUNT_KEY_LINK: {
-                BAIL_IF(parse_account_key_link_txn_content(rawTxData, fields));
-                break;
-            }
-            case DHP_TXN_NODE_KEY_LINK: {
-                BAIL_IF(parse_node_key_link_txn_content(rawTxData, fields));
-                break;
-            }
-            case DHP_TXN_VRF_KEY_LINK: {
-                BAIL_IF(parse_vrf_key_link_txn_content(rawTxData, fields));
-                break;
-            }
+        case DHP_TXN_ACCOUNT_ADDRESS_RESTRICTION: {
+            BAIL_IF(parse_account_address_restriction_txn_content(rawTxData, fields));
+            break;
+        }
+        case DHP_TXN_ACCOUNT_MOSAIC_RESTRICTION: {
+            BAIL_IF(parse_account_mosaic_restriction_txn_content(rawTxData, fields));
+            break;
+        }
+        case DHP_TXN_ACCOUNT_OPERATION_RESTRICTION: {
+            BAIL_IF(parse_account_operation_restriction_txn_content(rawTxData, fields));
+            break;
+        }
 
-            case DHP_TXN_VOTING_KEY_LINK: {
-                BAIL_IF(parse_voting_key_link_txn_content(rawTxData, fields));
-                break;
-            }
-            case DHP_TXN_FUND_LOCK: {
-                BAIL_IF(parse_fund_lock_txn_content(rawTxData, fields));
-                break;
-            }
+        case DHP_TXN_ACCOUNT_KEY_LINK: {
+            BAIL_IF(parse_account_key_link_txn_content(rawTxData, fields));
+            break;
+        }
+        case DHP_TXN_NODE_KEY_LINK: {
+            BAIL_IF(parse_node_key_link_txn_content(rawTxData, fields));
+            break;
+        }
+        case DHP_TXN_VRF_KEY_LINK: {
+            BAIL_IF(parse_vrf_key_link_txn_content(rawTxData, fields));
+            break;
+        }
 
-            default: {
-                return E_INVALID_DATA;
-            }
+        case DHP_TXN_VOTING_KEY_LINK: {
+            BAIL_IF(parse_voting_key_link_txn_content(rawTxData, fields));
+            break;
+        }
+        case DHP_TXN_FUND_LOCK: {
+            BAIL_IF(parse_fund_lock_txn_content(rawTxData, fields));
+            break;
         }
 
-        // fill zeros
-        bool succ = buffer_seek(
-            rawTxData,
-            txn->size % ALIGNMENT_BYTES == 0 ? 0 : ALIGNMENT_BYTES - (txn->size % ALIGNMENT_BYTES));
-        if (!succ) {
+        default: {
             return E_INVALID_DATA;
         }
+    }
 
+    // fill zeros
+    bool succ = buffer_seek(rawTxData, inner_txn_padding(txn->size));
+    if (!succ) {
+        return E_INVALID_DATA;
+    }
+
+    return E_SUCCESS;
+}
+
+static int parse_inner_txn_content(buffer_t* rawTxData,
+                                   uint32_t len,
+                                   bool isCosigning,
+                                   fields_array_t* fields) {
+    uint32_t totalSize = 0;
+
+    do {
+        uint32_t size;
+        BAIL_IF(parse_inner_txn(rawTxData, isCosigning, fields, &size));
+        totalSize += size;
     } while (totalSize < len - sizeof(inner_tx_header_t));
 
     return E_SUCCESS;
 }
 
-static int parse_aggregate_txn_content(buffer_t* rawTxData, fields_array_t* fields) {
+static bool is_cosigning(void) {
+    return transactionContext.signDataLength == DHP_TRANSACTION_HASH_LENGTH;
+}
+
+static int parse_aggregate_txn_header(buffer_t* rawTxData,
+                                      const aggregate_txn_t** txn,
+                                      fields_array_t* fields) {
     // get aggregate header
-    const aggregate_txn_t* txn =
-        (const aggregate_txn_t*) buffer_offset_ptr_and_seek(rawTxData, sizeof(aggregate_txn_t));
-    if (!txn) {
+    *txn = (const aggregate_txn_t*) buffer_offset_ptr_and_seek(rawTxData, sizeof(aggregate_txn_t));
+    if (!*txn) {
         return E_NOT_ENOUGH_DATA;
     }
 
-    bool isCosigning = (transactionContext.rawTxLength == DHP_TRANSACTION_HASH_LENGTH);
-    const uint8_t* p_tx_hash = isCosigning ? rawTxData->ptr : txn->transactionHash;
+    const uint8_t* p_tx_hash = is_cosigning() ? rawTxData->ptr : (*txn)->transactionHash;
 
     // add fields
     BAIL_IF(add_new_field(fields,
@@ -1410,10 +1473,18 @@ static int parse_aggregate_txn_content(buffer_t* rawTxData, fields_array_t* fiel
                           STI_HASH256,
                           DHP_TRANSACTION_HASH_LENGTH,
                           p_tx_hash));  // add transaction hash
+
+    return E_SUCCESS;
+}
+
+static int parse_aggregate_txn_content(buffer_t* rawTxData, fields_array_t* fields) {
+    const aggregate_txn_t* txn;
+    BAIL_IF(parse_aggregate_txn_header(rawTxData, &txn, fields));
+
     if (!buffer_can_read(rawTxData, txn->payloadSize)) {
         return E_INVALID_DATA;
     }
-    BAIL_IF(parse_inner_txn_content(rawTxData, txn->payloadSize, isCosigning, fields));
+    BAIL_IF(parse_inner_txn_content(rawTxData, txn->payloadSize, is_cosigning(), fields));
 
     return E_SUCCESS;
 }
@@ -1515,10 +1586,7 @@ static int parse_txn_detail(buffer_t* rawTxData,
     return result;
 }
 
-static void set_sign_data_length(
-    const buffer_t* rawTxdata,
-    uint16_t transactionType)  // TODO: dont change global transactionContext here!!
-{
+static uint32_t get_sign_data_length(const buffer_t* rawTxdata, uint16_t transactionType) {
     if ((transactionType == DHP_TXN_AGGREGATE_COMPLETE) ||
         (transactionType == DHP_TXN_AGGREGATE_BONDED)) {
         const unsigned char TESTNET_GENERATION_HASH[] = {
@@ -1543,14 +1611,14 @@ static void set_sign_data_length(
             // Sign data from generation hash to transaction hash
             // DHP_AGGREGATE_SIGNING_LENGTH = DHP_TRANSACTION_HASH_LENGTH
             //                                + sizeof(common_header_t) + sizeof(txn_fee_t) = 84
-            transactionContext.rawTxLength = DHP_AGGREGATE_SIGNING_LENGTH;
+            return DHP_AGGREGATE_SIGNING_LENGTH;
         } else {
             // Sign transaction hash only (multisig cosigning transaction)
-            transactionContext.rawTxLength = DHP_TRANSACTION_HASH_LENGTH;
+            return DHP_TRANSACTION_HASH_LENGTH;
         }
     } else {
         // Sign all data in the transaction
-        transactionContext.rawTxLength = rawTxdata->size;
+        return rawTxdata->size;
     }
 }
 
@@ -1564,6 +1632,316 @@ int parse_txn_context(buffer_t* rawTxdata, fields_array_t* fields) {
         return E_NOT_ENOUGH_DATA;
     }
 
-    set_sign_data_length(rawTxdata, txnHeader->transactionType);
+    transactionContext.signDataLength = get_sign_data_length(rawTxdata, txnHeader->transactionType);
+    fields->base = rawTxdata->ptr;
     return parse_txn_detail(rawTxdata, txnHeader, fields);
 }
+
+int parse_cosign_batch(buffer_t* rawTxdata, fields_array_t* fields) {
+    fields->base = rawTxdata->ptr;
+    fields->numFields = 0;
+
+    const uint8_t* count = buffer_offset_ptr_and_seek(rawTxdata, sizeof(uint8_t));
+    if (!count) {
+        return E_NOT_ENOUGH_DATA;
+    }
+    if ((*count == 0) ||
+        (rawTxdata->size - rawTxdata->offset != *count * DHP_TRANSACTION_HASH_LENGTH)) {
+        return E_INVALID_DATA;
+    }
+
+    // Show the number of transactions, then the hash of each of them
+    BAIL_IF(add_new_field(fields, DHP_UINT8_COSIGN_COUNT, STI_UINT8, sizeof(uint8_t), count));
+    for (uint8_t i = 0; i < *count; i++) {
+        const uint8_t* hash = buffer_offset_ptr_and_seek(rawTxdata, DHP_TRANSACTION_HASH_LENGTH);
+        BAIL_IF(add_new_field(fields,
+                              DHP_HASH256_AGG_HASH,
+                              STI_HASH256,
+                              DHP_TRANSACTION_HASH_LENGTH,
+                              hash));
+    }
+    return E_SUCCESS;
+}
+
+/*
+ * Incremental parsing of aggregate transactions
+ *
+ * Only the first DHP_AGGREGATE_SIGNING_LENGTH bytes of an aggregate are signed, so the
+ * aggregate does not need to be buffered: rawTx keeps its header, then the data of the
+ * fields of the inner transactions already parsed, then the data not parsed yet.
+ *
+ *   rawTx: | aggregate header | field data | pending data |
+ *          0                  |            parsedLength   rawTxLength
+ */
+
+#define AGGREGATE_HEADER_LENGTH \
+    (sizeof(common_header_t) + sizeof(txn_fee_t) + sizeof(aggregate_txn_t))
+
+static bool is_aggregate(uint16_t transactionType) {
+    return (transactionType == DHP_TXN_AGGREGATE_COMPLETE) ||
+           (transactionType == DHP_TXN_AGGREGATE_BONDED);
+}
+
+static int parse_aggregate_header_chunk(fields_array_t* fields) {
+    buffer_t header = {transactionContext.rawTx, AGGREGATE_HEADER_LENGTH, 0};
+
+    const common_header_t* txnHeader =
+        (const common_header_t*) buffer_offset_ptr_and_seek(&header, sizeof(common_header_t));
+    transactionContext.signDataLength = get_sign_data_length(&header, txnHeader->transactionType);
+    if (!buffer_seek(&header, sizeof(txn_fee_t))) {
+        return E_NOT_ENOUGH_DATA;
+    }
+
+    fields->base = transactionContext.rawTx;
+    fields->numFields = 0;
+
+    // Show Transaction type
+    BAIL_IF(add_new_field(fields,
+                          DHP_UINT16_TRANSACTION_TYPE,
+                          STI_UINT16,
+                          sizeof(uint16_t),
+                          (const uint8_t*) &txnHeader->transactionType));
+
+    const aggregate_txn_t* txn;
+    BAIL_IF(parse_aggregate_txn_header(&header, &txn, fields));
+
+    transactionContext.parsedLength = AGGREGATE_HEADER_LENGTH;
+    transactionContext.payloadSize = txn->payloadSize;
+    return E_SUCCESS;
+}
+
+/*
+ * Moves the data of the fields from 'first' that lies in [start, end) of the fields buffer to
+ * 'start', in order of offset, and updates the field offsets. Returns the number of bytes kept.
+ *
+ * Data shared by several fields is kept once. As the data is packed in order of offset, it
+ * is never moved to a higher offset, so moving it never overwrites data still to be moved.
+ */
+static uint32_t keep_field_data(fields_array_t* fields,
+                                uint8_t first,
+                                uint16_t start,
+                                uint16_t end) {
+    uint8_t* base = transactionContext.rawTx;
+    uint16_t kept = start;
+    uint16_t runSrc = 0;  // last run of contiguous data kept, at its original offset
+    uint16_t runEnd = 0;
+    uint16_t runDst = 0;  // and where it was moved
+    bool inRun = false;
+    uint64_t moved = 0;
+
+    _Static_assert(MAX_FIELD_COUNT <= 64, "moved fields must fit in a uint64_t bitmask");
+
+    for (;;) {
+        // find the field with the lowest data offset not moved yet
+        packed_field_t* next = NULL;
+        uint8_t nextIdx = 0;
+        for (uint8_t i = first; i < fields->numFields; i++) {
+            packed_field_t* field = &fields->arr[i];
+            if ((moved & (1ULL << i)) || field->offset < start || field->offset >= end) {
+                continue;
+            }
+            if (next == NULL || field->offset < next->offset) {
+                next = field;
+                nextIdx = i;
+            }
+        }
+        if (next == NULL) {
+            return kept - start;
+        }
+        moved |= 1ULL << nextIdx;
+
+        const uint16_t src = next->offset;
+        const uint16_t srcEnd = src + field_length(next);
+        if (!inRun || src > runEnd) {
+            // new run of data
+            runSrc = runEnd = src;
+            runDst = kept;
+            inRun = true;
+        }
+        if (srcEnd > runEnd) {
+            // extend the run
+            memmove(base + kept, base + runEnd, srcEnd - runEnd);
+            kept += srcEnd - runEnd;
+            runEnd = srcEnd;
+        }
+        next->offset = runDst + (src - runSrc);
+    }
+}
+
+static int parse_inner_txns_chunk(fields_array_t* fields, bool lastChunk) {
+    while (transactionContext.parseState == TXN_INNER_TXNS) {
+        uint8_t* pending = transactionContext.rawTx + transactionContext.parsedLength;
+        const uint32_t pendingLength =
+            transactionContext.rawTxLength - transactionContext.parsedLength;
+        const uint32_t payloadLeft =
+            transactionContext.payloadSize - transactionContext.payloadOffset;
+
+        // wait until the inner transaction is received entirely
+        if (pendingLength < sizeof(inner_tx_header_t)) {
+            return lastChunk ? E_INVALID_DATA : E_SUCCESS;
+        }
+        const uint32_t size = ((const inner_tx_header_t*) pending)->size;
+        if (size > payloadLeft || size + inner_txn_padding(size) > payloadLeft) {
+            return E_INVALID_DATA;
+        }
+        const uint32_t length = size + inner_txn_padding(size);
+        if (pendingLength < length) {
+            return lastChunk ? E_INVALID_DATA : E_SUCCESS;
+        }
+
+        buffer_t innerTx = {pending, length, 0};
+        const uint8_t first = fields->numFields;
+        uint32_t innerSize;
+        BAIL_IF(parse_inner_txn(&innerTx, is_cosigning(), fields, &innerSize));
+
+        // keep only the data of the new fields, and drop the rest of the inner transaction
+        const uint32_t kept = keep_field_data(fields,
+                                              first,
+                                              transactionContext.parsedLength,
+                                              transactionContext.parsedLength + length);
+        memmove(pending + kept, pending + length, pendingLength - length);
+        transactionContext.parsedLength += kept;
+        transactionContext.rawTxLength -= length - kept;
+        transactionContext.payloadOffset += length;
+        transactionContext.innerTxSize += innerSize;
+
+        if (transactionContext.innerTxSize >=
+            transactionContext.payloadSize - sizeof(inner_tx_header_t)) {
+            // end of the payload, the cosignatures that may follow are not shown
+            transactionContext.rawTxLength = transactionContext.parsedLength;
+            transactionContext.parseState = TXN_TRAILER;
+        }
+    }
+
+    return E_SUCCESS;
+}
+
+static int parse_stored_chunk(bool lastChunk, fields_array_t* fields) {
+    if (transactionContext.parseState == TXN_HEADER) {
+        if (transactionContext.rawTxLength < AGGREGATE_HEADER_LENGTH && !lastChunk) {
+            return E_SUCCESS;
+        }
+        const common_header_t* txnHeader = (const common_header_t*) transactionContext.rawTx;
+        if (transactionContext.rawTxLength < AGGREGATE_HEADER_LENGTH ||
+            !is_aggregate(txnHeader->transactionType)) {
+            transactionContext.parseState = TXN_BUFFERED;
+        } else {
+            BAIL_IF(parse_aggregate_header_chunk(fields));
+            transactionContext.parseState = TXN_INNER_TXNS;
+        }
+    }
+
+    if (transactionContext.parseState == TXN_BUFFERED) {
+        if (!lastChunk) {
+            return E_SUCCESS;
+        }
+        buffer_t rawTxData = {transactionContext.rawTx, transactionContext.rawTxLength, 0};
+        return parse_txn_context(&rawTxData, fields);
+    }
+
+    BAIL_IF(parse_inner_txns_chunk(fields, lastChunk));
+
+    if (lastChunk) {
+        // Show tx fee
+        const txn_fee_t* fee =
+            (const txn_fee_t*) (transactionContext.rawTx + sizeof(common_header_t));
+        BAIL_IF(add_new_field(fields,
+                              DHP_UINT64_TXN_FEE,
+                              STI_DHP,
+                              sizeof(uint64_t),
+                              (const uint8_t*) &fee->maxFee));
+    }
+    return E_SUCCESS;
+}
+
+int parse_txn_chunk(const buffer_t* chunk, bool lastChunk, fields_array_t* fields) {
+    if (transactionContext.parseState != TXN_TRAILER) {
+        if (transactionContext.rawTxLength + chunk->size > MAX_RAW_TX) {
+            return E_DATA_TOO_LARGE;
+        }
+        memcpy(transactionContext.rawTx + transactionContext.rawTxLength, chunk->ptr, chunk->size);
+        transactionContext.rawTxLength += chunk->size;
+    }
+    return parse_stored_chunk(lastChunk, fields);
+}
+
+/*
+ * Compressed uploads
+ *
+ * Addresses and public keys repeated in a transaction are sent once, then referred to by
+ * their index. A chunk is a sequence of whole tokens:
+ *
+ *   0x00 - 0x7F  (n - 1) || n bytes      the n bytes
+ *   0x80 - 0xBF  index                   the value defined with this index
+ *   0xC0         24 bytes                the address, defined with the next index
+ *   0xC1         32 bytes                the public key, defined with the next index
+ *
+ * Indexes go round MAX_UPLOAD_REFERENCES values: each definition replaces the oldest one.
+ */
+
+#define UPLOAD_TOKEN_KIND_MASK    0xC0
+#define UPLOAD_TOKEN_LITERAL_MASK 0x80
+#define UPLOAD_TOKEN_REFERENCE    0x80
+#define UPLOAD_TOKEN_INDEX_MASK   0x3F
+#define UPLOAD_TOKEN_DEFINE_24    0xC0
+#define UPLOAD_TOKEN_DEFINE_32    0xC1
+#define UPLOAD_ADDRESS_LENGTH     24
+
+static int expand_chunk(const buffer_t* chunk, uint8_t* out, size_t size, size_t* length) {
+    size_t in = 0;
+    *length = 0;
+    while (in < chunk->size) {
+        const uint8_t token = chunk->ptr[in++];
+        const uint8_t* value = chunk->ptr + in;
+        size_t valueLength;
+
+        if ((token & UPLOAD_TOKEN_LITERAL_MASK) == 0) {
+            valueLength = (size_t) token + 1;
+            in += valueLength;
+        } else if ((token & UPLOAD_TOKEN_KIND_MASK) == UPLOAD_TOKEN_REFERENCE) {
+            const uint8_t index = token & UPLOAD_TOKEN_INDEX_MASK;
+            if ((index >= MAX_UPLOAD_REFERENCES) ||
+                (transactionContext.referenceLengths[index] == 0)) {
+                return E_INVALID_DATA;
+            }
+            value = transactionContext.references[index];
+            valueLength = transactionContext.referenceLengths[index];
+        } else if ((token == UPLOAD_TOKEN_DEFINE_24) || (token == UPLOAD_TOKEN_DEFINE_32)) {
+            valueLength = (token == UPLOAD_TOKEN_DEFINE_24) ? UPLOAD_ADDRESS_LENGTH
+                                                            : MAX_UPLOAD_REFERENCE_LEN;
+            in += valueLength;
+            if (in > chunk->size) {
+                return E_INVALID_DATA;
+            }
+            const uint8_t index = transactionContext.nextReference;
+            memcpy(transactionContext.references[index], value, valueLength);
+            transactionContext.referenceLengths[index] = valueLength;
+            transactionContext.nextReference = (index + 1) % MAX_UPLOAD_REFERENCES;
+        } else {
+            return E_INVALID_DATA;
+        }
+
+        // tokens are never split between chunks
+        if (in > chunk->size) {
+            return E_INVALID_DATA;
+        }
+        if (*length + valueLength > size) {
+            return E_DATA_TOO_LARGE;
+        }
+        memcpy(out + *length, value, valueLength);
+        *length += valueLength;
+    }
+    return E_SUCCESS;
+}
+
+int parse_compressed_txn_chunk(const buffer_t* chunk, bool lastChunk, fields_array_t* fields) {
+    if (transactionContext.parseState != TXN_TRAILER) {
+        size_t length;
+        BAIL_IF(expand_chunk(chunk,
+                             transactionContext.rawTx + transactionContext.rawTxLength,
+                             MAX_RAW_TX - transactionContext.rawTxLength,
+                             &length));
+        transactionContext.rawTxLength += length;
+    }
+    return parse_stored_chunk(lastChunk, fields);
+}
@@ -38,11 +38,36 @@ typedef struct {
 
 #pragma pack(pop)
 
+#pragma pack(push, 1)
+/**
+ * Field as stored in fields_array_t, in 5 bytes instead of the 8 bytes of field_t: its data is
+ * referenced by its offset in fields_array_t.base, and its data type and length are packed
+ * together. Use fields_get() to read it.
+ */
+typedef struct {
+    uint16_t offset;      ///< offset of the field data in fields_array_t.base
+    uint8_t id;           ///< field ID
+    uint16_t typeLength;  ///< data type index (4 high bits) and data length (12 low bits)
+} packed_field_t;
+#pragma pack(pop)
+
 typedef struct {
+    const uint8_t* base;  ///< transaction buffer, where the data of all the fields is
     uint8_t numFields;
-    field_t arr[MAX_FIELD_COUNT];
+    packed_field_t arr[MAX_FIELD_COUNT];
 } fields_array_t;
 
+/**
+ * Unpacks a field of a fields array, to resolve its name and format it.
+ *
+ * Field data lengths are capped to 4095 bytes, which is more than is ever displayed.
+ *
+ * @param[in]  fields  An array with the individual transaction fields
+ * @param[in]  index   Index of the field, lower than fields->numFields
+ * @param[out] field   The unpacked field
+ */
+void fields_get(const fields_array_t* fields, uint8_t index, field_t* field);
+
 /**
  * Given a buffer with a transaction serialization, parses the buffer and
  * extracts parameters and creates a fields array to be displayed to the
@@ -57,4 +82,50 @@ typedef struct {
  */
 int parse_txn_context(buffer_t* rawTxdata, fields_array_t* fields);
 
+/**
+ * Given a buffer with the hashes of aggregate bonded transactions to cosign, creates the
+ * fields array of their summary: the number of transactions, then each hash.
+ *
+ * The buffer is the number of hashes (1 byte), followed by the hashes (32 bytes each).
+ *
+ * @param[in]  rawTxdata  A buffer with the number of hashes and the hashes
+ * @param[out] fields     An array with the fields of the summary
+ * @return                one of the codes in the '_parser_error' enum
+ */
+int parse_cosign_batch(buffer_t* rawTxdata, fields_array_t* fields);
+
+/**
+ * Appends the next chunk of a transaction serialization to transactionContext.rawTx, and
+ * parses as much of it as possible.
+ *
+ * Transactions are signed entirely, so they are buffered and parsed with their last chunk.
+ * Aggregates are only signed up to their transaction hash: their inner transactions are
+ * parsed as soon as they are received, and only the data of their fields is kept, so the
+ * size of an aggregate is not limited by MAX_RAW_TX.
+ *
+ * Once the last chunk is parsed, transactionContext.signDataLength bytes of rawTx are to
+ * be signed.
+ *
+ * @param[in]  chunk      Next chunk of the raw tx serialized data
+ * @param[in]  lastChunk  Whether this is the last chunk of the transaction
+ * @param[out] fields     An array with the individual transaction fields, complete once the
+ *                        last chunk is parsed
+ * @return                one of the codes in the '_parser_error' enum
+ */
+int parse_txn_chunk(const buffer_t* chunk, bool lastChunk, fields_array_t* fields);
+
+/**
+ * Same as parse_txn_chunk(), for a chunk of a compressed upload: the chunk is a sequence of
+ * tokens (literal bytes, or the definition of or a reference to an address or a public key),
+ * which is expanded in transactionContext.rawTx, so that the transaction is stored and signed
+ * as if it was not compressed.
+ *
+ * @param[in]  chunk      Next chunk of the compressed raw tx serialized data
+ * @param[in]  lastChunk  Whether this is the last chunk of the transaction
+ * @param[out] fields     An array with the individual transaction fields, complete once the
+ *                        last chunk is parsed
+ * @return                one of the codes in the '_parser_error' enum
+ */
+int parse_compressed_txn_chunk(const buffer_t* chunk, bool lastChunk, fields_array_t* fields);
+
 #endif  // LEDGER_APP_DHP_DHPPARSE_H
@@ -28,6 +28,10 @@
 #define MAX_ARRAY_LEN      8
 #define MAX_PATH_COUNT     6
 #define MAX_STEP_COUNT     8
+// Public keys returned by a single GET_PUBLIC_KEY_RANGE response: 1 + 7 * 32 bytes fit in an APDU
+#define MAX_PUBLIC_KEY_RANGE 7
+// Largest value (public key) a compressed upload can refer to
+#define MAX_UPLOAD_REFERENCE_LEN 32
 
 // Hardware dependent limits
 //   Ledger Nano X has 30K RAM
@@ -37,6 +41,7 @@
 #define MAX_FIELD_COUNT        60
 #define MAX_FIELD_LEN          1024
 #define MAX_RAW_TX             10000
+#define MAX_UPLOAD_REFERENCES  16
 #define DISPLAY_SEGMENTED_ADDR false
 
 #elif defined(TARGET_NANOS)
@@ -44,6 +49,7 @@
 #define MAX_FIELD_COUNT        24
 #define MAX_FIELD_LEN          128
 #define MAX_RAW_TX             800
+#define MAX_UPLOAD_REFERENCES  4
 #define DISPLAY_SEGMENTED_ADDR true
 
 #endif
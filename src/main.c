@@ -26,6 +26,7 @@
 #include "types.h"
 #include "io.h"
 #include "parser.h"
+#include "crypto.h"
 
 // IO_SEPROXYHAL_BUFFER_SIZE_B define in Makefile
 unsigned char G_io_seproxyhal_spi_buffer[IO_SEPROXYHAL_BUFFER_SIZE_B];
@@ -120,6 +121,7 @@ unsigned char io_event(unsigned char channel) {
 #endif  // HAVE_NBGL
 
         case SEPROXYHAL_TAG_TICKER_EVENT:
+            crypto_derivation_cache_tick();
             UX_TICKER_EVENT(G_io_seproxyhal_spi_buffer, {
                 if (UX_ALLOWED) {
                     // redisplay screen
@@ -145,6 +147,7 @@ unsigned char io_event(unsigned char channel) {
 void app_exit(void) {
     BEGIN_TRY_L(exit) {
         TRY_L(exit) {
+            crypto_wipe_derivation_cache();
             os_sched_exit(1);
         }
         FINALLY_L(exit) {
@@ -162,6 +165,7 @@ __attribute__((section(".boot"))) int main(void) {
 
     for (;;) {
         reset_transaction_context();
+        crypto_wipe_derivation_cache();
 
         UX_INIT()
         BEGIN_TRY {
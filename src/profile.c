@@ -0,0 +1,76 @@
+/*******************************************************************************
+ *    DHP Wallet
+ *    (c) 2023 dHealth
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *      http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ ********************************************************************************/
+#include "profile.h"
+
+#ifdef HAVE_PROFILING
+#include <stdbool.h>
+#include <string.h>
+
+#define STACK_PATTERN 0xA5
+// stack kept below the frame of profile_begin(), for the functions it calls
+#define STACK_MARGIN 64
+
+// bounds of the application stack, defined by the SDK link script
+extern uint8_t _stack;
+extern uint8_t _estack;
+
+// the SDK keeps its stack canary word at the bottom of the stack: it is never painted
+#ifdef HAVE_BOLOS_APP_STACK_CANARY
+#define STACK_BOTTOM (&_stack + sizeof(uint32_t))
+#else
+#define STACK_BOTTOM (&_stack)
+#endif
+
+profile_t profile;
+static bool stackPainted;
+
+void profile_begin(void) {
+    memset(&profile, 0, sizeof(profile));
+
+    uint8_t top;
+    uint8_t* end = &top - STACK_MARGIN;
+    for (uint8_t* p = STACK_BOTTOM; p < end; p++) {
+        *p = STACK_PATTERN;
+    }
+    stackPainted = true;
+}
+
+void profile_count(profile_stage_e stage, uint32_t units) {
+    profile.stages[stage].calls++;
+    profile.stages[stage].units += units;
+}
+
+void profile_track(uint8_t numFields, uint32_t rawTxLength) {
+    if (numFields > profile.maxFields) {
+        profile.maxFields = numFields;
+    }
+    if (rawTxLength > profile.maxRawTxLength) {
+        profile.maxRawTxLength = rawTxLength;
+    }
+}
+
+uint32_t profile_stack_usage(void) {
+    if (!stackPainted) {
+        return 0;
+    }
+    const uint8_t* p = STACK_BOTTOM;
+    while (p < &_estack && *p == STACK_PATTERN) {
+        p++;
+    }
+    return (uint32_t)(&_estack - p);
+}
+#endif  // HAVE_PROFILING
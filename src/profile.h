@@ -0,0 +1,74 @@
+/*******************************************************************************
+ *    DHP Wallet
+ *    (c) 2023 dHealth
+ *
+ *  Licensed under the Apache License, Version 2.0 (the "License");
+ *  you may not use this file except in compliance with the License.
+ *  You may obtain a copy of the License at
+ *
+ *      http://www.apache.org/licenses/LICENSE-2.0
+ *
+ *  Unless required by applicable law or agreed to in writing, software
+ *  distributed under the License is distributed on an "AS IS" BASIS,
+ *  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ *  See the License for the specific language governing permissions and
+ *  limitations under the License.
+ ********************************************************************************/
+#ifndef LEDGER_APP_DHP_PROFILE_H
+#define LEDGER_APP_DHP_PROFILE_H
+
+#include <stdint.h>
+
+/**
+ * Stages of an operation which are counted by debug builds (HAVE_PROFILING).
+ */
+typedef enum {
+    PROFILE_PARSE,   ///< chunks parsed, units: transaction bytes
+    PROFILE_FORMAT,  ///< fields formatted for the review, units: characters
+    PROFILE_DERIVE,  ///< private keys derived, units: BIP32 path levels
+    PROFILE_SIGN,    ///< signatures, units: bytes signed
+    PROFILE_STAGE_COUNT
+} profile_stage_e;
+
+#ifdef HAVE_PROFILING
+typedef struct {
+    uint16_t calls;
+    uint32_t units;
+} profile_stage_t;
+
+typedef struct {
+    profile_stage_t stages[PROFILE_STAGE_COUNT];
+    uint8_t maxFields;        ///< high-water mark of the number of fields
+    uint32_t maxRawTxLength;  ///< high-water mark of the bytes stored in rawTx
+} profile_t;
+
+extern profile_t profile;
+
+/**
+ * Starts the profile of an operation: resets the counters, and fills the unused stack with a
+ * pattern, to find how deep the operation uses it.
+ */
+void profile_begin(void);
+
+/**
+ * Counts a call of 'stage', processing 'units'.
+ */
+void profile_count(profile_stage_e stage, uint32_t units);
+
+/**
+ * Updates the high-water marks of the number of fields and of the bytes stored in rawTx.
+ */
+void profile_track(uint8_t numFields, uint32_t rawTxLength);
+
+/**
+ * Returns the stack bytes used since profile_begin(): the stack above the lowest address
+ * whose pattern was overwritten. 0 if no operation was profiled.
+ */
+uint32_t profile_stack_usage(void);
+#else
+#define profile_begin()
+#define profile_count(stage, units)
+#define profile_track(numFields, rawTxLength)
+#endif
+
+#endif  // LEDGER_APP_DHP_PROFILE_H
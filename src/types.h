@@ -46,9 +46,12 @@ typedef enum {
  * Enumeration with expected INS of APDU commands.
  */
 typedef enum {
-    GET_PUBLIC_KEY = 0x02,  /// public key of corresponding BIP32 path
-    SIGN_TX = 0x04,         /// sign transaction with BIP32 path
-    GET_VERSION = 0x06,     /// version of the application
+    GET_PUBLIC_KEY = 0x02,        /// public key of corresponding BIP32 path
+    SIGN_TX = 0x04,               /// sign transaction with BIP32 path
+    GET_VERSION = 0x06,           /// version of the application
+    GET_PUBLIC_KEY_RANGE = 0x08,  /// public keys of consecutive BIP32 paths
+    COSIGN_BATCH = 0x0A,          /// cosign the hashes of many aggregate bonded transactions
+    GET_PROFILE = 0x0C,           /// counters of the last operation, debug builds only
 } ApduInstruction_t;
 
 /**
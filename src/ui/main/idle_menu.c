@@ -19,12 +19,14 @@
 #include <os_io_seproxyhal.h>
 #include <ux.h>
 #include "glyphs.h"
+#include "crypto.h"
 #ifdef HAVE_NBGL
 #include "nbgl_use_case.h"
 #endif
 
 static void app_quit(void) {
     // exit app here
+    crypto_wipe_derivation_cache();
     os_sched_exit(-1);
 }
 
@@ -24,6 +24,7 @@
 #include "dhp/format/fields.h"
 #include "dhp/format/format.h"
 #include "glyphs.h"
+#include "profile.h"
 
 #ifdef HAVE_NBGL
 #include "nbgl_use_case.h"
@@ -67,15 +68,16 @@ static void update_title(const field_t *field) {
 }
 
 static void update_value(const field_t *field) {
-    memset(fieldValue, 0, MAX_FIELD_LEN);
     format_field(field, fieldValue);
+    profile_count(PROFILE_FORMAT, strlen(fieldValue));
 }
 
 static void update_content(int stackSlot) {
     int stepIndex = G_ux.flow_stack[stackSlot].index;
-    const field_t *field = &fields->arr[stepIndex];
-    update_title(field);
-    update_value(field);
+    field_t field;
+    fields_get(fields, stepIndex, &field);
+    update_title(&field);
+    update_value(&field);
 #ifdef HAVE_PRINTF
     PRINTF("\nPage %d - Title: %s - Value: %s\n", stepIndex, fieldName, fieldValue);
 #endif
@@ -95,6 +97,10 @@ typedef struct review_argument_t {
 } review_argument_t;
 
 static review_argument_t bkp_args[MAX_TAG_VALUE_PAIRS_DISPLAYED];
+// Index of the pair held by each review argument, NO_PAIR if none: pairs are asked again
+// when pages are drawn again, and are only formatted when they are not held anymore
+#define NO_PAIR                       0xFF
+static uint8_t bkp_pairs[MAX_TAG_VALUE_PAIRS_DISPLAYED];
 
 static void transaction_rejected(void) {
     approval_menu_callback(OPTION_REJECT);
@@ -119,15 +125,19 @@ static void review_choice(bool confirm) {
 
 // function called by NBGL to get the pair indexed by "index"
 static nbgl_layoutTagValue_t *get_review_pair(uint8_t index) {
-    const field_t *field = &fields->arr[index];
-
     // Backup review argument as MAX_TAG_VALUE_PAIRS_DISPLAYED can be displayed
     // simultaneously and their content must be store on app side buffer as
     // only the buffer pointer is copied by the SDK and not the buffer content.
     uint8_t bkp_index = index % MAX_TAG_VALUE_PAIRS_DISPLAYED;
 
-    resolve_fieldname(field, bkp_args[bkp_index].name);
-    format_field(field, bkp_args[bkp_index].value);
+    if (bkp_pairs[bkp_index] != index) {
+        field_t field;
+        fields_get(fields, index, &field);
+        resolve_fieldname(&field, bkp_args[bkp_index].name);
+        format_field(&field, bkp_args[bkp_index].value);
+        profile_count(PROFILE_FORMAT, strlen(bkp_args[bkp_index].value));
+        bkp_pairs[bkp_index] = index;
+    }
 
     pair.item = bkp_args[bkp_index].name;
     pair.value = bkp_args[bkp_index].value;
@@ -170,6 +180,8 @@ void display_review_menu(fields_array_t *transactionParam, result_action_t callb
 
     ux_flow_init(0, ux_review_flow, NULL);
 #else   // HAVE_BAGL
+    // pairs of a previous review must be formatted again
+    memset(bkp_pairs, NO_PAIR, sizeof(bkp_pairs));
     nbgl_useCaseReviewStart(&C_stax_app_dHealth_64px,
                             "Review transaction",
                             NULL,
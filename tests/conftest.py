@@ -1,3 +1,10 @@
+import os
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from ledgered.devices import Devices
 from ragger.conftest import configuration
 
 ###########################
@@ -13,3 +20,98 @@ from ragger.conftest import configuration
 
 # Pull all features from the base ragger conftest using the overridden configuration
 pytest_plugins = ("ragger.conftest.base_conftest", )
+
+ROOT_DIR = Path(__file__).parent.parent
+
+# With pytest-xdist ('-n <workers>'), each worker runs its own Speculos instance per device
+# model. Ragger looks for unused ports from 5000 on, which races between workers: each
+# instance is given its own API and APDU ports instead.
+SPECULOS_BASE_PORT = 5000
+SPECULOS_PORTS_PER_INSTANCE = 2
+
+
+def pytest_addoption(parser):
+    parser.addoption("--transcript", action="store", default=None, type=Path,
+                     help="Record the APDU exchanges in '<directory>/<device>.transcript'")
+    parser.addoption("--replay", action="store_true", default=False,
+                     help="Answer the APDUs from the --transcript files instead of a backend")
+
+
+def worker_index() -> Optional[int]:
+    """Index of the pytest-xdist worker running this process, None without pytest-xdist."""
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    return None if worker is None else int(worker.removeprefix("gw"))
+
+
+def transcript_path(directory: Path, device) -> Path:
+    """File recorded by this process: each pytest-xdist worker records its own."""
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    suffix = "" if worker is None else f"-{worker}"
+    return directory / f"{device.name}{suffix}.transcript"
+
+
+def application_binary(device) -> Path:
+    device_name = "nanos2" if device.name == "nanosp" else device.name
+    return ROOT_DIR / "build" / device_name / "bin" / "app.elf"
+
+
+@pytest.fixture(scope="session")
+def transcript(pytestconfig, device):
+    """Transcript of 'device' when --transcript is given, saved at the end of a recording."""
+    directory = pytestconfig.getoption("transcript")
+    if directory is None:
+        yield None
+        return
+    from apps.dHealth_transcript import Transcript, build_fingerprint
+    binary = application_binary(device)
+    if pytestconfig.getoption("replay"):
+        # the files of every worker of the recording
+        paths = sorted(directory.glob(f"{device.name}.transcript"))
+        paths += sorted(directory.glob(f"{device.name}-gw*.transcript"))
+        if not paths:
+            pytest.fail(f"No {device.name} transcript to replay in {directory}")
+        recorded = Transcript.load(paths[0])
+        for path in paths[1:]:
+            part = Transcript.load(path)
+            if part.fingerprint != recorded.fingerprint:
+                pytest.fail(f"{path} was recorded with another build of the application")
+            recorded.answers.update(part.answers)
+        # without a build, the transcript is trusted
+        if binary.is_file() and recorded.fingerprint != build_fingerprint(binary):
+            pytest.fail(f"{paths[0]} was recorded with another build of the application")
+        yield recorded
+        return
+    path = transcript_path(directory, device)
+    fingerprint = build_fingerprint(binary)
+    recorded = Transcript.load(path) if path.is_file() else Transcript(fingerprint)
+    if recorded.fingerprint != fingerprint:
+        recorded = Transcript(fingerprint)
+    yield recorded
+    directory.mkdir(parents=True, exist_ok=True)
+    recorded.save(path)
+
+
+@pytest.fixture(scope=configuration.OPTIONAL.BACKEND_SCOPE)
+def additional_speculos_arguments(device) -> List[str]:
+    """Ports of the Speculos instance of this pytest-xdist worker for 'device'."""
+    index = worker_index()
+    if index is None:
+        return []
+    models = [model.name for model in Devices()]
+    instance = index * len(models) + models.index(device.name)
+    port = SPECULOS_BASE_PORT + SPECULOS_PORTS_PER_INSTANCE * instance
+    return ["--api-port", str(port), "--apdu-port", str(port + 1)]
+
+
+@pytest.fixture(scope=configuration.OPTIONAL.BACKEND_SCOPE)
+def backend(request, pytestconfig, device, transcript):
+    """The ragger backend, recording into or replaying from the transcript if any."""
+    if transcript is None:
+        yield request.getfixturevalue("backend")
+        return
+    from apps.dHealth_transcript import TranscriptRecorder, TranscriptReplayer
+    if pytestconfig.getoption("replay"):
+        with TranscriptReplayer(device, transcript) as replayer:
+            yield replayer
+        return
+    yield TranscriptRecorder(request.getfixturevalue("backend"), transcript)
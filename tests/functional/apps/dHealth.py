@@ -1,12 +1,24 @@
+from bisect import bisect_right
+from itertools import accumulate
+from math import ceil
 from contextlib import contextmanager
+from dataclasses import dataclass
 from enum import IntEnum
-from typing import Generator
-from struct import pack
+from time import perf_counter, sleep
+from typing import TYPE_CHECKING, Callable, Dict, Generator, Iterable, List, Optional, Union
+from struct import pack, Struct
 
-from ragger.backend.interface import BackendInterface, RAPDU
-from ragger.utils import split_message
+from ragger.error import ExceptionRAPDU
+from ragger.utils import RAPDU, split_message
 from ragger.bip import pack_derivation_path
 
+from .dHealth_transaction_schema import TRANSACTION_TYPES
+from .dHealth_upload import compress_upload, split_upload
+
+if TYPE_CHECKING:
+    # ragger.backend loads every backend, Speculos included: only annotations need it
+    from ragger.backend.interface import BackendInterface
+
 
 TESTNET = 152
 MAINNET = 104
@@ -18,6 +30,9 @@ class INS(IntEnum):
     INS_GET_PUBLIC_KEY = 0x02
     INS_SIGN = 0x04
     INS_GET_VERSION = 0x06
+    INS_GET_PUBLIC_KEY_RANGE = 0x08
+    INS_COSIGN_BATCH = 0x0A
+    INS_GET_PROFILE = 0x0C
 
 
 CLA = 0xE0
@@ -27,13 +42,53 @@ P1_NON_CONFIRM = 0x00
 P2_NO_CHAINCODE = 0x00
 P2_CHAINCODE = 0x01
 P1_MASK_ORDER = 0x01
+P1_MASK_OFFSET = 0x02
 P1_MASK_MORE = 0x80
 P2_SECP256K1 = 0x40
 P2_ED25519 = 0x80
+P2_COMPRESSED = 0x01
+P1_VERSION = 0x00
+P1_VERSION_LIMITS = 0x01
+P1_COSIGN_NEXT = 0x02
+
+CAPABILITY_STREAMED_AGGREGATES = 0x01
+CAPABILITY_RESUMABLE_SIGNING = 0x02
+CAPABILITY_COSIGN_BATCH = 0x04
+CAPABILITY_COMPRESSED_UPLOAD = 0x08
 
 STATUS_OK = 0x9000
 
 MAX_CHUNK_SIZE = 255
+MAX_PUBLIC_KEY_RANGE = 7
+TRANSACTION_HASH_LENGTH = 32
+SIGNATURE_LENGTH = 64
+# cosignatures in each response to COSIGN_BATCH, once a batch is approved
+COSIGNATURES_PER_RESPONSE = 3
+
+# Resumable sign requests: transport errors after which a packet is sent again, and the
+# bounded exponential back-off between attempts, in seconds
+RETRYABLE_ERRORS = (OSError,)
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.05
+MAX_BACKOFF = 1.0
+
+APDU_HEADER = Struct(">BBBBB")
+# version (4) || MAX_RAW_TX (2) || MAX_FIELD_COUNT (1) || MAX_FIELD_LEN (2) ||
+# max APDU data length (1) || capability flags (1) || max hashes of a COSIGN_BATCH (1) ||
+# values a compressed upload can refer to (1), missing before compressed uploads
+VERSION_LIMITS = Struct(">4xHBHBBB")
+UPLOAD_REFERENCES = Struct(">B")
+TRANSACTION_TYPE = Struct("<H")
+TRANSACTION_TYPE_OFFSET = 32 + 1 + 1
+AGGREGATE_TYPES = (TRANSACTION_TYPES['AGGREGATE_COMPLETE'], TRANSACTION_TYPES['AGGREGATE_BONDED'])
+# offset of the data of a resumable sign packet, and transaction bytes received by the device
+PACKET_OFFSET = Struct(">I")
+# GET_PROFILE of debug builds: number of stages (1) || calls (2) || units (4) for each stage ||
+# max fields (1) || max rawTx length (2) || stack bytes used (2)
+PROFILE_STAGES = ("parse", "format", "derive", "sign")
+PROFILE_STAGE_COUNT = Struct(">B")
+PROFILE_STAGE = Struct(">HI")
+PROFILE_HIGH_WATER_MARKS = Struct(">BHH")
 
 
 class ErrorType:
@@ -60,9 +115,210 @@ class ErrorType:
     INTERNAL_ERROR = 0x6A83
 
 
+class UnsupportedRequestError(Exception):
+    """Raised before sending a request that the application does not support."""
+
+
+@dataclass(frozen=True)
+class DeviceLimits:
+    """Limits reported by the device with GET_VERSION."""
+    max_raw_tx: int
+    max_field_count: int
+    max_field_len: int
+    max_chunk_size: int
+    streamed_aggregates: bool
+    resumable_signing: bool = False
+    max_cosign_batch: int = 0  # 0 if COSIGN_BATCH is not supported
+    max_upload_references: int = 0  # 0 if compressed uploads are not supported
+
+    @classmethod
+    def from_response(cls, response: bytes) -> "DeviceLimits":
+        max_raw_tx, max_field_count, max_field_len, max_chunk_size, flags, max_cosign_batch = \
+            VERSION_LIMITS.unpack_from(response)
+        max_upload_references = 0
+        if flags & CAPABILITY_COMPRESSED_UPLOAD:
+            max_upload_references, = UPLOAD_REFERENCES.unpack_from(response, VERSION_LIMITS.size)
+        return cls(max_raw_tx, max_field_count, max_field_len, max_chunk_size,
+                   bool(flags & CAPABILITY_STREAMED_AGGREGATES),
+                   bool(flags & CAPABILITY_RESUMABLE_SIGNING),
+                   max_cosign_batch if flags & CAPABILITY_COSIGN_BATCH else 0,
+                   max_upload_references)
+
+    def check_transaction(self, message: bytes) -> None:
+        """Raise the error the device would answer if 'message' can't be stored for signing.
+
+        Aggregates are parsed while they are received when the device streams them, so only
+        the size of the other transactions is known to be too large in advance.
+        """
+        if self.streamed_aggregates and len(message) >= TRANSACTION_TYPE_OFFSET + TRANSACTION_TYPE.size:
+            transaction_type, = TRANSACTION_TYPE.unpack_from(message, TRANSACTION_TYPE_OFFSET)
+            if transaction_type in AGGREGATE_TYPES:
+                return
+        if len(message) > self.max_raw_tx:
+            raise ExceptionRAPDU(ErrorType.SIGNING_DATA_TOO_LARGE, b"")
+
+
+@dataclass(frozen=True)
+class StageProfile:
+    """Calls of a stage of the last operation, and the units they processed: transaction bytes
+    parsed, characters formatted, BIP32 path levels derived or bytes signed."""
+    calls: int
+    units: int
+
+
+@dataclass(frozen=True)
+class Profile:
+    """Counters of the last operation, reported by debug builds with GET_PROFILE."""
+    stages: Dict[str, StageProfile]
+    max_fields: int
+    max_raw_tx_length: int
+    stack_usage: int
+
+    @classmethod
+    def from_response(cls, response: bytes) -> "Profile":
+        count, = PROFILE_STAGE_COUNT.unpack_from(response)
+        offset = PROFILE_STAGE_COUNT.size
+        stages = {}
+        for index in range(count):
+            # stages added by later versions are named by their index
+            name = PROFILE_STAGES[index] if index < len(PROFILE_STAGES) else str(index)
+            stages[name] = StageProfile(*PROFILE_STAGE.unpack_from(response, offset))
+            offset += PROFILE_STAGE.size
+        return cls(stages, *PROFILE_HIGH_WATER_MARKS.unpack_from(response, offset))
+
+
+def derivation_path_range(derivation_path: str, count: int) -> List[str]:
+    """'count' consecutive paths, starting at 'derivation_path' and incrementing its last index."""
+    prefix, _, last = derivation_path.rpartition("/")
+    hardened = last.endswith("'")
+    index = int(last.rstrip("'"))
+    suffix = "'" if hardened else ""
+    return [f"{prefix}/{index + i}{suffix}" for i in range(count)]
+
+
+class SigningSession:
+    """Sign request whose APDU frames are all packed once, back to back, in a single buffer.
+
+    Frames are streamed through the raw exchange functions of the backend, and the
+    round-trip time of each exchange is appended to `timings`, in seconds.
+
+    A resumable session (P1_MASK_OFFSET) sends the offset of the data of each frame, and the
+    device acknowledges the transaction bytes it received: a frame whose exchange fails with
+    one of RETRYABLE_ERRORS is sent again after a back-off, and the upload goes on from the
+    acknowledged length instead of starting again. Up to `retries` failures are allowed in a
+    row: the budget is given back whenever the device acknowledges bytes it never had before.
+
+    With `max_references`, the values the device can refer to, the transaction is uploaded
+    compressed (P2_COMPRESSED) when this takes fewer frames.
+    """
+
+    def __init__(self, backend: "BackendInterface", derivation_path: str, message: bytes,
+                 chunk_size: int = MAX_CHUNK_SIZE, resumable: bool = False,
+                 retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+                 max_references: int = 0):
+        self._backend = backend
+        self.resumable = resumable
+        self.retries = retries if resumable else 0
+        self.backoff = backoff
+
+        path = pack_derivation_path(derivation_path)
+        prefix_size = PACKET_OFFSET.size if resumable else 0
+        chunks = split_upload(memoryview(message), chunk_size - len(path), chunk_size - prefix_size)
+        self.compressed = False
+        if max_references:
+            compressed = compress_upload(message, chunk_size - len(path), chunk_size - prefix_size,
+                                         max_references)
+            if len(compressed) < len(chunks):
+                chunks = compressed
+                self.compressed = True
+        # upload bytes sent once each frame is received
+        self.ends: List[int] = list(accumulate(map(len, chunks)))
+        count = len(chunks)
+
+        p2 = P2_ED25519 | (P2_COMPRESSED if self.compressed else 0)
+        self.buffer = bytearray(count * APDU_HEADER.size + len(path) + self.ends[-1]
+                                + (count - 1) * prefix_size)
+        view = memoryview(self.buffer)
+        self.frames: List[memoryview] = []
+        offset = 0
+        for index, chunk in enumerate(chunks):
+            prefix = path if not index else PACKET_OFFSET.pack(self.ends[index - 1]) if resumable else b""
+            p1 = P1_MASK_OFFSET if resumable else 0
+            if index:
+                p1 |= P1_MASK_ORDER
+            if index < count - 1:
+                p1 |= P1_MASK_MORE
+            length = len(prefix) + len(chunk)
+            APDU_HEADER.pack_into(self.buffer, offset, CLA, INS.INS_SIGN, p1, p2, length)
+            data = offset + APDU_HEADER.size
+            view[data:data + len(prefix)] = prefix
+            view[data + len(prefix):data + length] = chunk
+            self.frames.append(view[offset:data + length])
+            offset = data + length
+        self.timings: List[float] = []
+
+    def _exchange(self, index: int) -> RAPDU:
+        start = perf_counter()
+        try:
+            return self._backend.exchange_raw(self.frames[index])
+        finally:
+            self.timings.append(perf_counter() - start)
+
+    def _send_frames(self) -> None:
+        """Send all the frames but the last one."""
+        index = 0
+        failures = 0
+        # bytes acknowledged since the upload (re)started, and the most ever acknowledged
+        acknowledged = 0
+        furthest = 0
+        while index < len(self.frames) - 1:
+            try:
+                rapdu = self._exchange(index)
+            except RETRYABLE_ERRORS:
+                if failures == self.retries:
+                    raise
+                sleep(min(self.backoff * 2 ** failures, MAX_BACKOFF))
+                failures += 1
+                continue
+            except ExceptionRAPDU as error:
+                # The device dropped the transaction while the link was failing: start again
+                if failures == 0 or failures == self.retries or \
+                        error.status != ErrorType.INVALID_SIGNING_PACKET_ORDER:
+                    raise
+                failures += 1
+                index = 0
+                acknowledged = 0
+                continue
+
+            if self.resumable:
+                received, = PACKET_OFFSET.unpack(rapdu.data)
+                if received <= acknowledged:
+                    raise ValueError(f"Upload stalled: {received} bytes acknowledged after "
+                                     f"{acknowledged}")
+                acknowledged = received
+                if received > furthest:
+                    furthest = received
+                    failures = 0
+                index = min(bisect_right(self.ends, received), len(self.frames) - 1)
+            else:
+                index += 1
+
+    @contextmanager
+    def send_async(self) -> Generator[None, None, None]:
+        self._send_frames()
+
+        # The last frame is answered once the transaction has been reviewed
+        start = perf_counter()
+        with self._backend.exchange_async_raw(self.frames[-1]):
+            yield
+        self.timings.append(perf_counter() - start)
+
+
 class dHealthClient:
-    def __init__(self, backend: BackendInterface):
+    def __init__(self, backend: "BackendInterface"):
         self._backend = backend
+        self._limits: Optional[DeviceLimits] = None
+        self._limits_read = False
 
     def send_get_version(self) -> (int, int, int):
         rapdu: RAPDU = self._backend.exchange(CLA, INS.INS_GET_VERSION, 0, 0, b"")
@@ -78,6 +334,34 @@ class dHealthClient:
         patch = int(response[3])
         return (major, minor, patch)
 
+    def send_get_limits(self) -> Optional[DeviceLimits]:
+        """Limits of the device, or None if the application is too old to report them."""
+        try:
+            rapdu: RAPDU = self._backend.exchange(CLA, INS.INS_GET_VERSION, P1_VERSION_LIMITS, 0, b"")
+        except ExceptionRAPDU:
+            return None
+        if rapdu.status != STATUS_OK or len(rapdu.data) < VERSION_LIMITS.size:
+            return None
+        return DeviceLimits.from_response(rapdu.data)
+
+    def get_profile(self) -> Optional[Profile]:
+        """Counters of the last operation, or None if the application is not a debug build."""
+        try:
+            rapdu: RAPDU = self._backend.exchange(CLA, INS.INS_GET_PROFILE, 0, 0, b"")
+        except ExceptionRAPDU:
+            return None
+        if rapdu.status != STATUS_OK:
+            return None
+        return Profile.from_response(rapdu.data)
+
+    @property
+    def limits(self) -> Optional[DeviceLimits]:
+        """Limits of the device, read once."""
+        if not self._limits_read:
+            self._limits = self.send_get_limits()
+            self._limits_read = True
+        return self._limits
+
     def parse_get_public_key_response(self, response: bytes, network_type: int = MAINNET) -> (bytes, str, bytes):
         # response = public_key_len (1) ||
         #            public_key (32)
@@ -95,6 +379,31 @@ class dHealthClient:
         return self._backend.exchange(CLA, INS.INS_GET_PUBLIC_KEY,
                                       p1, p2, payload)
 
+    def send_get_public_key_range(self, derivation_path: str, count: int,
+                                  network_type: int = MAINNET) -> RAPDU:
+        p1 = P1_NON_CONFIRM
+        p2 = P2_ED25519
+        payload = pack_derivation_path(derivation_path) + pack("<BB", network_type, count)
+        return self._backend.exchange(CLA, INS.INS_GET_PUBLIC_KEY_RANGE,
+                                      p1, p2, payload)
+
+    def parse_get_public_key_range_response(self, response: bytes) -> List[bytes]:
+        # response = count (1) ||
+        #            public_key (32) * count
+        count = response[0]
+        assert len(response) == 1 + 32 * count
+        return [response[1 + 32 * i: 1 + 32 * (i + 1)] for i in range(count)]
+
+    def get_public_key_range(self, derivation_path: str, count: int,
+                             network_type: int = MAINNET) -> List[bytes]:
+        """Public keys of 'count' paths, from 'derivation_path' with its last index incremented."""
+        keys: List[bytes] = []
+        for path in derivation_path_range(derivation_path, count)[::MAX_PUBLIC_KEY_RANGE]:
+            chunk = min(MAX_PUBLIC_KEY_RANGE, count - len(keys))
+            rapdu = self.send_get_public_key_range(path, chunk, network_type)
+            keys += self.parse_get_public_key_range_response(rapdu.data)
+        return keys
+
     @contextmanager
     def send_async_get_public_key_confirm(self, derivation_path: str,
                                           network_type: int = MAINNET) -> RAPDU:
@@ -105,40 +414,85 @@ class dHealthClient:
                                           p1, p2, payload):
             yield
 
-    def _send_sign_message(self, message: bytes, first: bool, last: bool) -> RAPDU:
-        p1 = 0
-        if not first:
-            p1 |= P1_MASK_ORDER
-        if not last:
-            p1 |= P1_MASK_MORE
-        p2 = P2_ED25519
-        return self._backend.exchange(CLA, INS.INS_SIGN, p1, p2, message)
+    def sign_session(self, derivation_path: str, message: bytes) -> SigningSession:
+        """Sign request, with chunks as large as the device accepts.
 
-    @contextmanager
-    def _send_async_sign_message(self, message: bytes,
-                                 first: bool, last: bool) -> Generator[None, None, None]:
-        p1 = 0
-        if not first:
-            p1 |= P1_MASK_ORDER
-        if not last:
-            p1 |= P1_MASK_MORE
-        p2 = P2_ED25519
-        with self._backend.exchange_async(CLA, INS.INS_SIGN, p1, p2, message):
-            yield
+        Raises the SIGNING_DATA_TOO_LARGE ExceptionRAPDU of the device before sending anything
+        if the device can't store 'message'. The request is resumable, and compressed when this
+        saves frames, if the device supports it.
+        """
+        limits = self.limits
+        if limits is None:
+            return SigningSession(self._backend, derivation_path, message)
+        limits.check_transaction(message)
+        return SigningSession(self._backend, derivation_path, message, limits.max_chunk_size,
+                              resumable=limits.resumable_signing,
+                              max_references=limits.max_upload_references)
 
     def send_async_sign_message(self,
                                 derivation_path: str,
                                 message: bytes) -> Generator[None, None, None]:
-        messages = split_message(pack_derivation_path(derivation_path) + message, MAX_CHUNK_SIZE)
-        first = True
-
-        if len(messages) > 1:
-            self._send_sign_message(messages[0], True, False)
-            for m in messages[1:-1]:
-                self._send_sign_message(m, False, False)
-            first = False
-
-        return self._send_async_sign_message(messages[-1], first, True)
+        return self.sign_session(derivation_path, message).send_async()
 
     def get_async_response(self) -> RAPDU:
         return self._backend.last_async_response
+
+    @contextmanager
+    def send_async_cosign_batch(self, derivation_path: str,
+                                hashes: List[bytes]) -> Generator[None, None, None]:
+        """Cosign request for the hashes of aggregate bonded transactions, reviewed at once.
+
+        The device shows the number of hashes then each of them. See get_async_cosignatures().
+        """
+        payload = pack_derivation_path(derivation_path) + pack("<B", len(hashes)) + b"".join(hashes)
+        chunks = split_message(payload, MAX_CHUNK_SIZE)
+        for index, chunk in enumerate(chunks[:-1]):
+            p1 = P1_MASK_MORE | (P1_MASK_ORDER if index else 0)
+            self._backend.exchange(CLA, INS.INS_COSIGN_BATCH, p1, P2_ED25519, chunk)
+        p1 = P1_MASK_ORDER if len(chunks) > 1 else 0
+        with self._backend.exchange_async(CLA, INS.INS_COSIGN_BATCH, p1, P2_ED25519, chunks[-1]):
+            yield
+
+    def get_async_cosignatures(self, count: int) -> List[bytes]:
+        """Cosignatures of an approved batch of 'count' hashes.
+
+        The response to the last packet holds the first ones, the others are requested
+        with P1_COSIGN_NEXT. Raises a ValueError if the device does not send them all.
+        """
+        data = self._backend.last_async_response.data
+        for _ in range(ceil(count / COSIGNATURES_PER_RESPONSE) - 1):
+            if len(data) >= count * SIGNATURE_LENGTH:
+                break
+            rapdu = self._backend.exchange(CLA, INS.INS_COSIGN_BATCH, P1_COSIGN_NEXT, P2_ED25519)
+            if not rapdu.data:
+                raise ValueError(f"No more cosignatures after {len(data) // SIGNATURE_LENGTH} "
+                                 f"of {count}")
+            data += rapdu.data
+        if len(data) < count * SIGNATURE_LENGTH:
+            raise ValueError(f"{len(data) // SIGNATURE_LENGTH} cosignatures instead of {count}")
+        return [data[i * SIGNATURE_LENGTH:(i + 1) * SIGNATURE_LENGTH] for i in range(count)]
+
+    def cosign_many(self, derivation_path: str, hashes: Iterable[Union[bytes, str]],
+                    review: Callable[[], None] = lambda: None) -> List[bytes]:
+        """Cosignatures of many aggregate bonded transactions, given their hashes as bytes or hex.
+
+        Hashes are sent in batches as large as the device accepts, and 'review' is called
+        while each batch is shown to the user. Raises UnsupportedRequestError if the application
+        does not support COSIGN_BATCH.
+        """
+        hashes = [bytes.fromhex(h) if isinstance(h, str) else bytes(h) for h in hashes]
+        for index, h in enumerate(hashes):
+            if len(h) != TRANSACTION_HASH_LENGTH:
+                raise ValueError(f"hash {index}: {len(h)} bytes instead of "
+                                 f"{TRANSACTION_HASH_LENGTH}")
+        limits = self.limits
+        if limits is None or limits.max_cosign_batch == 0:
+            raise UnsupportedRequestError("The application does not support COSIGN_BATCH")
+
+        signatures: List[bytes] = []
+        for start in range(0, len(hashes), limits.max_cosign_batch):
+            batch = hashes[start:start + limits.max_cosign_batch]
+            with self.send_async_cosign_batch(derivation_path, batch):
+                review()
+            signatures += self.get_async_cosignatures(len(batch))
+        return signatures
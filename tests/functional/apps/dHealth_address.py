@@ -0,0 +1,127 @@
+# Host side address derivation, matching dhp_public_key_and_address() in src/dhp/dhp_helpers.c:
+#   raw address = network type (1) || RIPEMD160(SHA3-256(public key)) (20) || checksum (3)
+#   checksum = first 3 bytes of SHA3-256(network type || RIPEMD160 hash)
+#   pretty address = base32 of the 24 bytes raw address, 39 characters without padding
+
+import hashlib
+from base64 import b32encode
+from functools import lru_cache
+from struct import pack, unpack
+from typing import Iterable, List, Tuple, Union
+
+DHP_ADDRESS_LENGTH = 24
+DHP_PRETTY_ADDRESS_LENGTH = 39
+DHP_PUBLIC_KEY_LENGTH = 32
+
+
+# RIPEMD-160 is only provided by hashlib when OpenSSL still exposes it (it is a legacy
+# algorithm in OpenSSL 3), so a pure Python implementation is used as a fallback.
+
+_R_LEFT = [
+    0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15,
+    7, 4, 13, 1, 10, 6, 15, 3, 12, 0, 9, 5, 2, 14, 11, 8,
+    3, 10, 14, 4, 9, 15, 8, 1, 2, 7, 0, 6, 13, 11, 5, 12,
+    1, 9, 11, 10, 0, 8, 12, 4, 13, 3, 7, 15, 14, 5, 6, 2,
+    4, 0, 5, 9, 7, 12, 2, 10, 14, 1, 3, 8, 11, 6, 15, 13,
+]
+_R_RIGHT = [
+    5, 14, 7, 0, 9, 2, 11, 4, 13, 6, 15, 8, 1, 10, 3, 12,
+    6, 11, 3, 7, 0, 13, 5, 10, 14, 15, 8, 12, 4, 9, 1, 2,
+    15, 5, 1, 3, 7, 14, 6, 9, 11, 8, 12, 2, 10, 0, 4, 13,
+    8, 6, 4, 1, 3, 11, 15, 0, 5, 12, 2, 13, 9, 7, 10, 14,
+    12, 15, 10, 4, 1, 5, 8, 7, 6, 2, 13, 14, 0, 3, 9, 11,
+]
+_S_LEFT = [
+    11, 14, 15, 12, 5, 8, 7, 9, 11, 13, 14, 15, 6, 7, 9, 8,
+    7, 6, 8, 13, 11, 9, 7, 15, 7, 12, 15, 9, 11, 7, 13, 12,
+    11, 13, 6, 7, 14, 9, 13, 15, 14, 8, 13, 6, 5, 12, 7, 5,
+    11, 12, 14, 15, 14, 15, 9, 8, 9, 14, 5, 6, 8, 6, 5, 12,
+    9, 15, 5, 11, 6, 8, 13, 12, 5, 12, 13, 14, 11, 8, 5, 6,
+]
+_S_RIGHT = [
+    8, 9, 9, 11, 13, 15, 15, 5, 7, 7, 8, 11, 14, 14, 12, 6,
+    9, 13, 15, 7, 12, 8, 9, 11, 7, 7, 12, 7, 6, 15, 13, 11,
+    9, 7, 15, 11, 8, 6, 6, 14, 12, 13, 5, 14, 13, 13, 7, 5,
+    15, 5, 8, 11, 14, 14, 6, 14, 6, 9, 12, 9, 12, 5, 15, 8,
+    8, 5, 12, 9, 12, 5, 14, 6, 8, 13, 6, 5, 15, 13, 11, 11,
+]
+_K_LEFT = [0x00000000, 0x5A827999, 0x6ED9EBA1, 0x8F1BBCDC, 0xA953FD4E]
+_K_RIGHT = [0x50A28BE6, 0x5C4DD124, 0x6D703EF3, 0x7A6D76E9, 0x00000000]
+
+
+def _f(j, x, y, z):
+    if j < 16:
+        return x ^ y ^ z
+    if j < 32:
+        return (x & y) | (~x & z)
+    if j < 48:
+        return (x | ~y) ^ z
+    if j < 64:
+        return (x & z) | (y & ~z)
+    return x ^ (y | ~z)
+
+
+def _rol(x, n):
+    x &= 0xFFFFFFFF
+    return ((x << n) | (x >> (32 - n))) & 0xFFFFFFFF
+
+
+def _ripemd160_python(data: bytes) -> bytes:
+    h = [0x67452301, 0xEFCDAB89, 0x98BADCFE, 0x10325476, 0xC3D2E1F0]
+    message = data + b"\x80" + bytes(-(len(data) + 9) % 64) + pack("<Q", 8 * len(data))
+    for offset in range(0, len(message), 64):
+        x = unpack("<16I", message[offset:offset + 64])
+        al, bl, cl, dl, el = h
+        ar, br, cr, dr, er = h
+        for j in range(80):
+            t = _rol(al + _f(j, bl, cl, dl) + x[_R_LEFT[j]] + _K_LEFT[j // 16], _S_LEFT[j]) + el
+            al, bl, cl, dl, el = el, t & 0xFFFFFFFF, bl, _rol(cl, 10), dl
+            t = _rol(ar + _f(79 - j, br, cr, dr) + x[_R_RIGHT[j]] + _K_RIGHT[j // 16], _S_RIGHT[j]) + er
+            ar, br, cr, dr, er = er, t & 0xFFFFFFFF, br, _rol(cr, 10), dr
+        t = (h[1] + cl + dr) & 0xFFFFFFFF
+        h[1] = (h[2] + dl + er) & 0xFFFFFFFF
+        h[2] = (h[3] + el + ar) & 0xFFFFFFFF
+        h[3] = (h[4] + al + br) & 0xFFFFFFFF
+        h[4] = (h[0] + bl + cr) & 0xFFFFFFFF
+        h[0] = t
+    return pack("<5I", *h)
+
+
+def ripemd160(data: bytes) -> bytes:
+    try:
+        return hashlib.new("ripemd160", data).digest()
+    except ValueError:
+        return _ripemd160_python(data)
+
+
+def raw_address(public_key: bytes, network_type: int) -> bytes:
+    """24 bytes address of a public key, as shown in transaction fields."""
+    assert len(public_key) == DHP_PUBLIC_KEY_LENGTH
+    prefixed_hash = bytes([network_type]) + ripemd160(hashlib.sha3_256(public_key).digest())
+    return prefixed_hash + hashlib.sha3_256(prefixed_hash).digest()[:3]
+
+
+def pretty_address(address: bytes) -> str:
+    return b32encode(address).decode("ascii")[:DHP_PRETTY_ADDRESS_LENGTH]
+
+
+@lru_cache(maxsize=65536)
+def public_key_to_address(public_key: bytes, network_type: int) -> Tuple[bytes, str]:
+    """Raw and pretty addresses of a public key, as derived on the device."""
+    address = raw_address(bytes(public_key), network_type)
+    return address, pretty_address(address)
+
+
+def public_keys_to_addresses(public_keys: Iterable[Union[bytes, str]],
+                             network_types: Union[int, Iterable[int]]) -> List[Tuple[bytes, str]]:
+    """Bulk mode: addresses of many public keys, given as bytes or hex strings.
+
+    'network_types' is either one network type for all keys, or one per key.
+    """
+    public_keys = [bytes.fromhex(key) if isinstance(key, str) else bytes(key) for key in public_keys]
+    if isinstance(network_types, int):
+        network_types = [network_types] * len(public_keys)
+    else:
+        network_types = list(network_types)
+        assert len(network_types) == len(public_keys)
+    return [public_key_to_address(key, network_type) for key, network_type in zip(public_keys, network_types)]
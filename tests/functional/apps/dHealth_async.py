@@ -0,0 +1,135 @@
+# asyncio facade over dHealthClient, to drive several devices or Speculos instances at once.
+# Backends are blocking, so each one is given its own single-thread executor: requests to the
+# same backend stay serialized, while requests to different backends run concurrently.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+
+from ragger.backend.interface import BackendInterface
+
+from .dHealth import dHealthClient, MAINNET
+
+# called with the backend of the device reviewing a transaction
+Review = Callable[[BackendInterface], None]
+
+
+class AsyncdHealthClient:
+    def __init__(self, backend: BackendInterface, name: Optional[str] = None):
+        self.name = name or f"device-{id(backend):x}"
+        self.backend = backend
+        self._client = dHealthClient(backend)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+
+    async def _run(self, function: Callable, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def get_version(self) -> (int, int, int):
+        return await self._run(self._client.send_get_version)
+
+    def _get_public_key(self, derivation_path: str, network_type: int) -> bytes:
+        rapdu = self._client.send_get_public_key_non_confirm(derivation_path, network_type)
+        return self._client.parse_get_public_key_response(rapdu.data, network_type)
+
+    async def get_public_key(self, derivation_path: str, network_type: int = MAINNET) -> bytes:
+        return await self._run(self._get_public_key, derivation_path, network_type)
+
+    def _sign(self, derivation_path: str, message: bytes, review: Optional[Review]) -> bytes:
+        with self._client.send_async_sign_message(derivation_path, message):
+            if review is not None:
+                review(self.backend)
+        return self._client.get_async_response().data
+
+    async def sign(self, derivation_path: str, message: bytes,
+                   review: Optional[Review] = None) -> bytes:
+        """Sign a transaction and return the signature.
+
+        'review' is called with the backend, on its thread, while the device waits for approval,
+        for instance to navigate and approve the review screens on Speculos.
+        """
+        return await self._run(self._sign, derivation_path, message, review)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> "AsyncdHealthClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.close()
+
+
+@dataclass
+class DeviceStats:
+    requests: int = 0
+    failures: int = 0
+    busy_time: float = 0.0
+
+    @property
+    def average_time(self) -> float:
+        return self.busy_time / self.requests if self.requests else 0.0
+
+
+class AsyncdHealthPool:
+    """Spread requests over several clients, each one serving a shared bounded queue.
+
+    Submitting waits while the queue is full, which gives back-pressure to producers.
+    """
+
+    def __init__(self, clients: List[AsyncdHealthClient], max_pending: Optional[int] = None):
+        self.clients = clients
+        self.stats: Dict[str, DeviceStats] = {client.name: DeviceStats() for client in clients}
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending or 2 * len(clients))
+        self._workers: List[asyncio.Task] = []
+
+    async def _serve(self, client: AsyncdHealthClient) -> None:
+        stats = self.stats[client.name]
+        while True:
+            future, method, args = await self._queue.get()
+            start = perf_counter()
+            try:
+                result = await getattr(client, method)(*args)
+            except Exception as e:
+                stats.failures += 1
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                if not future.cancelled():
+                    future.set_result(result)
+            finally:
+                stats.requests += 1
+                stats.busy_time += perf_counter() - start
+                self._queue.task_done()
+
+    async def submit(self, method: str, *args) -> asyncio.Future:
+        """Queue a request, and return the future of its result."""
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._serve(client)) for client in self.clients]
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((future, method, args))
+        return future
+
+    async def get_public_key(self, derivation_path: str, network_type: int = MAINNET) -> bytes:
+        return await (await self.submit("get_public_key", derivation_path, network_type))
+
+    async def sign(self, derivation_path: str, message: bytes,
+                   review: Optional[Review] = None) -> bytes:
+        """Sign on the first free client: 'review' is given the backend of that client."""
+        return await (await self.submit("sign", derivation_path, message, review))
+
+    async def close(self) -> None:
+        await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for client in self.clients:
+            client.close()
+
+    async def __aenter__(self) -> "AsyncdHealthPool":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
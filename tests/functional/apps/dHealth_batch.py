@@ -0,0 +1,213 @@
+# Batch signing and public key export over a single backend.
+#
+# Items are read as JSON lines, from files or stdin: transactions in the format of the corpus
+# for 'sign', {"path": ..., "count": ...} ranges for 'public-keys'. Results are written as JSON
+# lines, in the order of the items, with their timings. A failed item gives a result with an
+# "error" and the batch goes on.
+#
+# While the device signs a transaction, the next one is encoded on a worker thread: encoding
+# overlaps the round trips to the device, which release the GIL while they wait.
+#
+# Backends are only imported once chosen, so that a batch on the emulator or through the daemon
+# does not load the USB or Speculos stacks.
+
+import argparse
+import json
+import sys
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, TypeVar
+
+from ragger.error import ExceptionRAPDU
+
+from .dHealth import dHealthClient, MAINNET, TESTNET
+from .dHealth_address import public_key_to_address
+from .dHealth_transaction_builder import encode_txn_context
+
+DEFAULT_PATH = "m/44'/1'/0'/0'/0'"
+BACKENDS = ("hid", "daemon", "emulator")
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+
+@dataclass
+class EncodedTransaction:
+    message: Optional[bytes]
+    encode_time: float
+    error: Optional[str] = None
+
+
+def read_items(sources: Iterable[str]) -> Iterator[str]:
+    """Non-empty lines of the files named in 'sources', '-' being stdin.
+
+    A '.json' file holds a single item, such as a file of the corpus.
+    """
+    for source in sources:
+        if source == "-":
+            lines: Iterable[str] = sys.stdin
+        elif source.endswith(".json"):
+            lines = [json.dumps(json.loads(Path(source).read_text()))]
+        else:
+            lines = Path(source).read_text().splitlines()
+        for line in lines:
+            if line.strip():
+                yield line
+
+
+def prefetch(items: Iterable[Item], function: Callable[[Item], Result],
+             executor: ThreadPoolExecutor) -> Iterator[Result]:
+    """function(item) of each item, in order, each one computed while the previous is used."""
+    pending: Optional[Future] = None
+    for item in items:
+        following = executor.submit(function, item)
+        if pending is not None:
+            yield pending.result()
+        pending = following
+    if pending is not None:
+        yield pending.result()
+
+
+def encode_transaction(line: str) -> EncodedTransaction:
+    start = perf_counter()
+    try:
+        message = encode_txn_context(json.loads(line))
+    except Exception as error:
+        return EncodedTransaction(None, perf_counter() - start, f"invalid transaction: {error}")
+    return EncodedTransaction(message, perf_counter() - start)
+
+
+def _status_error(error: ExceptionRAPDU) -> Dict:
+    return {"status": f"0x{error.status:04x}", "error": "rejected by the device"}
+
+
+def sign_transactions(client: dHealthClient, derivation_path: str, lines: Iterable[str],
+                      review: Optional[Callable[[], None]] = None) -> Iterator[Dict]:
+    """Sign the transaction of each line, encoding the next one meanwhile."""
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="encoder") as executor:
+        for index, encoded in enumerate(prefetch(lines, encode_transaction, executor)):
+            result = {"index": index, "encode_time": encoded.encode_time}
+            if encoded.error is not None:
+                result["error"] = encoded.error
+                yield result
+                continue
+            start = perf_counter()
+            try:
+                with client.send_async_sign_message(derivation_path, encoded.message):
+                    if review is not None:
+                        review()
+                result["signature"] = client.get_async_response().data.hex()
+            except ExceptionRAPDU as error:
+                result.update(_status_error(error))
+            result["device_time"] = perf_counter() - start
+            yield result
+
+
+def _parse_range(line: str) -> Tuple[str, int]:
+    item = json.loads(line)
+    return item.get("path", DEFAULT_PATH), int(item.get("count", 1))
+
+
+def export_public_keys(client: dHealthClient, lines: Iterable[str], network_type: int,
+                       key_cache: Optional[str] = None) -> Iterator[Dict]:
+    """Public keys and addresses of each {"path": ..., "count": ...} range."""
+    cache = None
+    if key_cache is not None:
+        from .dHealth_key_cache import PublicKeyCache, derive_range, device_id
+        cache = PublicKeyCache(key_cache)
+        device = device_id(client)
+    try:
+        for index, line in enumerate(lines):
+            result: Dict = {"index": index}
+            try:
+                path, count = _parse_range(line)
+            except (ValueError, AttributeError) as error:
+                result["error"] = f"invalid range: {error}"
+                yield result
+                continue
+            result.update(path=path, count=count)
+            start = perf_counter()
+            try:
+                if cache is not None:
+                    keys = derive_range(client, cache, path, count, network_type, device)
+                else:
+                    keys = client.get_public_key_range(path, count, network_type)
+                result["public_keys"] = [bytes(key).hex() for key in keys]
+                result["addresses"] = [public_key_to_address(bytes(key), network_type)[1]
+                                       for key in keys]
+            except ExceptionRAPDU as error:
+                result.update(_status_error(error))
+            result["device_time"] = perf_counter() - start
+            yield result
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def create_backend(name: str, daemon_socket: Optional[str] = None, device: str = "nanox"):
+    if name == "hid":
+        from ragger.backend import LedgerCommBackend
+        return LedgerCommBackend(None, interface="hid")
+    if name == "daemon":
+        from .dHealth_daemon import DaemonBackend, DEFAULT_SOCKET_PATH
+        return DaemonBackend(daemon_socket or DEFAULT_SOCKET_PATH)
+    if name == "emulator":
+        from .dHealth_emulator import EmulatorBackend
+        return EmulatorBackend(device)
+    raise ValueError(f"Unknown backend '{name}', expected one of {BACKENDS}")
+
+
+def write_results(results: Iterable[Dict], output: TextIO) -> int:
+    """Write 'results' as JSON lines, return the number of failed items."""
+    failures = 0
+    for result in results:
+        failures += "error" in result
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+    return failures
+
+
+def parse_arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Sign transactions or export public keys in batch")
+    parser.add_argument('--backend', choices=BACKENDS, default="hid")
+    parser.add_argument('--daemon', help="Unix socket of deviceDaemon.py, for the daemon backend")
+    parser.add_argument('--device', help="Device model of the emulator backend", default="nanox")
+    parser.add_argument('--output', help="File of the JSON lines results, stdout by default")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sign = commands.add_parser("sign", help="Sign JSON lines transactions, in the corpus format")
+    sign.add_argument('--path', help="BIP 32 path to use", default=DEFAULT_PATH)
+    sign.add_argument('inputs', nargs="*", default=["-"], help="Files of transactions, '-' for stdin")
+
+    keys = commands.add_parser("public-keys", help="Export the public keys of path ranges")
+    keys.add_argument('--path', help="First path of a single range, instead of the inputs")
+    keys.add_argument('--count', help="Number of paths of the range", type=int, default=1)
+    keys.add_argument('--mainnet', help="Addresses of the main network", action="store_true")
+    keys.add_argument('--key-cache', help="SQLite cache of the public keys")
+    keys.add_argument('inputs', nargs="*", default=["-"],
+                      help="Files of {\"path\": ..., \"count\": ...} ranges, '-' for stdin")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_arguments(argv)
+    output = sys.stdout if args.output is None else open(args.output, "w")
+    try:
+        with create_backend(args.backend, args.daemon, args.device) as backend:
+            client = dHealthClient(backend)
+            if args.command == "sign":
+                results = sign_transactions(client, args.path, read_items(args.inputs))
+            else:
+                if args.path is not None:
+                    lines: Iterable[str] = [json.dumps({"path": args.path, "count": args.count})]
+                else:
+                    lines = read_items(args.inputs)
+                network_type = MAINNET if args.mainnet else TESTNET
+                results = export_public_keys(client, lines, network_type, args.key_cache)
+            failures = write_results(results, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failures else 0
@@ -0,0 +1,403 @@
+# Daemon owning the connection to a device (or a Speculos instance), shared by local clients
+# over a Unix socket.
+#
+# The application keeps the context of an upload across APDUs and resets it when another
+# instruction comes in, so clients can't simply interleave their APDUs: a client first acquires
+# a lease on the device, exchanges its APDUs, then releases it. Waiting clients are granted the
+# lease by priority (highest first), then in arrival order. The lease of a client is released
+# when it disconnects.
+#
+# DaemonBackend is the ragger backend of the clients: dHealthClient(DaemonBackend(path)) is used
+# as with any other backend, within a 'with' block holding the lease.
+#
+# Frames, big endian: length of the payload (4) || type (1) || payload
+#   ACQUIRE   priority (1, signed)       -> GRANTED   queued time in us (4) || device name
+#   EXCHANGE  APDU                       -> RAPDU     status (2) || device time in us (4) || data
+#   RELEASE                              -> RELEASED
+#   STATS                                -> STATS     JSON
+# Any request may be answered by FAILURE, with a UTF-8 message.
+
+import asyncio
+import json
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from heapq import heappop, heappush
+from itertools import count
+from pathlib import Path
+from struct import Struct
+from time import perf_counter
+from typing import Deque, Dict, Generator, List, Optional, Tuple, Union
+
+from ledgered.devices import Devices
+from ragger.backend import BackendInterface, RaisePolicy
+from ragger.backend.stub import StubBackend
+from ragger.error import ExceptionRAPDU
+from ragger.utils import RAPDU
+
+from .dHealth import INS
+
+FRAME_HEADER = Struct(">IB")
+MAX_FRAME_LENGTH = 0x10000
+PRIORITY = Struct(">b")
+GRANTED_HEADER = Struct(">I")
+RAPDU_HEADER = Struct(">HI")
+
+ACQUIRE = 0x01
+EXCHANGE = 0x02
+RELEASE = 0x03
+STATS = 0x04
+GRANTED = 0x81
+ANSWER = 0x82
+RELEASED = 0x83
+STATS_ANSWER = 0x84
+FAILURE = 0xFF
+
+DEFAULT_SOCKET_PATH = "/tmp/dhealth-device.sock"
+# answers which do not change while the application runs, served without the device
+CACHED_INSTRUCTIONS = (INS.INS_GET_VERSION,)
+LATENCY_SAMPLES = 1024
+
+
+class DaemonError(Exception):
+    """Raised by clients on a FAILURE answer or a broken connection to the daemon."""
+
+
+def _microseconds(seconds: float) -> int:
+    return min(int(seconds * 1e6), 0xFFFFFFFF)
+
+
+def encode_frame(frame_type: int, payload: bytes = b"") -> bytes:
+    return FRAME_HEADER.pack(len(payload), frame_type) + payload
+
+
+@dataclass
+class LatencyStats:
+    requests: int = 0
+    total: float = 0.0
+    maximum: float = 0.0
+    samples: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_SAMPLES))
+
+    def add(self, seconds: float) -> None:
+        self.requests += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+        self.samples.append(seconds)
+
+    def percentile(self, fraction: float) -> float:
+        """Latency under which 'fraction' of the recent requests are answered."""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+    def as_dict(self) -> Dict[str, float]:
+        return {"requests": self.requests,
+                "average": self.total / self.requests if self.requests else 0.0,
+                "p50": self.percentile(0.5),
+                "p95": self.percentile(0.95),
+                "max": self.maximum}
+
+
+def _instruction_name(apdu: bytes) -> str:
+    if len(apdu) < 2:
+        return "invalid"
+    try:
+        return INS(apdu[1]).name
+    except ValueError:
+        return f"0x{apdu[1]:02x}"
+
+
+class DeviceDaemon:
+    """Serve 'backend' to the clients connecting to 'socket_path'.
+
+    The backend is only used from a single thread, and answers every status word: the raise
+    policy is applied by the clients.
+    """
+
+    def __init__(self, backend: BackendInterface, socket_path: Union[str, Path] = DEFAULT_SOCKET_PATH):
+        self.backend = backend
+        self.backend.raise_policy = RaisePolicy.RAISE_NOTHING
+        self.socket_path = Path(socket_path)
+        self.queue_latency = LatencyStats()
+        self.device_latency: Dict[str, LatencyStats] = {}
+        self.cache_hits = 0
+        self._cache: Dict[bytes, RAPDU] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="device")
+        self._holder: Optional[object] = None
+        self._waiting: List[Tuple[int, int, asyncio.Future, object]] = []
+        self._order = count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def device_name(self) -> str:
+        device = self.backend.device
+        return "" if device is None else device.name
+
+    def stats(self) -> Dict:
+        return {"device": self.device_name,
+                "holder": self._holder is not None,
+                "waiting": len(self._waiting),
+                "cache_hits": self.cache_hits,
+                "queue": self.queue_latency.as_dict(),
+                "instructions": {name: stats.as_dict()
+                                 for name, stats in sorted(self.device_latency.items())}}
+
+    async def _acquire(self, owner: object, priority: int) -> None:
+        if self._holder is None and not self._waiting:
+            self._holder = owner
+            return
+        granted = asyncio.get_running_loop().create_future()
+        heappush(self._waiting, (-priority, next(self._order), granted, owner))
+        await granted
+
+    def _release(self, owner: object) -> None:
+        if self._holder is not owner:
+            return
+        self._holder = None
+        while self._waiting:
+            _, _, granted, next_owner = heappop(self._waiting)
+            if not granted.cancelled():
+                self._holder = next_owner
+                granted.set_result(None)
+                return
+
+    def _exchange(self, apdu: bytes) -> Tuple[RAPDU, float]:
+        start = perf_counter()
+        rapdu = self.backend.exchange_raw(apdu)
+        return rapdu, perf_counter() - start
+
+    async def _device_exchange(self, apdu: bytes) -> Tuple[RAPDU, float]:
+        cached = self._cache.get(apdu)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached, 0.0
+        rapdu, elapsed = await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._exchange, apdu)
+        self.device_latency.setdefault(_instruction_name(apdu), LatencyStats()).add(elapsed)
+        if len(apdu) > 1 and apdu[1] in CACHED_INSTRUCTIONS and rapdu.status == 0x9000:
+            self._cache[apdu] = RAPDU(rapdu.status, bytes(rapdu.data))
+        return rapdu, elapsed
+
+    async def _answer(self, frame_type: int, payload: bytes, owner: object) -> bytes:
+        if frame_type == STATS:
+            return encode_frame(STATS_ANSWER, json.dumps(self.stats()).encode())
+        if frame_type == ACQUIRE:
+            if self._holder is owner:
+                return encode_frame(FAILURE, b"lease already held")
+            if len(payload) != PRIORITY.size:
+                return encode_frame(FAILURE, b"invalid priority")
+            priority, = PRIORITY.unpack(payload)
+            start = perf_counter()
+            await self._acquire(owner, priority)
+            queued = perf_counter() - start
+            self.queue_latency.add(queued)
+            return encode_frame(GRANTED, GRANTED_HEADER.pack(_microseconds(queued))
+                                + self.device_name.encode())
+        if frame_type == RELEASE:
+            self._release(owner)
+            return encode_frame(RELEASED)
+        if frame_type == EXCHANGE:
+            if self._holder is not owner:
+                return encode_frame(FAILURE, b"no lease on the device")
+            try:
+                rapdu, elapsed = await self._device_exchange(payload)
+            except Exception as error:
+                return encode_frame(FAILURE, f"device error: {error}".encode())
+            return encode_frame(ANSWER, RAPDU_HEADER.pack(rapdu.status, _microseconds(elapsed))
+                                + bytes(rapdu.data))
+        return encode_frame(FAILURE, f"unknown request 0x{frame_type:02x}".encode())
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        owner = object()
+        try:
+            while True:
+                length, frame_type = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                if length > MAX_FRAME_LENGTH:
+                    writer.write(encode_frame(FAILURE, b"frame too large"))
+                    break
+                payload = await reader.readexactly(length)
+                writer.write(await self._answer(frame_type, payload, owner))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._release(owner)
+            writer.close()
+
+    async def serve(self, started: Optional[threading.Event] = None) -> None:
+        self._loop = asyncio.get_running_loop()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        self._server = await asyncio.start_unix_server(self._serve_client, path=str(self.socket_path))
+        if started is not None:
+            started.set()
+        try:
+            async with self._server:
+                await self._server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+
+    def run(self) -> None:
+        """Serve until interrupted."""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def start(self) -> None:
+        """Serve from a background thread, once the socket is listening."""
+        started = threading.Event()
+        self._thread = threading.Thread(target=lambda: asyncio.run(self.serve(started)),
+                                        name="daemon", daemon=True)
+        self._thread.start()
+        started.wait()
+
+    def stop(self) -> None:
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._server.close)
+        if self._thread is not None:
+            self._thread.join()
+        self._executor.shutdown(wait=True)
+
+
+@dataclass
+class RequestLatency:
+    instruction: str
+    device: float
+    total: float
+
+
+def _receive_exactly(connection: socket.socket, length: int) -> bytes:
+    data = bytearray()
+    while len(data) < length:
+        chunk = connection.recv(length - len(data))
+        if not chunk:
+            raise DaemonError("connection closed by the daemon")
+        data += chunk
+    return bytes(data)
+
+
+def _request(connection: socket.socket, frame_type: int, payload: bytes = b"") -> Tuple[int, bytes]:
+    connection.sendall(encode_frame(frame_type, payload))
+    return _read_answer(connection)
+
+
+def _read_answer(connection: socket.socket) -> Tuple[int, bytes]:
+    length, frame_type = FRAME_HEADER.unpack(_receive_exactly(connection, FRAME_HEADER.size))
+    payload = _receive_exactly(connection, length)
+    if frame_type == FAILURE:
+        raise DaemonError(payload.decode(errors="replace"))
+    return frame_type, payload
+
+
+def daemon_stats(socket_path: Union[str, Path] = DEFAULT_SOCKET_PATH) -> Dict:
+    """Queue and latency statistics of the daemon listening on 'socket_path'."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(str(socket_path))
+        _, payload = _request(connection, STATS)
+    return json.loads(payload)
+
+
+class DaemonBackend(StubBackend):
+    """Ragger backend exchanging through a DeviceDaemon. Screens and navigation are no-ops.
+
+    The device is leased from entering the backend to leaving it. 'latencies' holds the device
+    and round trip time of each exchange, 'queued' the time waited for the lease.
+    """
+
+    def __init__(self, socket_path: Union[str, Path] = DEFAULT_SOCKET_PATH, priority: int = 0):
+        super().__init__(None)
+        self.socket_path = Path(socket_path)
+        self.priority = priority
+        self.queued = 0.0
+        self.latencies: List[RequestLatency] = []
+        self._connection: Optional[socket.socket] = None
+        self._pending: Optional[Tuple[bytes, float]] = None
+
+    def __enter__(self) -> "DaemonBackend":
+        self._connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._connection.connect(str(self.socket_path))
+            _, payload = _request(self._connection, ACQUIRE, PRIORITY.pack(self.priority))
+        except (OSError, DaemonError):
+            self._connection.close()
+            self._connection = None
+            raise
+        queued, = GRANTED_HEADER.unpack_from(payload)
+        self.queued = queued / 1e6
+        name = payload[GRANTED_HEADER.size:].decode()
+        if name:
+            self._device = Devices.get_by_name(name)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._connection is None:
+            return
+        try:
+            _request(self._connection, RELEASE)
+        except (OSError, DaemonError):
+            pass
+        finally:
+            self._connection.close()
+            self._connection = None
+
+    def _send(self, data: bytes) -> None:
+        if self._connection is None:
+            raise DaemonError("the device is not leased: use the backend in a 'with' block")
+        self.apdu_logger.info("=> %s", data.hex())
+        self._pending = (data, perf_counter())
+        self._connection.sendall(encode_frame(EXCHANGE, data))
+
+    def _receive(self) -> RAPDU:
+        if self._pending is None:
+            raise RuntimeError("No pending APDU to receive")
+        (apdu, start), self._pending = self._pending, None
+        _, payload = _read_answer(self._connection)
+        status, device_time = RAPDU_HEADER.unpack_from(payload)
+        rapdu = RAPDU(status, payload[RAPDU_HEADER.size:])
+        self.latencies.append(RequestLatency(_instruction_name(apdu), device_time / 1e6,
+                                             perf_counter() - start))
+        self.apdu_logger.info("<= %s%4x", rapdu.data.hex(), rapdu.status)
+        return rapdu
+
+    def _check(self, rapdu: RAPDU) -> RAPDU:
+        if self.is_raise_required(rapdu):
+            raise ExceptionRAPDU(rapdu.status, rapdu.data)
+        return rapdu
+
+    def send_raw(self, data: bytes = b"") -> None:
+        self._send(bytes(data))
+
+    def receive(self) -> RAPDU:
+        return self._check(self._receive())
+
+    def exchange_raw(self, data: bytes = b"", tick_timeout: int = 5 * 60 * 10) -> RAPDU:
+        self._send(bytes(data))
+        return self._check(self._receive())
+
+    @contextmanager
+    def exchange_async_raw(self, data: bytes = b"") -> Generator[None, None, None]:
+        self._last_async_response = None
+        self._send(bytes(data))
+        yield
+        self._last_async_response = self._check(self._receive())
+
+
+def open_backend(daemon_socket: Optional[str] = None, priority: int = 0) -> BackendInterface:
+    """Backend of the tools: through the daemon listening on 'daemon_socket' if given, else the
+    device connected in USB."""
+    if daemon_socket is not None:
+        return DaemonBackend(daemon_socket, priority)
+    from ragger.backend import LedgerCommBackend
+    return LedgerCommBackend(None, interface="hid")
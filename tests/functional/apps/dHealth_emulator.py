@@ -0,0 +1,430 @@
+# In-process emulator of the application, for client and protocol tests without Speculos.
+#
+# EmulatorBackend is a ragger backend answering the APDUs of src/apdu/entry.c with the same
+# P1/P2 checks and status words: GET_VERSION, GET_PUBLIC_KEY (and its range) and SIGN_TX, in
+# chunks and resumable. Keys are derived from the Speculos default seed and reviews are always
+# approved, so keys and signatures are the ones Speculos gives; screens are not emulated.
+#
+# Transactions are checked with dHealth_preflight.predict() rather than the device parser: the
+# errors the device finds while receiving chunks are only answered to the last chunk, except
+# for the size of transactions which are not aggregates.
+#
+# Only the standard library is used: BIP39 seed, SLIP-10 (Ed25519) and BIP32 (secp256k1)
+# derivations, and RFC 8032 Ed25519 signatures.
+
+import hashlib
+import hmac
+import unicodedata
+from contextlib import contextmanager
+from struct import pack, Struct
+from typing import Dict, Generator, Optional, Sequence, Tuple
+
+from ledgered.devices import Devices
+from ragger.backend.stub import StubBackend
+from ragger.bip.seed import SPECULOS_MNEMONIC
+from ragger.error import ExceptionRAPDU
+from ragger.utils import RAPDU
+
+from .dHealth import (AGGREGATE_TYPES, CAPABILITY_RESUMABLE_SIGNING,
+                      CAPABILITY_STREAMED_AGGREGATES, CLA, INS, MAX_PUBLIC_KEY_RANGE, P1_CONFIRM,
+                      P1_MASK_MORE, P1_MASK_OFFSET, P1_MASK_ORDER, P1_NON_CONFIRM, P1_VERSION,
+                      P1_VERSION_LIMITS, P2_ED25519, P2_SECP256K1, PACKET_OFFSET, STATUS_OK,
+                      TRANSACTION_TYPE, TRANSACTION_TYPE_OFFSET, ErrorType)
+from .dHealth_preflight import TARGET_LIMITS, predict
+
+# Version in the Makefile
+APP_VERSION = (1, 0, 0)
+# Capabilities of the emulator, a subset of the application ones
+EMULATED_CAPABILITIES = CAPABILITY_STREAMED_AGGREGATES | CAPABILITY_RESUMABLE_SIGNING
+
+HARDENED_INDEX = 0x80000000
+INDEX_MASK = 0x7FFFFFFF
+MAX_BIP32_PATH = 5
+# path (1 + 4 * MAX_BIP32_PATH) || network type (1), DHP_PKG_GETPUBLICKEY_LENGTH
+GET_PUBLIC_KEY_LENGTH = 1 + 4 * MAX_BIP32_PATH + 1
+MAINNET_COIN_TYPE = 10111
+TRANSACTION_HASH_LENGTH = 32
+# Aggregates are signed from their generation hash to their transaction hash
+AGGREGATE_SIGNING_LENGTH = 84
+TESTNET_GENERATION_HASH = bytes.fromhex(
+    "49D6E1CE276A85B70EAFE52349AACCA389302E7A9754BCF1221E79494FC665A4")
+MAINNET_GENERATION_HASH = bytes.fromhex(
+    "57F7DA205008026C776CB6AED843393F04CD458E0AA2D9F1D5F31A402072B2D6")
+
+APDU_HEADER = Struct(">BBBBB")
+BIP32_INDEX = Struct(">I")
+
+# Ed25519, RFC 8032
+ED25519_P = 2 ** 255 - 19
+ED25519_L = 2 ** 252 + 27742317777372353535851937790883648493
+ED25519_D = -121665 * pow(121666, -1, ED25519_P) % ED25519_P
+ED25519_SQRT_M1 = pow(2, (ED25519_P - 1) // 4, ED25519_P)
+
+# secp256k1, SEC 2
+SECP256K1_P = 2 ** 256 - 2 ** 32 - 977
+SECP256K1_N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+SECP256K1_G = (0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798,
+               0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+
+Point = Tuple[int, int, int, int]
+
+
+def _ed25519_add(a: Point, b: Point) -> Point:
+    """Sum of two points in extended coordinates (X, Y, Z, T)."""
+    p = ED25519_P
+    x1, y1, z1, t1 = a
+    x2, y2, z2, t2 = b
+    e = (y1 - x1) * (y2 - x2) % p
+    f = (y1 + x1) * (y2 + x2) % p
+    g = 2 * t1 * t2 * ED25519_D % p
+    h = 2 * z1 * z2 % p
+    e, f, g, h = f - e, h - g, h + g, f + e
+    return e * f % p, g * h % p, f * g % p, e * h % p
+
+
+def _ed25519_multiply(scalar: int, point: Point) -> Point:
+    result = (0, 1, 1, 0)
+    while scalar:
+        if scalar & 1:
+            result = _ed25519_add(result, point)
+        point = _ed25519_add(point, point)
+        scalar >>= 1
+    return result
+
+
+def _ed25519_encode(point: Point) -> bytes:
+    x, y, z, _ = point
+    z_inverse = pow(z, -1, ED25519_P)
+    x = x * z_inverse % ED25519_P
+    y = y * z_inverse % ED25519_P
+    return (y | (x & 1) << 255).to_bytes(32, "little")
+
+
+def _ed25519_base() -> Point:
+    y = 4 * pow(5, -1, ED25519_P) % ED25519_P
+    x2 = (y * y - 1) * pow(ED25519_D * y * y + 1, -1, ED25519_P) % ED25519_P
+    x = pow(x2, (ED25519_P + 3) // 8, ED25519_P)
+    if (x * x - x2) % ED25519_P:
+        x = x * ED25519_SQRT_M1 % ED25519_P
+    if x & 1:
+        x = ED25519_P - x
+    return x, y, 1, x * y % ED25519_P
+
+
+ED25519_B = _ed25519_base()
+
+
+def _ed25519_expand(private_key: bytes) -> Tuple[int, bytes]:
+    h = hashlib.sha512(private_key).digest()
+    a = int.from_bytes(h[:32], "little")
+    a &= (1 << 254) - 8
+    a |= 1 << 254
+    return a, h[32:]
+
+
+def ed25519_public_key(private_key: bytes) -> bytes:
+    a, _ = _ed25519_expand(private_key)
+    return _ed25519_encode(_ed25519_multiply(a, ED25519_B))
+
+
+def ed25519_sign(private_key: bytes, message: bytes) -> bytes:
+    a, prefix = _ed25519_expand(private_key)
+    public_key = _ed25519_encode(_ed25519_multiply(a, ED25519_B))
+    r = int.from_bytes(hashlib.sha512(prefix + message).digest(), "little") % ED25519_L
+    encoded_r = _ed25519_encode(_ed25519_multiply(r, ED25519_B))
+    k = int.from_bytes(hashlib.sha512(encoded_r + public_key + message).digest(), "little")
+    s = (r + k * a) % ED25519_L
+    return encoded_r + s.to_bytes(32, "little")
+
+
+def _secp256k1_multiply(scalar: int) -> Tuple[int, int]:
+    """scalar * G, in affine coordinates."""
+    result = None
+    point = SECP256K1_G
+    while scalar:
+        if scalar & 1:
+            result = point if result is None else _secp256k1_add(result, point)
+        point = _secp256k1_add(point, point)
+        scalar >>= 1
+    return result
+
+
+def _secp256k1_add(a: Tuple[int, int], b: Tuple[int, int]) -> Tuple[int, int]:
+    p = SECP256K1_P
+    if a == b:
+        slope = 3 * a[0] * a[0] * pow(2 * a[1], -1, p) % p
+    else:
+        slope = (b[1] - a[1]) * pow(b[0] - a[0], -1, p) % p
+    x = (slope * slope - a[0] - b[0]) % p
+    return x, (slope * (a[0] - x) - a[1]) % p
+
+
+def mnemonic_to_seed(mnemonic: str, passphrase: str = "") -> bytes:
+    """BIP39 seed of a mnemonic (space separated words)."""
+    words = unicodedata.normalize("NFKD", mnemonic).encode()
+    salt = unicodedata.normalize("NFKD", "mnemonic" + passphrase).encode()
+    return hashlib.pbkdf2_hmac("sha512", words, salt, 2048)
+
+
+def derive_ed25519_private_key(seed: bytes, path: Sequence[int]) -> bytes:
+    """SLIP-10 Ed25519 private key, as os_derive_bip32_with_seed_no_throw(HDW_ED25519_SLIP10)."""
+    node = hmac.new(b"ed25519 seed", seed, hashlib.sha512).digest()
+    for index in path:
+        if not index & HARDENED_INDEX:
+            raise ValueError("SLIP-10 only defines hardened Ed25519 children")
+        node = hmac.new(node[32:], b"\0" + node[:32] + BIP32_INDEX.pack(index),
+                        hashlib.sha512).digest()
+    return node[:32]
+
+
+def derive_secp256k1_private_key(seed: bytes, path: Sequence[int]) -> bytes:
+    """BIP32 secp256k1 private key, as os_derive_bip32_no_throw(CX_CURVE_256K1)."""
+    node = hmac.new(b"Bitcoin seed", seed, hashlib.sha512).digest()
+    key = int.from_bytes(node[:32], "big")
+    for index in path:
+        if index & HARDENED_INDEX:
+            data = b"\0" + key.to_bytes(32, "big")
+        else:
+            x, y = _secp256k1_multiply(key)
+            data = bytes([2 + (y & 1)]) + x.to_bytes(32, "big")
+        node = hmac.new(node[32:], data + BIP32_INDEX.pack(index), hashlib.sha512).digest()
+        key = (int.from_bytes(node[:32], "big") + key) % SECP256K1_N
+    return key.to_bytes(32, "big")
+
+
+class DeviceError(Exception):
+    """Status word answered instead of OK, after the context is reset (handle_error())."""
+    def __init__(self, status: int):
+        super().__init__(f"Status 0x{status:04X}")
+        self.status = status
+
+
+class dHealthEmulator:
+    """State of the application, driven by one APDU at a time."""
+
+    def __init__(self, target: str = "nanox", mnemonic: str = SPECULOS_MNEMONIC):
+        self.target = target
+        self.limits = TARGET_LIMITS[target]
+        self._seed = mnemonic_to_seed(mnemonic)
+        self._keys: Dict[Tuple[int, Tuple[int, ...]], bytes] = {}
+        self._last_ins: Optional[int] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._path: Optional[Tuple[int, ...]] = None
+        self._curve = P2_ED25519
+        self._transaction = bytearray()
+
+    def private_key(self, curve: int, path: Sequence[int]) -> bytes:
+        """Ed25519 private key of a path: the key derived on 'curve' is used as an Ed25519 one."""
+        path = tuple(path)
+        key = self._keys.get((curve, path))
+        if key is None:
+            derive = derive_ed25519_private_key if curve == P2_ED25519 else derive_secp256k1_private_key
+            key = self._keys[(curve, path)] = derive(self._seed, path)
+        return key
+
+    def public_key(self, curve: int, path: Sequence[int]) -> bytes:
+        return ed25519_public_key(self.private_key(curve, path))
+
+    def exchange(self, apdu: bytes) -> RAPDU:
+        if len(apdu) < APDU_HEADER.size:
+            return RAPDU(ErrorType.WRONG_APDU_DATA_LENGTH, b"")
+        cla, ins, p1, p2, lc = APDU_HEADER.unpack_from(apdu)
+        data = apdu[APDU_HEADER.size:APDU_HEADER.size + lc]
+        if len(data) != lc:
+            return RAPDU(ErrorType.WRONG_APDU_DATA_LENGTH, b"")
+        try:
+            return RAPDU(STATUS_OK, self._handle(cla, ins, p1, p2, data))
+        except DeviceError as e:
+            self._reset()
+            return RAPDU(e.status, b"")
+
+    def _handle(self, cla: int, ins: int, p1: int, p2: int, data: bytes) -> bytes:
+        if cla != CLA:
+            raise DeviceError(ErrorType.UNKNOWN_INSTRUCTION_CLASS)
+        # "Instruction Change" protection
+        if ins != self._last_ins:
+            self._reset()
+        self._last_ins = ins
+
+        if ins == INS.INS_GET_VERSION:
+            return self._get_version(p1)
+        if ins == INS.INS_GET_PUBLIC_KEY:
+            return self._get_public_key(p1, p2, data)
+        if ins == INS.INS_GET_PUBLIC_KEY_RANGE:
+            return self._get_public_key_range(p1, p2, data)
+        if ins == INS.INS_SIGN:
+            return self._sign(p1, p2, data)
+        raise DeviceError(ErrorType.TRANSACTION_REJECTED)
+
+    def _get_version(self, p1: int) -> bytes:
+        if p1 not in (P1_VERSION, P1_VERSION_LIMITS):
+            raise DeviceError(ErrorType.INVALID_P1_OR_P2)
+        version = bytes((0, *APP_VERSION))
+        if p1 == P1_VERSION:
+            return version
+        limits = self.limits
+        return version + pack(">HBHBBBB", limits.max_raw_tx, limits.max_field_count,
+                              limits.max_field_len, limits.max_chunk_size,
+                              EMULATED_CAPABILITIES, 0, 0)
+
+    @staticmethod
+    def _check_curve(p2: int) -> int:
+        if bool(p2 & P2_SECP256K1) == bool(p2 & P2_ED25519):
+            raise DeviceError(ErrorType.INVALID_P1_OR_P2)
+        return P2_ED25519 if p2 & P2_ED25519 else P2_SECP256K1
+
+    @staticmethod
+    def _read_path(data: bytes) -> Tuple[int, ...]:
+        """BIP32 path at the start of 'data', as buffer_get_bip32_path()."""
+        if not data or not 1 <= data[0] <= MAX_BIP32_PATH or len(data) < 1 + 4 * data[0]:
+            raise DeviceError(ErrorType.INVALID_BIP32_PATH_LENGTH)
+        return tuple(BIP32_INDEX.unpack_from(data, 1 + 4 * i)[0] for i in range(data[0]))
+
+    def _derive(self, curve: int, path: Sequence[int]) -> bytes:
+        try:
+            return self.public_key(curve, path)
+        except ValueError:
+            raise DeviceError(ErrorType.INTERNAL_ERROR)
+
+    def _get_public_key(self, p1: int, p2: int, data: bytes) -> bytes:
+        if len(data) != GET_PUBLIC_KEY_LENGTH:
+            raise DeviceError(ErrorType.INVALID_PKG_KEY_LENGTH)
+        if p1 not in (P1_CONFIRM, P1_NON_CONFIRM):
+            raise DeviceError(ErrorType.INVALID_P1_OR_P2)
+        curve = self._check_curve(p2)
+        # the address is approved at once when it has to be confirmed
+        return bytes([32]) + self._derive(curve, self._read_path(data))
+
+    def _get_public_key_range(self, p1: int, p2: int, data: bytes) -> bytes:
+        if len(data) != GET_PUBLIC_KEY_LENGTH + 1:
+            raise DeviceError(ErrorType.INVALID_PKG_KEY_LENGTH)
+        if p1 != P1_NON_CONFIRM:
+            raise DeviceError(ErrorType.INVALID_P1_OR_P2)
+        curve = self._check_curve(p2)
+        path = self._read_path(data)
+        count = data[GET_PUBLIC_KEY_LENGTH]
+        # the last index must stay in the same (hardened or not) range for every key
+        last = path[-1]
+        if not 0 < count <= MAX_PUBLIC_KEY_RANGE or (last & INDEX_MASK) > INDEX_MASK - (count - 1):
+            raise DeviceError(ErrorType.WRONG_APDU_DATA_LENGTH)
+        return bytes([count]) + b"".join(self._derive(curve, path[:-1] + (last + i,))
+                                         for i in range(count))
+
+    def _sign(self, p1: int, p2: int, data: bytes) -> bytes:
+        first = not p1 & P1_MASK_ORDER
+        resumable = bool(p1 & P1_MASK_OFFSET)
+        if self._path is None:
+            if not first:
+                raise DeviceError(ErrorType.INVALID_SIGNING_PACKET_ORDER)
+            return self._sign_first_packet(p1, p2, data)
+        if first:
+            if not resumable:
+                raise DeviceError(ErrorType.INVALID_SIGNING_PACKET_ORDER)
+            # the answer to the first packet was lost, start again
+            self._reset()
+            return self._sign_first_packet(p1, p2, data)
+        if not resumable:
+            return self._sign_content(data, not p1 & P1_MASK_MORE, False)
+
+        if len(data) < PACKET_OFFSET.size:
+            raise DeviceError(ErrorType.WRONG_APDU_DATA_LENGTH)
+        offset, = PACKET_OFFSET.unpack_from(data)
+        received = len(self._transaction)
+        if offset > received:
+            raise DeviceError(ErrorType.INVALID_SIGNING_PACKET_ORDER)
+        chunk = data[PACKET_OFFSET.size:]
+        if received - offset >= len(chunk) and p1 & P1_MASK_MORE:
+            return PACKET_OFFSET.pack(received)
+        return self._sign_content(chunk[received - offset:], not p1 & P1_MASK_MORE, True)
+
+    def _sign_first_packet(self, p1: int, p2: int, data: bytes) -> bytes:
+        curve = self._check_curve(p2)
+        path = self._read_path(data)
+        self._path, self._curve = path, curve
+        return self._sign_content(data[1 + 4 * len(path):], not p1 & P1_MASK_MORE,
+                                  bool(p1 & P1_MASK_OFFSET))
+
+    def _is_aggregate(self) -> bool:
+        end = TRANSACTION_TYPE_OFFSET + TRANSACTION_TYPE.size
+        if len(self._transaction) < end:
+            return False
+        transaction_type, = TRANSACTION_TYPE.unpack_from(self._transaction, TRANSACTION_TYPE_OFFSET)
+        return transaction_type in AGGREGATE_TYPES
+
+    def _sign_content(self, chunk: bytes, last: bool, acknowledge: bool) -> bytes:
+        self._transaction += chunk
+        # transactions other than aggregates are stored whole
+        if len(self._transaction) > self.limits.max_raw_tx and not self._is_aggregate():
+            raise DeviceError(ErrorType.SIGNING_DATA_TOO_LARGE)
+        if not last:
+            return PACKET_OFFSET.pack(len(self._transaction)) if acknowledge else b""
+
+        transaction = bytes(self._transaction)
+        mainnet = len(self._path) > 1 and (self._path[1] & INDEX_MASK) == MAINNET_COIN_TYPE
+        try:
+            prediction = predict(transaction, self.target, mainnet)
+        except ValueError:
+            raise DeviceError(ErrorType.INVALID_SIGNING_DATA)
+        if prediction.too_large:
+            raise DeviceError(ErrorType.SIGNING_DATA_TOO_LARGE)
+        if prediction.too_many_fields:
+            raise DeviceError(ErrorType.TOO_MANY_TRANSACTION_FIELDS)
+
+        # the review is approved at once
+        private_key = self.private_key(self._curve, self._path)
+        signed = transaction[:self._sign_data_length(transaction, mainnet)]
+        signature = ed25519_sign(private_key, signed)
+        self._reset()
+        return signature
+
+    def _sign_data_length(self, transaction: bytes, mainnet: bool) -> int:
+        """Bytes signed, from the start of the transaction, as get_sign_data_length()."""
+        if not self._is_aggregate():
+            return len(transaction)
+        generation_hash = MAINNET_GENERATION_HASH if mainnet else TESTNET_GENERATION_HASH
+        if transaction[:TRANSACTION_HASH_LENGTH] == generation_hash:
+            return AGGREGATE_SIGNING_LENGTH
+        # multisig cosigning: the transaction hash only
+        return TRANSACTION_HASH_LENGTH
+
+
+class EmulatorBackend(StubBackend):
+    """Ragger backend answered by a dHealthEmulator. Screens and navigation are no-ops."""
+
+    def __init__(self, target: str = "nanox", mnemonic: str = SPECULOS_MNEMONIC):
+        super().__init__(Devices.get_by_name(target))
+        self.emulator = dHealthEmulator(target, mnemonic)
+        self._pending: Optional[RAPDU] = None
+
+    def __enter__(self) -> "EmulatorBackend":
+        return self
+
+    def _answer(self, rapdu: RAPDU) -> RAPDU:
+        self.apdu_logger.info("<= %s%4x", rapdu.data.hex(), rapdu.status)
+        if self.is_raise_required(rapdu):
+            raise ExceptionRAPDU(rapdu.status, rapdu.data)
+        return rapdu
+
+    def send_raw(self, data: bytes = b"") -> None:
+        self.apdu_logger.info("=> %s", data.hex())
+        self._pending = self.emulator.exchange(data)
+
+    def receive(self) -> RAPDU:
+        if self._pending is None:
+            raise RuntimeError("No pending APDU to receive")
+        rapdu, self._pending = self._pending, None
+        return self._answer(rapdu)
+
+    def exchange_raw(self, data: bytes = b"", tick_timeout: int = 5 * 60 * 10) -> RAPDU:
+        self.apdu_logger.info("=> %s", data.hex())
+        return self._answer(self.emulator.exchange(data))
+
+    @contextmanager
+    def exchange_async_raw(self, data: bytes = b"") -> Generator[None, None, None]:
+        self.apdu_logger.info("=> %s", data.hex())
+        self._last_async_response = None
+        rapdu = self.emulator.exchange(data)
+        yield
+        self._last_async_response = self._answer(rapdu)
@@ -0,0 +1,89 @@
+# Persistent cache of public keys, for indexers that repeatedly need the keys of account ranges.
+# Keys are stored in a SQLite database keyed by (device id, derivation path, network type), so a
+# lookup that was already answered once never reaches the device again.
+
+import sqlite3
+from typing import List, Optional
+
+from .dHealth import dHealthClient, derivation_path_range, MAINNET
+
+# Path whose public key identifies a device (i.e. its seed) when no explicit device id is given
+DEVICE_ID_PATH = "m/44'/1'/0'/0'/0'"
+
+
+class PublicKeyCache:
+    def __init__(self, filename: str = "dHealth_public_keys.sqlite"):
+        self._db = sqlite3.connect(filename)
+        self._db.execute("CREATE TABLE IF NOT EXISTS public_keys ("
+                         " device_id TEXT NOT NULL,"
+                         " path TEXT NOT NULL,"
+                         " network_type INTEGER NOT NULL,"
+                         " public_key BLOB NOT NULL,"
+                         " PRIMARY KEY (device_id, path, network_type))")
+        self._db.commit()
+
+    def get_many(self, device_id: str, paths: List[str], network_type: int) -> List[Optional[bytes]]:
+        found = {}
+        # stay below the SQLite limit of query parameters
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            for path, public_key in self._db.execute(
+                    "SELECT path, public_key FROM public_keys"
+                    " WHERE device_id = ? AND network_type = ?"
+                    f" AND path IN ({','.join('?' * len(chunk))})",
+                    [device_id, network_type, *chunk]):
+                found[path] = public_key
+        return [found.get(path) for path in paths]
+
+    def put_many(self, device_id: str, keys: dict, network_type: int) -> None:
+        self._db.executemany("INSERT OR REPLACE INTO public_keys VALUES (?, ?, ?, ?)",
+                             [(device_id, path, network_type, public_key)
+                              for path, public_key in keys.items()])
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "PublicKeyCache":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def device_id(client: dHealthClient) -> str:
+    """Identify the seed of a device by the public key of DEVICE_ID_PATH."""
+    response = client.send_get_public_key_non_confirm(DEVICE_ID_PATH).data
+    return client.parse_get_public_key_response(response).hex()
+
+
+def derive_range(client: dHealthClient, cache: PublicKeyCache, derivation_path: str, count: int,
+                 network_type: int = MAINNET, device: Optional[str] = None) -> List[bytes]:
+    """Public keys of 'count' consecutive paths, from the cache or else from the device.
+
+    Missing keys are derived in batches of consecutive paths, then added to the cache.
+    Without 'device', the device id is read from the device first, which costs one APDU.
+    """
+    if device is None:
+        device = device_id(client)
+    paths = derivation_path_range(derivation_path, count)
+    keys = cache.get_many(device, paths, network_type)
+
+    derived = {}
+    index = 0
+    while index < count:
+        if keys[index] is not None:
+            index += 1
+            continue
+        # derive the whole run of consecutive missing keys at once
+        end = index
+        while end < count and keys[end] is None:
+            end += 1
+        public_keys = client.get_public_key_range(paths[index], end - index, network_type)
+        for offset, public_key in enumerate(public_keys):
+            keys[index + offset] = derived[paths[index + offset]] = bytes(public_key)
+        index = end
+
+    if derived:
+        cache.put_many(device, derived, network_type)
+    return keys
@@ -0,0 +1,257 @@
+# Host side pre-flight check of transactions to sign: predicts how many fields the device parser
+# (parse_txn_context() in src/dhp/parse/dhp_parse.c) shows for a transaction, and how many bytes
+# the device has to buffer, without any device.
+#
+# Fields are counted straight from the serialized transaction, in the same order and with the
+# same conditions as the device parser, so a batch signer can filter or split thousands of
+# transactions per second before sending them.
+
+from dataclasses import dataclass
+from struct import Struct
+from typing import Dict, Iterable, List
+
+from .dHealth import AGGREGATE_TYPES, DeviceLimits, MAX_CHUNK_SIZE
+from .dHealth_transaction_schema import TRANSACTION_TYPES, INNER_TX_HEADER_SIZE, ALIGNMENT_BYTES
+
+# Limits of each target, from src/limitations.h (and src/apdu/messages/get_app_configuration.c,
+# src/apdu/messages/cosign_batch.h)
+TARGET_LIMITS: Dict[str, DeviceLimits] = {
+    "nanos": DeviceLimits(max_raw_tx=800, max_field_count=24, max_field_len=128,
+                          max_chunk_size=MAX_CHUNK_SIZE, streamed_aggregates=True,
+                          resumable_signing=True, max_cosign_batch=23,
+                          max_upload_references=4),
+    "nanox": DeviceLimits(max_raw_tx=10000, max_field_count=60, max_field_len=1024,
+                          max_chunk_size=MAX_CHUNK_SIZE, streamed_aggregates=True,
+                          resumable_signing=True, max_cosign_batch=59,
+                          max_upload_references=16),
+    "nanosp": DeviceLimits(max_raw_tx=10000, max_field_count=60, max_field_len=1024,
+                           max_chunk_size=MAX_CHUNK_SIZE, streamed_aggregates=True,
+                           resumable_signing=True, max_cosign_batch=59,
+                          max_upload_references=16),
+    "stax": DeviceLimits(max_raw_tx=10000, max_field_count=60, max_field_len=1024,
+                         max_chunk_size=MAX_CHUNK_SIZE, streamed_aggregates=True,
+                         resumable_signing=True, max_cosign_batch=59,
+                         max_upload_references=16),
+}
+
+MAINNET_NETWORK_TYPE = 0x68
+TESTNET_NETWORK_TYPE = 0x98
+DHP_MAINNET_MOSAIC_ID = 0x39E0C49FA322A459
+DHP_TESTNET_MOSAIC_ID = 0x72C0212E67A08BCE
+DHP_PERSISTENT_DELEGATED_HARVESTING = 0xFE
+
+# common header: generation hash (32) || version (1) || network type (1) || transaction type (2)
+COMMON_HEADER = Struct("<34xH")
+TXN_FEE_SIZE = 16
+# aggregate header: transaction hash (32) || payload size (4) || reserved (4)
+AGGREGATE_HEADER = Struct("<32xI4x")
+AGGREGATE_HEADER_SIZE = COMMON_HEADER.size + TXN_FEE_SIZE + AGGREGATE_HEADER.size
+INNER_TX_SIZE = Struct("<I")
+INNER_TX_TYPE = Struct("<46xH")
+
+# Serialized transaction parts read by the device parser
+TRANSFER_HEADER = Struct("<24sHB5x")
+MOSAIC_ID = Struct("<Q8x")
+MULTISIG_HEADER = Struct("<2xBB4x")
+NAMESPACE_HEADER = Struct("<16xxB")
+ACCOUNT_METADATA_HEADER = Struct("<32x2xH")
+METADATA_HEADER = Struct("<40x2xH")
+RESTRICTION_HEADER = Struct("<2xBB4x")
+
+ADDRESS_SIZE = 24
+RESTRICTION_VALUE_SIZES = {
+    TRANSACTION_TYPES['ACCOUNT_ADDRESS_RESTRICTION']: ADDRESS_SIZE,
+    TRANSACTION_TYPES['ACCOUNT_MOSAIC_RESTRICTION']: 8,
+    TRANSACTION_TYPES['ACCOUNT_OPERATION_RESTRICTION']: 2,
+}
+
+# (content size, field count) of the transactions whose fields don't depend on their content
+FIXED_TRANSACTIONS = {
+    TRANSACTION_TYPES['MOSAIC_DEFINITION']: (22, 6),
+    TRANSACTION_TYPES['MOSAIC_SUPPLY_CHANGE']: (17, 3),
+    TRANSACTION_TYPES['ADDRESS_ALIAS']: (33, 3),
+    TRANSACTION_TYPES['MOSAIC_ALIAS']: (17, 3),
+    TRANSACTION_TYPES['ACCOUNT_KEY_LINK']: (33, 2),
+    TRANSACTION_TYPES['NODE_KEY_LINK']: (33, 2),
+    TRANSACTION_TYPES['VRF_KEY_LINK']: (33, 2),
+    TRANSACTION_TYPES['VOTING_KEY_LINK']: (41, 4),
+    TRANSACTION_TYPES['FUND_LOCK']: (56, 3),
+}
+
+# Transactions that can be signed on their own, the others can only be inner transactions
+TOP_LEVEL_TYPES = frozenset(AGGREGATE_TYPES + tuple(
+    TRANSACTION_TYPES[name] for name in (
+        'TRANSFER', 'MODIFY_MULTISIG_ACCOUNT', 'REGISTER_NAMESPACE', 'ADDRESS_ALIAS', 'MOSAIC_ALIAS',
+        'ACCOUNT_ADDRESS_RESTRICTION', 'ACCOUNT_MOSAIC_RESTRICTION', 'ACCOUNT_OPERATION_RESTRICTION',
+        'ACCOUNT_KEY_LINK', 'NODE_KEY_LINK', 'VRF_KEY_LINK', 'VOTING_KEY_LINK',
+        'MOSAIC_DEFINITION', 'MOSAIC_SUPPLY_CHANGE', 'FUND_LOCK')))
+INNER_TYPES = frozenset(TOP_LEVEL_TYPES - set(AGGREGATE_TYPES)) | {
+    TRANSACTION_TYPES['ACCOUNT_METADATA'], TRANSACTION_TYPES['MOSAIC_METADATA'],
+    TRANSACTION_TYPES['NAMESPACE_METADATA']}
+
+
+@dataclass(frozen=True)
+class Prediction:
+    field_count: int
+    raw_size: int       # size of the serialized transaction
+    buffered_size: int  # bytes buffered by the device (an upper bound for streamed aggregates)
+    limits: DeviceLimits
+
+    @property
+    def too_many_fields(self) -> bool:
+        return self.field_count > self.limits.max_field_count
+
+    @property
+    def too_large(self) -> bool:
+        return self.buffered_size > self.limits.max_raw_tx
+
+    @property
+    def fits(self) -> bool:
+        return not (self.too_many_fields or self.too_large)
+
+
+def _read(fmt: Struct, data: bytes, offset: int, end: int) -> tuple:
+    if offset + fmt.size > end:
+        raise ValueError("Not enough data")
+    return fmt.unpack_from(data, offset)
+
+
+def _check(offset: int, end: int) -> int:
+    if offset > end:
+        raise ValueError("Not enough data")
+    return offset
+
+
+def _count_transfer(data: bytes, offset: int, end: int, target: str, mainnet: bool) -> (int, int):
+    recipient, message_size, mosaics_count = _read(TRANSFER_HEADER, data, offset, end)
+    offset += TRANSFER_HEADER.size
+    _check(offset + mosaics_count * MOSAIC_ID.size + message_size, end)
+
+    # recipient address, or namespace alias and namespace id
+    count = 1 if recipient[0] in (MAINNET_NETWORK_TYPE, TESTNET_NETWORK_TYPE) else 2
+    if mosaics_count > 1:
+        count += 1
+    network_mosaic_id = DHP_MAINNET_MOSAIC_ID if mainnet else DHP_TESTNET_MOSAIC_ID
+    for _ in range(mosaics_count):
+        mosaic_id, = MOSAIC_ID.unpack_from(data, offset)
+        offset += MOSAIC_ID.size
+        if mosaic_id != network_mosaic_id:
+            # mosaic count if this is the only mosaic, and unknown mosaic notification
+            count += 2 if mosaics_count == 1 else 1
+        count += 1
+
+    if message_size == 0:
+        return count + 1, offset
+    count += 1  # message type
+    if data[offset] == DHP_PERSISTENT_DELEGATED_HARVESTING:
+        if target == "nanos":
+            # split in 3 fields
+            _check(offset + 2 * (TARGET_LIMITS["nanos"].max_field_len // 2 - 1), offset + message_size)
+            count += 3
+        elif target in ("nanox", "nanosp"):
+            count += 1
+    else:
+        count += 1
+    return count, offset + message_size
+
+
+def _count_content(transaction_type: int, data: bytes, offset: int, end: int,
+                   target: str, mainnet: bool) -> (int, int):
+    """Fields shown for the content of a transaction at 'offset', and the end of its content."""
+    fixed = FIXED_TRANSACTIONS.get(transaction_type)
+    if fixed is not None:
+        size, count = fixed
+        return count, _check(offset + size, end)
+
+    if transaction_type == TRANSACTION_TYPES['TRANSFER']:
+        return _count_transfer(data, offset, end, target, mainnet)
+
+    if transaction_type == TRANSACTION_TYPES['MODIFY_MULTISIG_ACCOUNT']:
+        additions, deletions = _read(MULTISIG_HEADER, data, offset, end)
+        # counts, addresses, min approval and min removal
+        offset = _check(offset + MULTISIG_HEADER.size + (additions + deletions) * ADDRESS_SIZE, end)
+        return 4 + additions + deletions, offset
+
+    if transaction_type == TRANSACTION_TYPES['REGISTER_NAMESPACE']:
+        name_size, = _read(NAMESPACE_HEADER, data, offset, end)
+        return 3, _check(offset + NAMESPACE_HEADER.size + name_size, end)
+
+    if transaction_type == TRANSACTION_TYPES['ACCOUNT_METADATA']:
+        value_size, = _read(ACCOUNT_METADATA_HEADER, data, offset, end)
+        return 4, _check(offset + ACCOUNT_METADATA_HEADER.size + value_size, end)
+
+    if transaction_type in (TRANSACTION_TYPES['MOSAIC_METADATA'], TRANSACTION_TYPES['NAMESPACE_METADATA']):
+        value_size, = _read(METADATA_HEADER, data, offset, end)
+        return 5, _check(offset + METADATA_HEADER.size + value_size, end)
+
+    value_size = RESTRICTION_VALUE_SIZES.get(transaction_type)
+    if value_size is not None:
+        additions, deletions = _read(RESTRICTION_HEADER, data, offset, end)
+        offset = _check(offset + RESTRICTION_HEADER.size + (additions + deletions) * value_size, end)
+        # counts, values, operation, direction (not for mosaics) and type
+        count = 5 + additions + deletions
+        if transaction_type == TRANSACTION_TYPES['ACCOUNT_MOSAIC_RESTRICTION']:
+            count -= 1
+        return count, offset
+
+    raise ValueError(f"Unsupported transaction type 0x{transaction_type:04X}")
+
+
+def _count_aggregate(data: bytes, target: str, mainnet: bool, limits: DeviceLimits) -> (int, int):
+    """Fields shown for an aggregate, and the bytes buffered by the device."""
+    payload_size, = _read(AGGREGATE_HEADER, data, COMMON_HEADER.size + TXN_FEE_SIZE, len(data))
+    offset = AGGREGATE_HEADER_SIZE
+    end = _check(offset + payload_size, len(data))
+
+    count = 3  # transaction type, aggregate hash and fee
+    kept = 0
+    largest = 0
+    inner_size = 0
+    while True:
+        size, = _read(INNER_TX_SIZE, data, offset, end)
+        inner_type, = _read(INNER_TX_TYPE, data, offset, end)
+        if inner_type not in INNER_TYPES:
+            raise ValueError(f"Unsupported inner transaction type 0x{inner_type:04X}")
+        padded = size + (-size % ALIGNMENT_BYTES)
+        content_count, _ = _count_content(inner_type, data, offset + INNER_TX_HEADER_SIZE,
+                                          _check(offset + padded, end), target, mainnet)
+        count += 1 + content_count
+        # at most the inner transaction type and content are kept once parsed
+        kept += size - INNER_TX_HEADER_SIZE + INNER_TX_TYPE.size
+        largest = max(largest, padded)
+        offset += padded
+        inner_size += size
+        if inner_size >= payload_size - INNER_TX_HEADER_SIZE:
+            break
+
+    if not limits.streamed_aggregates:
+        return count, len(data)
+    # kept data, the inner transaction being received, and the chunk appended to it
+    return count, min(len(data), AGGREGATE_HEADER_SIZE + kept + largest + limits.max_chunk_size)
+
+
+def predict(data: bytes, target: str = "nanox", mainnet: bool = False) -> Prediction:
+    """Predict the fields shown and the bytes buffered by 'target' to sign a serialized transaction.
+
+    'mainnet' tells whether the signing path is a mainnet one (coin type 10111), which changes
+    the mosaic considered as the network currency. Raises ValueError where the device parser
+    would reject the transaction as invalid.
+    """
+    limits = TARGET_LIMITS[target]
+    transaction_type, = _read(COMMON_HEADER, data, 0, len(data))
+    if transaction_type not in TOP_LEVEL_TYPES:
+        raise ValueError(f"Unsupported transaction type 0x{transaction_type:04X}")
+
+    if transaction_type in AGGREGATE_TYPES:
+        count, buffered_size = _count_aggregate(data, target, mainnet, limits)
+    else:
+        content_count, _ = _count_content(transaction_type, data, COMMON_HEADER.size + TXN_FEE_SIZE,
+                                          len(data), target, mainnet)
+        count = 2 + content_count  # transaction type and fee
+        buffered_size = len(data)
+    return Prediction(count, len(data), buffered_size, limits)
+
+
+def predict_many(transactions: Iterable[bytes], target: str = "nanox",
+                 mainnet: bool = False) -> List[Prediction]:
+    return [predict(data, target, mainnet) for data in transactions]
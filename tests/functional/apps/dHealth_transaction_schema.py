@@ -0,0 +1,594 @@
+# Declarative layouts of the dHealth transaction serialization.
+# Each transaction type is described once, as a list of items, in TRANSACTION_LAYOUTS.
+# Consecutive fixed-size items are fused into a single struct.Struct when this module is
+# imported, and the same compiled layout drives both the builder and the parser.
+
+from operator import itemgetter
+from struct import Struct, pack_into, unpack_from
+
+INNER_TX_HEADER_SIZE = 4 + 4 + 32 + 4 + 1 + 1 + 2
+ALIGNMENT_BYTES = 8
+
+TRANSACTION_TYPES = {
+    'TRANSFER': 0x4154,
+    'REGISTER_NAMESPACE': 0x414E,
+    'ADDRESS_ALIAS': 0x424E,
+    'MOSAIC_ALIAS': 0x434E,
+    'MOSAIC_DEFINITION': 0x414D,
+    'MOSAIC_SUPPLY_CHANGE': 0x424D,
+    'MODIFY_MULTISIG_ACCOUNT': 0x4155,
+    'AGGREGATE_COMPLETE': 0x4141,
+    'AGGREGATE_BONDED': 0x4241,
+    'ACCOUNT_METADATA': 0x4144,
+    'MOSAIC_METADATA': 0x4244,
+    'NAMESPACE_METADATA': 0x4344,
+    'ACCOUNT_ADDRESS_RESTRICTION': 0x4150,
+    'ACCOUNT_MOSAIC_RESTRICTION': 0x4250,
+    'ACCOUNT_OPERATION_RESTRICTION': 0x4350,
+    'MOSAIC_ADDRESS_RESTRICTION': 0x4251,
+    'MOSAIC_GLOBAL_RESTRICTION': 0x4151,
+    'ACCOUNT_KEY_LINK': 0x414C,
+    'NODE_KEY_LINK': 0x424C,
+    'VOTING_KEY_LINK': 0x4143,
+    'VRF_KEY_LINK': 0x4243,
+    'FUND_LOCK': 0x4148,
+    'SECRET_LOCK': 0x4152,
+    'SECRET_PROOF': 0x4252,
+}
+
+TRANSACTION_NAMES = {code: name for name, code in TRANSACTION_TYPES.items()}
+
+UINT8_T = Struct('<B')
+INNER_TX_HEADER = Struct('<I4x32s4xBBH')
+
+
+class TransactionReader:
+    """Cursor over a transaction buffer.
+
+    Fields are unpacked in place from a memoryview, so decoding never copies
+    the remaining bytes of the buffer.
+    """
+
+    __slots__ = ('view', 'offset')
+
+    def __init__(self, buffer, offset=0):
+        self.view = memoryview(buffer)
+        self.offset = offset
+
+    def remaining(self):
+        return len(self.view) - self.offset
+
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.view, self.offset)
+        self.offset += fmt.size
+        return values
+
+    def read(self, length):
+        data = self.view[self.offset:self.offset + length]
+        assert len(data) == length
+        self.offset += length
+        return data
+
+
+# Fixed-size items.
+# Each one contributes its struct format to the run it is fused into, and at most one value.
+# 'context' holds the values that are not part of the JSON fields: element counts and byte
+# lengths read while decoding, and the variable-length data prepared while encoding.
+
+class Field:
+    # Plain fields are read straight from the JSON fields, then passed through convert
+    contextual = False
+    convert = None
+
+    def __init__(self, name, fmt):
+        self.name = name
+        self.fmt = fmt
+
+    def get(self, fields, context):
+        return fields[self.name]
+
+    def store(self, data, context, value):
+        data[self.name] = value
+
+
+class HexField(Field):
+    def __init__(self, name, size):
+        super().__init__(name, f'{size}s')
+        self.size = size
+
+    def convert(self, value):
+        # the struct format would silently pad or truncate a value of another length
+        data = bytes.fromhex(value)
+        if len(data) != self.size:
+            raise ValueError(f"{self.name}: {len(data)} bytes instead of {self.size}")
+        return data
+
+    def get(self, fields, context):
+        return self.convert(fields[self.name])
+
+    def store(self, data, context, value):
+        data[self.name] = value.hex()
+
+
+class TypeField(Field):
+    convert = staticmethod(TRANSACTION_TYPES.__getitem__)
+
+    def __init__(self, name):
+        super().__init__(name, 'H')
+
+    def get(self, fields, context):
+        return TRANSACTION_TYPES[fields[self.name]]
+
+    def store(self, data, context, value):
+        data[self.name] = TRANSACTION_NAMES[value]
+
+
+class Count(Field):
+    """Number of elements of the array 'name', serialized ahead of it."""
+
+    contextual = True
+
+    def get(self, fields, context):
+        return len(fields.get(self.name, []))
+
+    def store(self, data, context, value):
+        context[self.name] = value
+
+
+class Length(Field):
+    """Byte length of the variable item 'name', serialized ahead of it."""
+
+    contextual = True
+
+    def get(self, fields, context):
+        return len(context[self.name])
+
+    def store(self, data, context, value):
+        context[self.name] = value
+
+
+class MessageSize(Length):
+    """Transfer message size: the message type byte plus the payload, or 0 without message."""
+
+    def get(self, fields, context):
+        message = context[self.name]
+        return len(message) + 1 if message else 0
+
+
+class Reserved:
+    name = None
+
+    def __init__(self, size):
+        self.fmt = f'{size}x'
+
+
+class FixedRun:
+    def __init__(self, items):
+        self.struct = Struct('<' + ''.join(item.fmt for item in items))
+        self.size = self.struct.size
+        self.items = [item for item in items if item.name is not None]
+        self.getters = [item.get for item in self.items]
+        # Runs without counts or lengths are read from the JSON fields with a single C call
+        self.lookup = None
+        if not any(item.contextual for item in self.items):
+            names = [item.name for item in self.items]
+            if len(names) > 1:
+                self.lookup = itemgetter(*names)
+            else:
+                self.lookup = lambda fields: tuple(fields[name] for name in names)
+            self.converters = [(index, item.convert) for index, item in enumerate(self.items) if item.convert]
+
+    def measure(self, fields, context):
+        return self.size
+
+    def pack_into(self, buf, offset, fields, context):
+        if self.lookup:
+            values = self.lookup(fields)
+            if self.converters:
+                values = list(values)
+                for index, convert in self.converters:
+                    values[index] = convert(values[index])
+            self.struct.pack_into(buf, offset, *values)
+        else:
+            self.struct.pack_into(buf, offset, *[get(fields, context) for get in self.getters])
+        return offset + self.size
+
+    def decode(self, reader, data, context):
+        for item, value in zip(self.items, reader.unpack(self.struct)):
+            item.store(data, context, value)
+
+
+# Variable-size items.
+# They are measured and packed on their own, after the fixed run holding their count or length.
+
+class ScalarArray:
+    def __init__(self, name, fmt):
+        self.name = name
+        self.fmt = fmt
+        self.size = Struct('<' + fmt).size
+
+    def measure(self, fields, context):
+        return len(fields.get(self.name, [])) * self.size
+
+    def pack_into(self, buf, offset, fields, context):
+        values = fields.get(self.name, [])
+        pack_into(f'<{len(values)}{self.fmt}', buf, offset, *values)
+        return offset + len(values) * self.size
+
+    def decode(self, reader, data, context):
+        count = context[self.name]
+        data[self.name] = list(unpack_from(f'<{count}{self.fmt}', reader.view, reader.offset))
+        reader.offset += count * self.size
+
+
+class HexArray:
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+
+    def measure(self, fields, context):
+        return len(fields.get(self.name, [])) * self.size
+
+    def pack_into(self, buf, offset, fields, context):
+        for value in fields.get(self.name, []):
+            buf[offset:offset + self.size] = bytes.fromhex(value)
+            offset += self.size
+        return offset
+
+    def decode(self, reader, data, context):
+        data[self.name] = [reader.read(self.size).hex() for _ in range(context[self.name])]
+
+
+class RecordArray:
+    def __init__(self, name, *items):
+        self.name = name
+        self.run = FixedRun(items)
+
+    def measure(self, fields, context):
+        return len(fields.get(self.name, [])) * self.run.size
+
+    def pack_into(self, buf, offset, fields, context):
+        for element in fields.get(self.name, []):
+            offset = self.run.pack_into(buf, offset, element, context)
+        return offset
+
+    def decode(self, reader, data, context):
+        elements = []
+        for _ in range(context[self.name]):
+            element = {}
+            self.run.decode(reader, element, context)
+            elements.append(element)
+        data[self.name] = elements
+
+
+class Blob:
+    """Byte string whose length is serialized ahead of it by a Length item."""
+
+    def __init__(self, name, text=False):
+        self.name = name
+        self.text = text
+
+    def prepare(self, fields, context):
+        value = fields[self.name]
+        context[self.name] = value.encode('utf-8') if self.text else bytes.fromhex(value)
+
+    def measure(self, fields, context):
+        return len(context[self.name])
+
+    def pack_into(self, buf, offset, fields, context):
+        value = context[self.name]
+        buf[offset:offset + len(value)] = value
+        return offset + len(value)
+
+    def decode(self, reader, data, context):
+        value = reader.read(context[self.name])
+        data[self.name] = str(value, 'utf-8') if self.text else value.hex()
+
+
+class Message:
+    """Optional transfer message: a type byte followed by the payload."""
+
+    def __init__(self, type_name, name):
+        self.type_name = type_name
+        self.name = name
+
+    def prepare(self, fields, context):
+        message = fields.get(self.name, None)
+        context[self.name] = bytes.fromhex(message) if message else b''
+
+    def measure(self, fields, context):
+        message = context[self.name]
+        return len(message) + 1 if message else 0
+
+    def pack_into(self, buf, offset, fields, context):
+        message = context[self.name]
+        if not message:
+            return offset
+        UINT8_T.pack_into(buf, offset, fields[self.type_name])
+        offset += UINT8_T.size
+        buf[offset:offset + len(message)] = message
+        return offset + len(message)
+
+    def decode(self, reader, data, context):
+        size = context[self.name]
+        if size:
+            data[self.type_name] = reader.unpack(UINT8_T)[0]
+            data[self.name] = reader.read(size - 1).hex()
+
+
+class InnerPayload:
+    """Embedded transactions of an aggregate, measured but not yet packed."""
+
+    __slots__ = ('transactions', 'size')
+
+    def __init__(self):
+        self.transactions = []
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+
+class InnerTransactions:
+    """Embedded transactions of an aggregate, each one padded to ALIGNMENT_BYTES."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def prepare(self, fields, context):
+        payload = InnerPayload()
+        for transaction in fields[self.name]:
+            header = transaction['inner_tx_header']
+            transaction_type = TRANSACTION_TYPES[header['transactionType']]
+            layout = TRANSACTION_LAYOUTS[transaction_type]
+            inner_context = layout.prepare(transaction['fields'])
+            size = INNER_TX_HEADER_SIZE + layout.measure(transaction['fields'], inner_context)
+            padding = -size % ALIGNMENT_BYTES
+            payload.transactions.append((header, transaction_type, layout, transaction['fields'],
+                                         inner_context, size, padding))
+            payload.size += size + padding
+        context[self.name] = payload
+
+    def measure(self, fields, context):
+        return context[self.name].size
+
+    def pack_into(self, buf, offset, fields, context):
+        for header, transaction_type, layout, inner_fields, inner_context, size, padding \
+                in context[self.name].transactions:
+            INNER_TX_HEADER.pack_into(buf, offset,
+                                      size,
+                                      bytes.fromhex(header['signerPublicKey']),
+                                      header['version'],
+                                      header['networkType'],
+                                      transaction_type)
+            offset = layout.pack_into(buf, offset + INNER_TX_HEADER.size, inner_fields, inner_context)
+
+            # Handle alignment
+            buf[offset:offset + padding] = bytes(padding)
+            offset += padding
+        return offset
+
+    def decode(self, reader, data, context):
+        payload = TransactionReader(reader.read(context[self.name]))
+        transactions = []
+        while payload.remaining():
+            size, signerPublicKey, version, networkType, transaction_type = payload.unpack(INNER_TX_HEADER)
+            body = TransactionReader(payload.read(size - INNER_TX_HEADER_SIZE))
+            fields = TRANSACTION_LAYOUTS[transaction_type].decode(body)
+
+            # Handle alignment
+            alignement_size = size % ALIGNMENT_BYTES
+            if alignement_size:
+                payload.read(ALIGNMENT_BYTES - alignement_size)
+
+            transactions.append({
+                'inner_tx_header': {
+                    'signerPublicKey': signerPublicKey.hex(),
+                    'version': version,
+                    'networkType': networkType,
+                    'transactionType': TRANSACTION_NAMES[transaction_type],
+                },
+                'fields': fields
+            })
+        data[self.name] = transactions
+
+
+class Layout:
+    """Compiled layout of a transaction part.
+
+    Encoding happens in three steps, so that callers can pack into a buffer of their own:
+    prepare() converts the variable-length fields once, measure() returns the exact encoded
+    size, and pack_into() writes the encoding at the given offset and returns the end offset.
+    """
+
+    def __init__(self, *items):
+        self.ops = []
+        self.preparers = [item for item in items if hasattr(item, 'prepare')]
+        run = []
+        for item in items:
+            if isinstance(item, (Field, Reserved)):
+                run.append(item)
+                continue
+            if run:
+                self.ops.append(FixedRun(run))
+                run = []
+            self.ops.append(item)
+        if run:
+            self.ops.append(FixedRun(run))
+        self.fixed_size = sum(op.size for op in self.ops if isinstance(op, FixedRun))
+        self.variable = [op for op in self.ops if not isinstance(op, FixedRun)]
+
+    def prepare(self, fields):
+        context = {}
+        for item in self.preparers:
+            item.prepare(fields, context)
+        return context
+
+    def measure(self, fields, context):
+        size = self.fixed_size
+        for op in self.variable:
+            size += op.measure(fields, context)
+        return size
+
+    def pack_into(self, buf, offset, fields, context):
+        for op in self.ops:
+            offset = op.pack_into(buf, offset, fields, context)
+        return offset
+
+    def encode(self, fields):
+        context = self.prepare(fields)
+        buf = bytearray(self.measure(fields, context))
+        self.pack_into(memoryview(buf), 0, fields, context)
+        return bytes(buf)
+
+    def decode(self, reader):
+        data = {}
+        context = {}
+        for op in self.ops:
+            op.decode(reader, data, context)
+        return data
+
+
+COMMON_TXN_HEADER_LAYOUT = Layout(
+    HexField('transactionHash', 32),
+    Field('version', 'B'),
+    Field('networkType', 'B'),
+    TypeField('transactionType'),
+    Field('maxFee', 'Q'),
+    Field('deadline', 'Q'),
+)
+
+TRANSFER_LAYOUT = Layout(
+    HexField('recipient', 24),
+    MessageSize('message', 'H'),
+    Count('mosaicList', 'B'),
+    Reserved(4),
+    Reserved(1),
+    RecordArray('mosaicList', Field('mosaicId', 'Q'), Field('amount', 'Q')),
+    Message('messageType', 'message'),
+)
+
+MOSAIC_DEFINITION_LAYOUT = Layout(
+    Field('mosaicId', 'Q'),
+    Field('duration', 'Q'),
+    Field('nonce', 'I'),
+    Field('flag', 'B'),
+    Field('divisibility', 'B'),
+)
+
+MOSAIC_SUPPLY_CHANGE_LAYOUT = Layout(
+    Field('mosaicId', 'Q'),
+    Field('amount', 'Q'),
+    Field('action', 'B'),
+)
+
+MULTISIG_ACCOUNT_MODIFICATION_LAYOUT = Layout(
+    Field('minRemovalDelta', 'b'),
+    Field('minApprovalDelta', 'b'),
+    Count('addressAdditions', 'B'),
+    Count('addressDeletions', 'B'),
+    Reserved(4),
+    HexArray('addressAdditions', 24),
+    HexArray('addressDeletions', 24),
+)
+
+NAMESPACE_REGISTRATION_LAYOUT = Layout(
+    Field('duration', 'Q'),
+    Field('namespaceId', 'Q'),
+    Field('registrationType', 'B'),
+    Length('namespaceName', 'B'),
+    Blob('namespaceName', text=True),
+)
+
+ACCOUNT_METADATA_LAYOUT = Layout(
+    HexField('address', 24),
+    Field('metadataKey', 'Q'),
+    Field('valueSizeDelta', 'h'),
+    Length('value', 'H'),
+    Blob('value'),
+)
+
+METADATA_LAYOUT = Layout(
+    HexField('address', 24),
+    Field('metadataKey', 'Q'),
+    Field('mosaicNamespaceId', 'Q'),
+    Field('valueSizeDelta', 'h'),
+    Length('value', 'H'),
+    Blob('value'),
+)
+
+ADDRESS_ALIAS_LAYOUT = Layout(
+    Field('namespaceId', 'Q'),
+    HexField('address', 24),
+    Field('aliasAction', 'B'),
+)
+
+MOSAIC_ALIAS_LAYOUT = Layout(
+    Field('namespaceId', 'Q'),
+    Field('mosaicId', 'Q'),
+    Field('aliasAction', 'B'),
+)
+
+
+def account_restriction_layout(array):
+    return Layout(
+        Field('restrictionFlags', 'H'),
+        Count('restrictionAdditions', 'B'),
+        Count('restrictionDeletions', 'B'),
+        Reserved(4),
+        array('restrictionAdditions'),
+        array('restrictionDeletions'),
+    )
+
+
+KEY_LINK_LAYOUT = Layout(
+    HexField('linkedPublicKey', 32),
+    Field('linkAction', 'B'),
+)
+
+VOTING_KEY_LINK_LAYOUT = Layout(
+    HexField('linkedPublicKey', 32),
+    Field('startPoint', 'I'),
+    Field('endPoint', 'I'),
+    Field('linkAction', 'B'),
+)
+
+FUND_LOCK_LAYOUT = Layout(
+    Field('mosaicId', 'Q'),
+    Field('amount', 'Q'),
+    Field('blockDuration', 'Q'),
+    HexField('aggregateBondedHash', 32),
+)
+
+AGGREGATE_LAYOUT = Layout(
+    HexField('transactionHash', 32),
+    Length('transactions', 'I'),
+    Reserved(4),
+    InnerTransactions('transactions'),
+)
+
+TRANSACTION_LAYOUTS = {
+    TRANSACTION_TYPES['TRANSFER']: TRANSFER_LAYOUT,
+    TRANSACTION_TYPES['AGGREGATE_COMPLETE']: AGGREGATE_LAYOUT,
+    TRANSACTION_TYPES['AGGREGATE_BONDED']: AGGREGATE_LAYOUT,
+    TRANSACTION_TYPES['MODIFY_MULTISIG_ACCOUNT']: MULTISIG_ACCOUNT_MODIFICATION_LAYOUT,
+    TRANSACTION_TYPES['REGISTER_NAMESPACE']: NAMESPACE_REGISTRATION_LAYOUT,
+    TRANSACTION_TYPES['ADDRESS_ALIAS']: ADDRESS_ALIAS_LAYOUT,
+    TRANSACTION_TYPES['MOSAIC_ALIAS']: MOSAIC_ALIAS_LAYOUT,
+    TRANSACTION_TYPES['ACCOUNT_ADDRESS_RESTRICTION']:
+        account_restriction_layout(lambda name: HexArray(name, 24)),
+    TRANSACTION_TYPES['ACCOUNT_MOSAIC_RESTRICTION']:
+        account_restriction_layout(lambda name: ScalarArray(name, 'Q')),
+    TRANSACTION_TYPES['ACCOUNT_OPERATION_RESTRICTION']:
+        account_restriction_layout(lambda name: ScalarArray(name, 'H')),
+    TRANSACTION_TYPES['ACCOUNT_KEY_LINK']: KEY_LINK_LAYOUT,
+    TRANSACTION_TYPES['NODE_KEY_LINK']: KEY_LINK_LAYOUT,
+    TRANSACTION_TYPES['VRF_KEY_LINK']: KEY_LINK_LAYOUT,
+    TRANSACTION_TYPES['VOTING_KEY_LINK']: VOTING_KEY_LINK_LAYOUT,
+    TRANSACTION_TYPES['MOSAIC_DEFINITION']: MOSAIC_DEFINITION_LAYOUT,
+    TRANSACTION_TYPES['MOSAIC_SUPPLY_CHANGE']: MOSAIC_SUPPLY_CHANGE_LAYOUT,
+    TRANSACTION_TYPES['FUND_LOCK']: FUND_LOCK_LAYOUT,
+    TRANSACTION_TYPES['ACCOUNT_METADATA']: ACCOUNT_METADATA_LAYOUT,
+    TRANSACTION_TYPES['NAMESPACE_METADATA']: METADATA_LAYOUT,
+    TRANSACTION_TYPES['MOSAIC_METADATA']: METADATA_LAYOUT,
+}
@@ -0,0 +1,278 @@
+# Record and replay of APDU transcripts.
+#
+# For a fixed seed and a given build of the application, keys and Ed25519 signatures are
+# deterministic: the answers of a Speculos run can be recorded once and served again without
+# the emulator. TranscriptRecorder wraps any ragger backend and records each (CLA, INS, P1, P2,
+# data) -> (status, data) exchange; TranscriptReplayer answers them by hash lookup.
+#
+# A packet following another one of the same upload (P1_MASK_ORDER set for INS_SIGN and
+# INS_COSIGN_BATCH) is hashed with the key of the previous exchange, so that identical chunks of
+# different transactions get the answers of their own upload.
+#
+# File layout, big endian:
+#   header:  magic "DHTR" || version (1) || build fingerprint (32) || count (4)
+#   index:   count x (key (16) || record offset (4)), sorted by key
+#   records: status (2) || length (2) || data
+
+import hashlib
+from contextlib import contextmanager
+from pathlib import Path
+from struct import Struct, error as StructError
+from types import TracebackType
+from typing import Dict, Generator, Optional, Tuple, Type
+
+from ragger.backend import BackendInterface, RaisePolicy
+from ragger.backend.stub import StubBackend
+from ragger.error import ExceptionRAPDU
+from ragger.utils import RAPDU
+from ragger.utils.structs import Crop
+
+from .dHealth import INS, P1_MASK_ORDER
+
+TRANSCRIPT_MAGIC = b"DHTR"
+TRANSCRIPT_VERSION = 1
+TRANSCRIPT_HEADER = Struct(">4sB32sI")
+TRANSCRIPT_INDEX_ENTRY = Struct(">16sI")
+TRANSCRIPT_RECORD = Struct(">HH")
+KEY_LENGTH = 16
+NO_FINGERPRINT = bytes(32)
+
+# instructions uploading their data in several packets
+CHAINED_INSTRUCTIONS = (INS.INS_SIGN, INS.INS_COSIGN_BATCH)
+
+
+class TranscriptError(Exception):
+    """Raised when a transcript file can't be read."""
+
+
+class TranscriptMiss(LookupError):
+    """Raised on replay of an APDU which has not been recorded."""
+
+    def __init__(self, apdu: bytes):
+        super().__init__(f"APDU not in the transcript: {apdu.hex()}")
+        self.apdu = apdu
+
+
+def build_fingerprint(elf_path: Path) -> bytes:
+    """SHA-256 of the application binary the transcript is recorded with."""
+    return hashlib.sha256(Path(elf_path).read_bytes()).digest()
+
+
+def transcript_key(apdu: bytes, previous: bytes = b"") -> bytes:
+    """Key of 'apdu', chained to the key of the previous exchange if it continues an upload."""
+    cla, ins, p1, p2 = apdu[:4]
+    digest = hashlib.blake2b(digest_size=KEY_LENGTH)
+    if ins in CHAINED_INSTRUCTIONS and p1 & P1_MASK_ORDER:
+        digest.update(previous)
+    digest.update(bytes([cla, ins, p1, p2]))
+    digest.update(apdu[5:])
+    return digest.digest()
+
+
+class Transcript:
+    """Recorded answers of one build of the application on one device model."""
+
+    def __init__(self, fingerprint: bytes = NO_FINGERPRINT):
+        self.fingerprint = fingerprint
+        self.answers: Dict[bytes, Tuple[int, bytes]] = {}
+
+    def __len__(self) -> int:
+        return len(self.answers)
+
+    def record(self, key: bytes, rapdu: RAPDU) -> None:
+        self.answers[key] = (rapdu.status, bytes(rapdu.data))
+
+    def lookup(self, key: bytes) -> Optional[RAPDU]:
+        answer = self.answers.get(key)
+        return None if answer is None else RAPDU(*answer)
+
+    def save(self, path: Path) -> None:
+        keys = sorted(self.answers)
+        offset = TRANSCRIPT_HEADER.size + TRANSCRIPT_INDEX_ENTRY.size * len(keys)
+        index = bytearray()
+        records = bytearray()
+        for key in keys:
+            status, data = self.answers[key]
+            index += TRANSCRIPT_INDEX_ENTRY.pack(key, offset + len(records))
+            records += TRANSCRIPT_RECORD.pack(status, len(data)) + data
+        header = TRANSCRIPT_HEADER.pack(TRANSCRIPT_MAGIC, TRANSCRIPT_VERSION, self.fingerprint,
+                                        len(keys))
+        Path(path).write_bytes(header + index + records)
+
+    @classmethod
+    def load(cls, path: Path) -> "Transcript":
+        content = memoryview(Path(path).read_bytes())
+        if len(content) < TRANSCRIPT_HEADER.size:
+            raise TranscriptError(f"{path}: truncated header")
+        magic, version, fingerprint, count = TRANSCRIPT_HEADER.unpack_from(content)
+        if magic != TRANSCRIPT_MAGIC or version != TRANSCRIPT_VERSION:
+            raise TranscriptError(f"{path}: not a transcript of version {TRANSCRIPT_VERSION}")
+        transcript = cls(fingerprint)
+        try:
+            for key, offset in TRANSCRIPT_INDEX_ENTRY.iter_unpack(
+                    content[TRANSCRIPT_HEADER.size:
+                            TRANSCRIPT_HEADER.size + TRANSCRIPT_INDEX_ENTRY.size * count]):
+                status, length = TRANSCRIPT_RECORD.unpack_from(content, offset)
+                start = offset + TRANSCRIPT_RECORD.size
+                if start + length > len(content):
+                    raise TranscriptError(f"{path}: truncated record")
+                transcript.answers[key] = (status, bytes(content[start:start + length]))
+        except StructError as error:
+            raise TranscriptError(f"{path}: corrupted index") from error
+        if len(transcript) != count:
+            raise TranscriptError(f"{path}: truncated index")
+        return transcript
+
+
+class TranscriptRecorder(BackendInterface):
+    """Ragger backend recording the exchanges of 'backend' into 'transcript'.
+
+    The raise policy is applied here, once the answer is recorded: the wrapped backend answers
+    every status word.
+    """
+
+    def __init__(self, backend: BackendInterface, transcript: Transcript):
+        super().__init__(backend.device)
+        self.backend = backend
+        self.backend.raise_policy = RaisePolicy.RAISE_NOTHING
+        self.transcript = transcript
+        self._previous = b""
+        self._pending: Optional[bytes] = None
+
+    def __enter__(self) -> "TranscriptRecorder":
+        self.backend.__enter__()
+        return self
+
+    def __exit__(self, exc_type: Optional[Type[BaseException]],
+                 exc_val: Optional[BaseException],
+                 exc_tb: Optional[TracebackType]):
+        return self.backend.__exit__(exc_type, exc_val, exc_tb)
+
+    def _record(self, apdu: bytes, rapdu: RAPDU) -> RAPDU:
+        self._previous = transcript_key(apdu, self._previous)
+        self.transcript.record(self._previous, rapdu)
+        if self.is_raise_required(rapdu):
+            raise ExceptionRAPDU(rapdu.status, rapdu.data)
+        return rapdu
+
+    def handle_usb_reset(self) -> None:
+        self.backend.handle_usb_reset()
+
+    def send_raw(self, data: bytes = b"") -> None:
+        self._pending = bytes(data)
+        self.backend.send_raw(data)
+
+    def receive(self) -> RAPDU:
+        if self._pending is None:
+            raise RuntimeError("No pending APDU to receive")
+        apdu, self._pending = self._pending, None
+        return self._record(apdu, self.backend.receive())
+
+    def exchange_raw(self, data: bytes = b"", tick_timeout: int = 5 * 60 * 10) -> RAPDU:
+        return self._record(bytes(data), self.backend.exchange_raw(data, tick_timeout))
+
+    @contextmanager
+    def exchange_async_raw(self, data: bytes = b"") -> Generator[Optional[bool], None, None]:
+        self._last_async_response = None
+        with self.backend.exchange_async_raw(data) as result:
+            yield result
+        self._last_async_response = self._record(bytes(data), self.backend.last_async_response)
+
+    def right_click(self) -> None:
+        self.backend.right_click()
+
+    def left_click(self) -> None:
+        self.backend.left_click()
+
+    def both_click(self) -> None:
+        self.backend.both_click()
+
+    def finger_touch(self, x: int = 0, y: int = 0, delay: float = 0.5) -> None:
+        self.backend.finger_touch(x, y, delay)
+
+    def finger_swipe(self, x: int = 0, y: int = 0, direction: str = "left",
+                     delay: float = 0.5) -> None:
+        self.backend.finger_swipe(x, y, direction, delay)
+
+    def compare_screen_with_snapshot(self, golden_snap_path: Path, crop: Optional[Crop] = None,
+                                     tmp_snap_path: Optional[Path] = None,
+                                     golden_run: bool = False) -> bool:
+        return self.backend.compare_screen_with_snapshot(golden_snap_path, crop, tmp_snap_path,
+                                                         golden_run)
+
+    def wait_for_screen_change(self, timeout: float = 10.0) -> None:
+        self.backend.wait_for_screen_change(timeout)
+
+    def wait_for_home_screen(self, timeout: float = 10.0) -> None:
+        self.backend.wait_for_home_screen(timeout)
+
+    def compare_screen_with_text(self, text: str) -> bool:
+        return self.backend.compare_screen_with_text(text)
+
+    def wait_for_text_on_screen(self, text: str, timeout: float = 10.0) -> None:
+        self.backend.wait_for_text_on_screen(text, timeout)
+
+    def wait_for_text_not_on_screen(self, text: str, timeout: float = 10.0) -> None:
+        self.backend.wait_for_text_not_on_screen(text, timeout)
+
+    def get_current_screen_content(self):
+        return self.backend.get_current_screen_content()
+
+    def pause_ticker(self) -> None:
+        self.backend.pause_ticker()
+
+    def resume_ticker(self) -> None:
+        self.backend.resume_ticker()
+
+    def send_tick(self) -> None:
+        self.backend.send_tick()
+
+
+class TranscriptReplayer(StubBackend):
+    """Ragger backend answering from 'transcript'. Screens and navigation are no-ops.
+
+    Raises TranscriptMiss for an APDU which has not been recorded.
+    """
+
+    def __init__(self, device, transcript: Transcript):
+        super().__init__(device)
+        self.transcript = transcript
+        self._previous = b""
+        self._pending: Optional[RAPDU] = None
+
+    def __enter__(self) -> "TranscriptReplayer":
+        return self
+
+    def _answer(self, data: bytes) -> RAPDU:
+        apdu = bytes(data)
+        self.apdu_logger.info("=> %s", apdu.hex())
+        self._previous = transcript_key(apdu, self._previous)
+        rapdu = self.transcript.lookup(self._previous)
+        if rapdu is None:
+            raise TranscriptMiss(apdu)
+        self.apdu_logger.info("<= %s%4x", rapdu.data.hex(), rapdu.status)
+        return rapdu
+
+    def _check(self, rapdu: RAPDU) -> RAPDU:
+        if self.is_raise_required(rapdu):
+            raise ExceptionRAPDU(rapdu.status, rapdu.data)
+        return rapdu
+
+    def send_raw(self, data: bytes = b"") -> None:
+        self._pending = self._answer(data)
+
+    def receive(self) -> RAPDU:
+        if self._pending is None:
+            raise RuntimeError("No pending APDU to receive")
+        rapdu, self._pending = self._pending, None
+        return self._check(rapdu)
+
+    def exchange_raw(self, data: bytes = b"", tick_timeout: int = 5 * 60 * 10) -> RAPDU:
+        return self._check(self._answer(data))
+
+    @contextmanager
+    def exchange_async_raw(self, data: bytes = b"") -> Generator[None, None, None]:
+        self._last_async_response = None
+        rapdu = self._answer(data)
+        yield
+        self._last_async_response = self._check(rapdu)
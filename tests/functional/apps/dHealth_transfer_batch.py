@@ -0,0 +1,176 @@
+# Vectorised codec for batches of plain TRANSFER transactions.
+# A transfer without message and with a given number of mosaics has a fixed size, so a batch
+# of them maps onto a NumPy structured array: one row per transaction, one column per field.
+# Whole columns are then encoded or decoded in a single operation. Transactions that do not
+# fit the fixed layout go through the scalar codec of dHealth_transaction_schema.py, and the
+# output is byte-identical to encode_txn_context.
+
+from functools import lru_cache
+
+import numpy as np
+
+from .dHealth_transaction_builder import encode_batch, pack_txn_into, prepare_txn
+from .dHealth_transaction_parser import decode_many
+from .dHealth_transaction_schema import TRANSACTION_TYPES, HexField
+
+TRANSFER = TRANSACTION_TYPES['TRANSFER']
+# converters of the hex columns, rejecting values of another length as the scalar codec does
+TRANSACTION_HASH = HexField('transactionHash', 32)
+RECIPIENT = HexField('recipient', 24)
+
+MOSAIC_DTYPE = np.dtype([
+    ('mosaicId', '<u8'),
+    ('amount', '<u8'),
+])
+
+TRANSFER_HEADER_FIELDS = [
+    ('transactionHash', 'u1', (32,)),
+    ('version', 'u1'),
+    ('networkType', 'u1'),
+    ('transactionType', '<u2'),
+    ('maxFee', '<u8'),
+    ('deadline', '<u8'),
+    ('recipient', 'u1', (24,)),
+    ('messageSize', '<u2'),
+    ('mosaicCount', 'u1'),
+    ('reserved', 'V5'),
+]
+
+
+@lru_cache(maxsize=None)
+def transfer_dtype(mosaic_count):
+    """Structured dtype of a transfer without message, carrying mosaic_count mosaics."""
+    return np.dtype(TRANSFER_HEADER_FIELDS + [('mosaicList', MOSAIC_DTYPE, (mosaic_count,))])
+
+
+def is_fixed_transfer(transaction):
+    return (transaction['common_txn_header']['transactionType'] == 'TRANSFER'
+            and not transaction['fields'].get('message', None))
+
+
+def _hex_column(values, field):
+    data = b''.join(map(field.convert, values))
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, field.size)
+
+
+def to_records(transactions, mosaic_count):
+    """Fill a structured array from fixed-layout transfers, one column at a time."""
+    records = np.zeros(len(transactions), dtype=transfer_dtype(mosaic_count))
+    headers = [transaction['common_txn_header'] for transaction in transactions]
+    fields = [transaction['fields'] for transaction in transactions]
+
+    records['transactionHash'] = _hex_column([header['transactionHash'] for header in headers],
+                                             TRANSACTION_HASH)
+    for name in ('version', 'networkType', 'maxFee', 'deadline'):
+        records[name] = [header[name] for header in headers]
+    records['transactionType'] = TRANSFER
+    records['recipient'] = _hex_column([field['recipient'] for field in fields], RECIPIENT)
+    records['mosaicCount'] = mosaic_count
+    if mosaic_count:
+        mosaics = records['mosaicList']
+        for name in ('mosaicId', 'amount'):
+            mosaics[name] = [[mosaic[name] for mosaic in field['mosaicList']] for field in fields]
+    return records
+
+
+def from_records(records):
+    """Convert a structured array back to the JSON format used by the builder and parser."""
+    transaction_hashes = records['transactionHash'].tobytes()
+    recipients = records['recipient'].tobytes()
+    mosaic_ids = records['mosaicList']['mosaicId'].tolist()
+    amounts = records['mosaicList']['amount'].tolist()
+    transactions = []
+    for index, (version, network_type, max_fee, deadline) in enumerate(zip(records['version'].tolist(),
+                                                                           records['networkType'].tolist(),
+                                                                           records['maxFee'].tolist(),
+                                                                           records['deadline'].tolist())):
+        transactions.append({
+            'common_txn_header': {
+                'transactionHash': transaction_hashes[index * 32:(index + 1) * 32].hex(),
+                'version': version,
+                'networkType': network_type,
+                'transactionType': 'TRANSFER',
+                'maxFee': max_fee,
+                'deadline': deadline,
+            },
+            'fields': {
+                'recipient': recipients[index * 24:(index + 1) * 24].hex(),
+                'mosaicList': [{'mosaicId': mosaic_id, 'amount': amount}
+                               for mosaic_id, amount in zip(mosaic_ids[index], amounts[index])],
+            },
+        })
+    return transactions
+
+
+def encode_transfer_batch(transactions):
+    """Same contract as encode_batch: returns a bytearray and the len(transactions) + 1 boundaries.
+
+    Fixed-layout transfers are grouped by mosaic count and encoded as structured arrays,
+    everything else falls back to the scalar codec.
+    """
+    transactions = list(transactions)
+    groups = {}
+    for index, transaction in enumerate(transactions):
+        if is_fixed_transfer(transaction):
+            groups.setdefault(len(transaction['fields'].get('mosaicList', [])), []).append(index)
+
+    # Homogeneous batch: the array buffer is the encoding
+    if len(groups) == 1 and len(next(iter(groups.values()))) == len(transactions):
+        mosaic_count = next(iter(groups))
+        records = to_records(transactions, mosaic_count)
+        itemsize = records.dtype.itemsize
+        return bytearray(records.tobytes()), list(range(0, (len(transactions) + 1) * itemsize, itemsize))
+
+    if not groups:
+        return encode_batch(transactions)
+
+    rows = {}
+    for mosaic_count, indexes in groups.items():
+        records = to_records([transactions[index] for index in indexes], mosaic_count)
+        data = memoryview(records.tobytes())
+        itemsize = records.dtype.itemsize
+        for row, index in enumerate(indexes):
+            rows[index] = data[row * itemsize:(row + 1) * itemsize]
+
+    prepared = {}
+    offsets = [0]
+    for index, transaction in enumerate(transactions):
+        if index in rows:
+            offsets.append(offsets[-1] + len(rows[index]))
+        else:
+            prepared[index] = prepare_txn(transaction)
+            offsets.append(offsets[-1] + prepared[index][-1])
+
+    buf = bytearray(offsets[-1])
+    view = memoryview(buf)
+    for index, offset in enumerate(offsets[:-1]):
+        if index in rows:
+            view[offset:offsets[index + 1]] = rows[index]
+        else:
+            pack_txn_into(view, offset, prepared[index])
+    return buf, offsets
+
+
+def unpack_transfers(buffer, mosaic_count=1):
+    """View a buffer of fixed-layout transfers as a structured array, without copying it."""
+    dtype = transfer_dtype(mosaic_count)
+    if len(buffer) % dtype.itemsize:
+        raise ValueError(f"buffer size {len(buffer)} is not a multiple of {dtype.itemsize}")
+    records = np.frombuffer(buffer, dtype=dtype)
+    if not ((records['transactionType'] == TRANSFER).all()
+            and (records['messageSize'] == 0).all()
+            and (records['mosaicCount'] == mosaic_count).all()):
+        raise ValueError(f"buffer does not only hold transfers without message and with {mosaic_count} mosaics")
+    return records
+
+
+def decode_transfer_batch(buffer):
+    """Decode concatenated transactions, vectorised when they are all fixed-layout transfers."""
+    view = memoryview(buffer)
+    if len(view) >= transfer_dtype(0).itemsize:
+        first = np.frombuffer(view, dtype=transfer_dtype(0), count=1)[0]
+        try:
+            return from_records(unpack_transfers(view, int(first['mosaicCount'])))
+        except ValueError:
+            pass
+    return list(decode_many(view))
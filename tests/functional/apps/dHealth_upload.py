@@ -0,0 +1,139 @@
+# Encodings of a transaction uploaded in the chunks of a sign request.
+#
+# A compressed upload (P2_COMPRESSED) sends repeated addresses and public keys once, then refers
+# to them by their index, see parse_compressed_txn_chunk() in src/dhp/parse/dhp_parse.c. Each
+# chunk is a sequence of whole tokens:
+#   0x00 - 0x7F  (n - 1) || n bytes   the n bytes
+#   0x80 - 0xBF  index                the value defined with this index
+#   0xC0         24 bytes             the address, defined with the next index
+#   0xC1         32 bytes             the public key, defined with the next index
+# Indexes go round the values the device can store: each definition replaces the oldest one.
+
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+UPLOAD_TOKEN_REFERENCE = 0x80
+UPLOAD_TOKEN_INDEX_MASK = 0x3F
+UPLOAD_TOKEN_DEFINE = {24: 0xC0, 32: 0xC1}
+UPLOAD_DEFINED_LENGTH = {token: length for length, token in UPLOAD_TOKEN_DEFINE.items()}
+MAX_LITERAL_LENGTH = 128
+MAX_REFERENCES = 64
+# Values which can be referred to, longest first
+REFERENCE_LENGTHS = (32, 24)
+
+
+def split_upload(data: bytes, first_capacity: int, capacity: int) -> List[bytes]:
+    """Plain upload: the first chunk holds 'first_capacity' bytes, the others 'capacity'."""
+    chunks = [data[:first_capacity]]
+    for offset in range(first_capacity, len(data), capacity):
+        chunks.append(data[offset:offset + capacity])
+    return chunks
+
+
+def _tokens(data: bytes, max_references: int) -> List[Tuple[bool, bytes]]:
+    """(literal, bytes) items: literal bytes, or a whole definition or reference token."""
+    repeated = Counter(data[offset:offset + length]
+                       for length in REFERENCE_LENGTHS
+                       for offset in range(len(data) - length + 1))
+    indexes: Dict[bytes, int] = {}
+    slots: List[Optional[bytes]] = [None] * max_references
+    next_index = 0
+
+    items: List[Tuple[bool, bytes]] = []
+    literal = bytearray()
+    offset = 0
+    while offset < len(data):
+        values = [data[offset:offset + length] for length in REFERENCE_LENGTHS
+                  if offset + length <= len(data)]
+        token = None
+        for value in values:
+            if value in indexes:
+                token = bytes([UPLOAD_TOKEN_REFERENCE | indexes[value]])
+                break
+        else:
+            for value in values:
+                if repeated[value] > 1:
+                    if slots[next_index] is not None:
+                        del indexes[slots[next_index]]
+                    slots[next_index] = value
+                    indexes[value] = next_index
+                    next_index = (next_index + 1) % max_references
+                    token = bytes([UPLOAD_TOKEN_DEFINE[len(value)]]) + value
+                    break
+
+        if token is None:
+            literal.append(data[offset])
+            offset += 1
+            continue
+        if literal:
+            items.append((True, bytes(literal)))
+            literal.clear()
+        items.append((False, token))
+        offset += len(value)
+    if literal:
+        items.append((True, bytes(literal)))
+    return items
+
+
+def compress_upload(data: bytes, first_capacity: int, capacity: int,
+                    max_references: int) -> List[bytes]:
+    """Compressed upload for a device storing 'max_references' values, in chunks of whole
+    tokens: the first chunk holds up to 'first_capacity' bytes, the others up to 'capacity'.
+    """
+    assert 0 < max_references <= MAX_REFERENCES
+    chunks: List[bytes] = []
+    chunk = bytearray()
+    room = first_capacity
+    for literal, payload in _tokens(data, max_references):
+        if not literal:
+            if len(payload) > room:
+                chunks.append(bytes(chunk))
+                chunk.clear()
+                room = capacity
+            chunk += payload
+            room -= len(payload)
+            continue
+        while payload:
+            if room < 2:
+                chunks.append(bytes(chunk))
+                chunk.clear()
+                room = capacity
+            length = min(len(payload), MAX_LITERAL_LENGTH, room - 1)
+            chunk.append(length - 1)
+            chunk += payload[:length]
+            room -= length + 1
+            payload = payload[length:]
+    chunks.append(bytes(chunk))
+    return chunks
+
+
+def expand_upload(chunks: List[bytes], max_references: int) -> bytes:
+    """Transaction of a compressed upload, as expanded by the device."""
+    slots: List[bytes] = [b""] * max_references
+    next_index = 0
+    data = bytearray()
+    for chunk in chunks:
+        offset = 0
+        while offset < len(chunk):
+            token = chunk[offset]
+            offset += 1
+            if token < UPLOAD_TOKEN_REFERENCE:
+                value = chunk[offset:offset + token + 1]
+                offset += token + 1
+            elif token < UPLOAD_TOKEN_DEFINE[24]:
+                index = token & UPLOAD_TOKEN_INDEX_MASK
+                if index >= max_references or not slots[index]:
+                    raise ValueError(f"Reference to undefined value {index}")
+                value = slots[index]
+            else:
+                length = UPLOAD_DEFINED_LENGTH.get(token)
+                if length is None:
+                    raise ValueError(f"Invalid token 0x{token:02X}")
+                value = chunk[offset:offset + length]
+                offset += length
+                slots[next_index] = value
+                next_index = (next_index + 1) % max_references
+            if offset > len(chunk):
+                raise ValueError("Token split between chunks")
+            data += value
+    return bytes(data)
@@ -0,0 +1,26 @@
+from apps.dHealth import TESTNET, MAINNET
+from apps.dHealth_address import public_key_to_address, public_keys_to_addresses, _ripemd160_python
+
+PUBLIC_KEY = "2E834140FD66CF87B254A693A2C7862C819217B676D3943267156625E816EC6F"
+TESTNET_ADDRESS = "TATNE7Q5BITMUTRRN6IB4I7FLSDRDWZA37JGO5Q"
+
+
+def test_public_key_to_address():
+    address, pretty = public_key_to_address(bytes.fromhex(PUBLIC_KEY), TESTNET)
+    assert pretty == TESTNET_ADDRESS
+    assert len(address) == 24
+    assert address[0] == TESTNET
+
+
+def test_public_keys_to_addresses():
+    addresses = public_keys_to_addresses([PUBLIC_KEY, bytes.fromhex(PUBLIC_KEY)], [TESTNET, MAINNET])
+    assert addresses[0][1] == TESTNET_ADDRESS
+    assert addresses[1][1].startswith("N")
+    assert public_keys_to_addresses([PUBLIC_KEY], TESTNET) == addresses[:1]
+
+
+def test_ripemd160_fallback():
+    # Test vectors of the RIPEMD-160 specification
+    assert _ripemd160_python(b"").hex() == "9c1185a5c5e9fc54612808977ee8f548b2258d31"
+    assert _ripemd160_python(b"abc").hex() == "8eb208f7e05d987a9b044a8e98c6b087f15a0bfc"
+    assert _ripemd160_python(b"a" * 1000).hex() == "aa69deee9a8922e92f8105e007f76110f381e9cf"
@@ -0,0 +1,134 @@
+import asyncio
+import threading
+from time import sleep
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+from ragger.error import ExceptionRAPDU
+
+from apps.dHealth import TESTNET
+from apps.dHealth_async import AsyncdHealthClient, AsyncdHealthPool
+from apps.dHealth_emulator import EmulatorBackend
+from utils import DHEALTH_PATH, load_transaction_from_file
+
+EXCHANGE_TIME = 0.02
+
+
+class Concurrency:
+    """Count the exchanges in progress, and the most seen at once."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+        self.highest = 0
+
+    def __enter__(self):
+        with self._lock:
+            self.active += 1
+            self.highest = max(self.highest, self.active)
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self.active -= 1
+
+
+class SlowBackend(EmulatorBackend):
+    """Emulator whose exchanges take EXCHANGE_TIME, counted by each of 'concurrencies'."""
+
+    def __init__(self, *concurrencies: Concurrency, blocked: threading.Event = None):
+        super().__init__("nanox")
+        self.concurrencies = concurrencies
+        self.blocked = blocked
+
+    def exchange_raw(self, data: bytes = b"", tick_timeout: int = 5 * 60 * 10):
+        for concurrency in self.concurrencies:
+            concurrency.__enter__()
+        try:
+            if self.blocked is not None:
+                assert self.blocked.wait(5)
+            sleep(EXCHANGE_TIME)
+            return super().exchange_raw(data, tick_timeout)
+        finally:
+            for concurrency in self.concurrencies:
+                concurrency.__exit__()
+
+
+def paths(count):
+    return [f"m/44'/1'/{index}'/0'/0'" for index in range(count)]
+
+
+def test_async_client_serialized():
+    concurrency = Concurrency()
+
+    async def run():
+        async with AsyncdHealthClient(SlowBackend(concurrency)) as client:
+            return await asyncio.gather(*(client.get_public_key(path, TESTNET)
+                                          for path in paths(4)))
+
+    public_keys = asyncio.run(run())
+    assert len(set(public_keys)) == 4
+    assert concurrency.highest == 1
+
+
+def test_async_pool_overlaps():
+    overall = Concurrency()
+    devices = [Concurrency(), Concurrency()]
+
+    async def run():
+        clients = [AsyncdHealthClient(SlowBackend(overall, device), f"device-{index}")
+                   for index, device in enumerate(devices)]
+        async with AsyncdHealthPool(clients) as pool:
+            results = await asyncio.gather(*(pool.get_public_key(path, TESTNET)
+                                             for path in paths(8)))
+        return results, pool.stats
+
+    results, stats = asyncio.run(run())
+    assert len(set(results)) == 8
+    assert overall.highest == 2
+    assert all(device.highest == 1 for device in devices)
+    assert all(device_stats.requests > 0 for device_stats in stats.values())
+
+
+def test_async_pool_back_pressure():
+    blocked = threading.Event()
+
+    async def run():
+        client = AsyncdHealthClient(SlowBackend(blocked=blocked))
+        async with AsyncdHealthPool([client], max_pending=1) as pool:
+            first = await pool.submit("get_public_key", DHEALTH_PATH, TESTNET)
+            # let the worker take the first request, which then waits on the device
+            await asyncio.sleep(0.05)
+            second = await pool.submit("get_public_key", DHEALTH_PATH, TESTNET)
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(pool.submit("get_public_key", DHEALTH_PATH, TESTNET), 0.1)
+            blocked.set()
+            return await first, await second, pool.stats[client.name]
+
+    first, second, stats = asyncio.run(run())
+    assert first == second
+    assert stats.requests == 2
+
+
+def test_async_pool_sign_and_stats():
+    transaction = load_transaction_from_file("transfer_transaction.json")
+    reviewed = []
+
+    async def run():
+        clients = [AsyncdHealthClient(EmulatorBackend("nanox"), f"device-{index}")
+                   for index in range(2)]
+        async with AsyncdHealthPool(clients) as pool:
+            public_keys = await asyncio.gather(*(client.get_public_key(DHEALTH_PATH)
+                                                 for client in clients))
+            signature = await pool.sign(DHEALTH_PATH, transaction, reviewed.append)
+            with pytest.raises(ExceptionRAPDU):
+                await pool.sign(DHEALTH_PATH, b"\x00" * 4)
+        return clients, public_keys, signature, pool.stats
+
+    clients, public_keys, signature, stats = asyncio.run(run())
+    assert public_keys[0] == public_keys[1]
+    Ed25519PublicKey.from_public_bytes(public_keys[0]).verify(signature, transaction)
+    # the review callback is given the backend of the client serving the request
+    assert len(reviewed) == 1 and reviewed[0] in [client.backend for client in clients]
+    assert sum(device_stats.requests for device_stats in stats.values()) == 2
+    assert sum(device_stats.failures for device_stats in stats.values()) == 1
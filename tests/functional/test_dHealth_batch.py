@@ -0,0 +1,76 @@
+import json
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+from apps.dHealth import dHealthClient, TESTNET
+from apps.dHealth_batch import export_public_keys, main, prefetch, read_items, sign_transactions
+from apps.dHealth_emulator import EmulatorBackend
+from apps.dHealth_transaction_builder import encode_txn_context
+from utils import CORPUS_DIR, CORPUS_FILES, DHEALTH_PATH, signed_data
+
+
+def test_prefetch_overlaps():
+    started = {item: threading.Event() for item in range(4)}
+
+    def function(item):
+        started[item].set()
+        return item
+
+    results = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for result in prefetch(range(4), function, executor):
+            # the next item is computed while this one is used
+            if result < 3:
+                assert started[result + 1].wait(5)
+            results.append(result)
+    assert results == [0, 1, 2, 3]
+
+
+def test_batch_sign():
+    sources = [str(CORPUS_DIR / transaction_filename) for transaction_filename in CORPUS_FILES]
+    lines = list(read_items(sources)) + ['{"fields": {}}']
+    client = dHealthClient(EmulatorBackend("nanox"))
+    public_key = Ed25519PublicKey.from_public_bytes(client.parse_get_public_key_response(
+        client.send_get_public_key_non_confirm(DHEALTH_PATH).data))
+
+    results = list(sign_transactions(client, DHEALTH_PATH, lines))
+    assert [result["index"] for result in results] == list(range(len(lines)))
+    assert "error" in results[-1]
+    for line, result in zip(lines, results[:-1]):
+        transaction = encode_txn_context(json.loads(line))
+        public_key.verify(bytes.fromhex(result["signature"]), signed_data(transaction))
+        assert result["device_time"] > 0
+
+
+def test_batch_public_keys(tmp_path):
+    client = dHealthClient(EmulatorBackend("nanox"))
+    lines = [json.dumps({"path": DHEALTH_PATH, "count": 9}), "not json",
+             json.dumps({"path": "m/44'/1'/0'/0'/0'", "count": 1})]
+    results = list(export_public_keys(client, lines, TESTNET, str(tmp_path / "keys.sqlite")))
+    assert results[0]["public_keys"] == [key.hex() for key in
+                                         client.get_public_key_range(DHEALTH_PATH, 9, TESTNET)]
+    assert len(results[0]["addresses"]) == 9
+    assert "error" in results[1]
+    assert results[2]["public_keys"] == results[0]["public_keys"][:1]
+
+
+def test_batch_main(tmp_path):
+    output = tmp_path / "results.jsonl"
+    code = main(["--backend", "emulator", "--output", str(output), "public-keys",
+                 "--path", DHEALTH_PATH, "--count", "2"])
+    assert code == 0
+    result, = [json.loads(line) for line in output.read_text().splitlines()]
+    assert result["count"] == 2 and len(result["public_keys"]) == 2
+
+
+def test_batch_backends_not_loaded():
+    # the backends of ragger, and Speculos with them, are only imported once chosen
+    code = "import sys, apps.dHealth_batch; print('ragger.backend' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", code], cwd=Path(__file__).parent,
+                            capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "False"
@@ -0,0 +1,94 @@
+import pytest
+import threading
+from time import sleep
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+from ragger.backend.interface import RaisePolicy
+from ragger.error import ExceptionRAPDU
+
+from apps.dHealth import dHealthClient, ErrorType, CLA
+from apps.dHealth_daemon import DaemonBackend, DaemonError, DeviceDaemon, daemon_stats
+from apps.dHealth_emulator import EmulatorBackend
+from utils import DHEALTH_PATH, load_transaction_from_file
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    daemon = DeviceDaemon(EmulatorBackend("nanox"), tmp_path / "device.sock")
+    daemon.start()
+    yield daemon
+    daemon.stop()
+
+
+def wait_for_waiting_clients(daemon, count):
+    for _ in range(500):
+        if daemon_stats(daemon.socket_path)["waiting"] == count:
+            return
+        sleep(0.01)
+    raise AssertionError(f"{count} clients never queued")
+
+
+def test_daemon_client(daemon):
+    transaction = load_transaction_from_file("transfer_transaction.json")
+    with DaemonBackend(daemon.socket_path) as backend:
+        assert backend.device.name == "nanox"
+        client = dHealthClient(backend)
+        assert client.send_get_version() == (1, 0, 0)
+        public_key = client.parse_get_public_key_response(
+            client.send_get_public_key_non_confirm(DHEALTH_PATH).data)
+        with client.send_async_sign_message(DHEALTH_PATH, transaction):
+            pass
+        Ed25519PublicKey.from_public_bytes(public_key).verify(
+            client.get_async_response().data, transaction)
+        assert len(backend.latencies) >= 4
+        assert all(latency.total >= latency.device for latency in backend.latencies)
+
+        # status words are answered, the raise policy applies on the client
+        with pytest.raises(ExceptionRAPDU) as error:
+            backend.exchange(CLA, 0x7E)
+        assert error.value.status == ErrorType.TRANSACTION_REJECTED
+        backend.raise_policy = RaisePolicy.RAISE_NOTHING
+        assert backend.exchange(CLA, 0x7E).status == ErrorType.TRANSACTION_REJECTED
+
+    # the version is then answered without the device
+    with DaemonBackend(daemon.socket_path) as backend:
+        assert dHealthClient(backend).send_get_version() == (1, 0, 0)
+    stats = daemon_stats(daemon.socket_path)
+    assert stats["cache_hits"] == 1
+    assert stats["instructions"]["INS_GET_VERSION"]["requests"] == 2
+    assert stats["queue"]["requests"] == 2
+
+
+def test_daemon_lease_required(daemon):
+    backend = DaemonBackend(daemon.socket_path)
+    with pytest.raises(DaemonError):
+        dHealthClient(backend).send_get_version()
+
+
+def test_daemon_priorities(daemon):
+    granted = []
+
+    def lease(name, priority):
+        with DaemonBackend(daemon.socket_path, priority):
+            granted.append(name)
+
+    with DaemonBackend(daemon.socket_path) as holder:
+        clients = []
+        for count, (name, priority) in enumerate((("low", 0), ("high", 5)), 1):
+            clients.append(threading.Thread(target=lease, args=(name, priority)))
+            clients[-1].start()
+            wait_for_waiting_clients(daemon, count)
+        dHealthClient(holder).send_get_version()
+    for client in clients:
+        client.join()
+    assert granted == ["high", "low"]
+
+
+def test_daemon_disconnection_releases(daemon):
+    backend = DaemonBackend(daemon.socket_path)
+    backend.__enter__()
+    # the connection is lost without releasing
+    backend._connection.close()
+    with DaemonBackend(daemon.socket_path, priority=1) as other:
+        assert dHealthClient(other).send_get_version() == (1, 0, 0)
@@ -0,0 +1,232 @@
+import pytest
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+from ragger.backend.interface import RaisePolicy, RAPDU
+from ragger.bip import pack_derivation_path
+from ragger.utils import pack_APDU, split_message
+
+from apps.dHealth import (dHealthClient, ErrorType, SigningSession, CLA, INS, MAX_CHUNK_SIZE,
+                          P1_MASK_MORE, P1_MASK_ORDER, P2_ED25519, MAX_PUBLIC_KEY_RANGE,
+                          PACKET_OFFSET, SIGNATURE_LENGTH, TRANSACTION_HASH_LENGTH,
+                          UnsupportedRequestError, derivation_path_range)
+from apps.dHealth_emulator import (EmulatorBackend, HARDENED_INDEX, derive_ed25519_private_key,
+                                   ed25519_public_key)
+from utils import CORPUS_FILES, DHEALTH_PATH, load_transaction_from_file, signed_data
+
+SPECULOS_EXPECTED_PUBLIC_KEY = "f9e5d9f4437cf656ef76da8fa17d38f6"\
+                               "6569ec61cca09b28d7210d0ed18b59f0"
+
+
+@pytest.fixture
+def emulator():
+    return EmulatorBackend("nanox")
+
+
+def test_emulator_version(emulator):
+    client = dHealthClient(emulator)
+    assert client.send_get_version() == (1, 0, 0)
+    limits = client.send_get_limits()
+    assert limits.max_raw_tx == 10000
+    assert limits.resumable_signing
+    assert limits.max_cosign_batch == 0
+    assert limits.max_upload_references == 0
+
+
+# SLIP-10 test vector 1 for ed25519: seed 000102...0f, path, private key, public key
+SLIP10_SEED = bytes(range(16))
+SLIP10_VECTORS = [
+    ([], "2b4be7f19ee27bbf30c667b642d5f4aa69fd169872f8fc3059c08ebae2eb19e7",
+     "a4b2856bfec510abab89753fac1ac0e1112364e7d250545963f135f2a33188ed"),
+    ([0], "68e0fe46dfb67e368c75379acec591dad19df3cde26e63b93a8e704f1dade7a3",
+     "8c8a13df77a28f3445213a0f432fde644acaa215fc72dcdf300d5efaa85d350c"),
+    ([0, 1, 2, 2, 1000000000], "8f94d394a8e8fd6b1bc2f3f49f5c47e385281d5c17e65324b0f62483e37e8793",
+     "3c24da049451555d51a7014a37337aa4e12d41e485abccfa46b47dfb2af54b7a"),
+]
+
+
+@pytest.mark.parametrize("path, private_key, public_key", SLIP10_VECTORS)
+def test_slip10_vectors(path, private_key, public_key):
+    key = derive_ed25519_private_key(SLIP10_SEED, [HARDENED_INDEX | index for index in path])
+    assert key.hex() == private_key
+    assert ed25519_public_key(key).hex() == public_key
+
+
+def test_emulator_public_key(emulator):
+    client = dHealthClient(emulator)
+    public_key = client.parse_get_public_key_response(
+        client.send_get_public_key_non_confirm(DHEALTH_PATH).data)
+    assert public_key.hex() == SPECULOS_EXPECTED_PUBLIC_KEY
+    keys = client.get_public_key_range(DHEALTH_PATH, MAX_PUBLIC_KEY_RANGE + 2)
+    assert keys[0] == public_key
+    for path, key in zip(derivation_path_range(DHEALTH_PATH, len(keys)), keys):
+        assert client.parse_get_public_key_response(
+            client.send_get_public_key_non_confirm(path).data) == key
+
+
+@pytest.mark.parametrize("transaction_filename", CORPUS_FILES)
+def test_emulator_sign_tx(emulator, transaction_filename):
+    transaction = load_transaction_from_file(transaction_filename)
+    client = dHealthClient(emulator)
+    public_key = client.parse_get_public_key_response(
+        client.send_get_public_key_non_confirm(DHEALTH_PATH).data)
+    with client.send_async_sign_message(DHEALTH_PATH, transaction):
+        pass
+    signature = client.get_async_response().data
+    Ed25519PublicKey.from_public_bytes(public_key).verify(signature, signed_data(transaction))
+
+    # the signature does not depend on how the transaction is uploaded
+    session = SigningSession(emulator, DHEALTH_PATH, transaction, chunk_size=32, resumable=True)
+    with session.send_async():
+        pass
+    assert client.get_async_response().data == signature
+
+
+@pytest.mark.parametrize("transaction_filename", CORPUS_FILES)
+def test_signing_session_frames(emulator, transaction_filename):
+    transaction = load_transaction_from_file(transaction_filename)
+    # the frames of the former upload, split by split_message
+    chunks = split_message(pack_derivation_path(DHEALTH_PATH) + transaction, MAX_CHUNK_SIZE)
+    expected = []
+    for index, chunk in enumerate(chunks):
+        p1 = (P1_MASK_ORDER if index else 0) | (P1_MASK_MORE if index < len(chunks) - 1 else 0)
+        expected.append(pack_APDU(CLA, INS.INS_SIGN, p1, P2_ED25519, chunk))
+
+    session = SigningSession(emulator, DHEALTH_PATH, transaction)
+    assert [bytes(frame) for frame in session.frames] == expected
+    with session.send_async():
+        pass
+    assert len(session.timings) == len(session.frames)
+
+
+def test_emulator_resend_packet(emulator):
+    transaction = load_transaction_from_file("transfer_transaction.json")
+    session = SigningSession(emulator, DHEALTH_PATH, transaction, chunk_size=32, resumable=True)
+    emulator.exchange_raw(session.frames[0])
+    rapdu = emulator.exchange_raw(session.frames[1])
+    assert PACKET_OFFSET.unpack(rapdu.data) == (session.ends[1],)
+    rapdu = emulator.exchange_raw(session.frames[1])
+    assert PACKET_OFFSET.unpack(rapdu.data) == (session.ends[1],)
+    emulator.raise_policy = RaisePolicy.RAISE_NOTHING
+    rapdu = emulator.exchange_raw(session.frames[3])
+    assert rapdu.status == ErrorType.INVALID_SIGNING_PACKET_ORDER
+    # the context was reset
+    rapdu = emulator.exchange_raw(session.frames[2])
+    assert rapdu.status == ErrorType.INVALID_SIGNING_PACKET_ORDER
+
+
+class LossyBackend(EmulatorBackend):
+    """Emulator losing the requests of the exchanges numbered in 'lost'."""
+
+    def __init__(self, lost, acknowledgements=None):
+        super().__init__("nanox")
+        self.lost = set(lost)
+        self.acknowledgements = acknowledgements
+        self.exchanges = 0
+
+    def exchange_raw(self, data: bytes = b"", tick_timeout: int = 5 * 60 * 10):
+        self.exchanges += 1
+        if self.exchanges in self.lost:
+            raise ConnectionResetError("request lost")
+        rapdu = super().exchange_raw(data, tick_timeout)
+        if self.acknowledgements is not None and self.exchanges > 1:
+            return RAPDU(rapdu.status, self.acknowledgements)
+        return rapdu
+
+
+def test_signing_session_retries(emulator):
+    transaction = load_transaction_from_file("transfer_transaction.json")
+    client = dHealthClient(emulator)
+    with client.send_async_sign_message(DHEALTH_PATH, transaction):
+        pass
+    signature = client.get_async_response().data
+
+    # one retry is allowed per failure, since the upload progresses in between
+    backend = LossyBackend({2, 4, 6})
+    session = SigningSession(backend, DHEALTH_PATH, transaction, chunk_size=32, resumable=True,
+                             retries=1, backoff=0)
+    with session.send_async():
+        pass
+    assert backend.last_async_response.data == signature
+
+    # but not two in a row
+    backend = LossyBackend({2, 3})
+    session = SigningSession(backend, DHEALTH_PATH, transaction, chunk_size=32, resumable=True,
+                             retries=1, backoff=0)
+    with pytest.raises(ConnectionResetError):
+        session._send_frames()
+
+
+def test_signing_session_stalled():
+    transaction = load_transaction_from_file("transfer_transaction.json")
+    backend = LossyBackend(set())
+    session = SigningSession(backend, DHEALTH_PATH, transaction, chunk_size=32, resumable=True)
+    # the device keeps acknowledging the first frame only
+    backend.acknowledgements = PACKET_OFFSET.pack(session.ends[0])
+    with pytest.raises(ValueError):
+        session._send_frames()
+    assert backend.exchanges == 2
+
+
+class CosignaturesBackend(EmulatorBackend):
+    """Emulator answering COSIGN_BATCH P1_COSIGN_NEXT with 'responses', in turn."""
+
+    def __init__(self, first, responses):
+        super().__init__("nanox")
+        self._last_async_response = RAPDU(0x9000, first)
+        self.responses = list(responses)
+        self.requests = 0
+
+    def exchange_raw(self, data: bytes = b"", tick_timeout: int = 5 * 60 * 10):
+        if data[1] != INS.INS_COSIGN_BATCH:
+            return super().exchange_raw(data, tick_timeout)
+        self.requests += 1
+        return RAPDU(0x9000, self.responses.pop(0) if self.responses else b"")
+
+
+def test_cosignatures(emulator):
+    signatures = [bytes([index]) * SIGNATURE_LENGTH for index in range(7)]
+    backend = CosignaturesBackend(b"".join(signatures[:3]), [b"".join(signatures[3:6]),
+                                                            signatures[6]])
+    assert dHealthClient(backend).get_async_cosignatures(7) == signatures
+    assert backend.requests == 2
+
+    # the device has nothing more to send
+    backend = CosignaturesBackend(b"".join(signatures[:3]), [])
+    with pytest.raises(ValueError):
+        dHealthClient(backend).get_async_cosignatures(7)
+    assert backend.requests == 1
+
+    # nor more than the responses of a batch
+    backend = CosignaturesBackend(signatures[0], [signatures[1]] * 5)
+    with pytest.raises(ValueError):
+        dHealthClient(backend).get_async_cosignatures(7)
+    assert backend.requests == 2
+
+    # without COSIGN_BATCH, nothing is sent
+    with pytest.raises(UnsupportedRequestError):
+        dHealthClient(emulator).cosign_many(DHEALTH_PATH, [bytes(TRANSACTION_HASH_LENGTH)])
+    # nor with hashes of the wrong length
+    with pytest.raises(ValueError, match="hash 1: 31 bytes instead of 32"):
+        dHealthClient(emulator).cosign_many(DHEALTH_PATH, [bytes(32), bytes(31)])
+
+
+def test_emulator_errors(emulator):
+    client = dHealthClient(emulator)
+    emulator.raise_policy = RaisePolicy.RAISE_NOTHING
+    assert emulator.exchange_raw(pack_APDU(0xE1, INS.INS_GET_VERSION, 0, 0, b"")).status == \
+        ErrorType.UNKNOWN_INSTRUCTION_CLASS
+    assert emulator.exchange(CLA, 0x7E).status == ErrorType.TRANSACTION_REJECTED
+    assert emulator.exchange(CLA, INS.INS_GET_VERSION, 2).status == ErrorType.INVALID_P1_OR_P2
+    rapdu = client.send_get_public_key_range(DHEALTH_PATH, MAX_PUBLIC_KEY_RANGE + 1)
+    assert rapdu.status == ErrorType.WRONG_APDU_DATA_LENGTH
+
+    # too large for a Nano S, and not an aggregate
+    transaction = load_transaction_from_file("transfer_transaction.json")
+    transaction = transaction + bytes(800)
+    nanos = EmulatorBackend("nanos")
+    nanos.raise_policy = RaisePolicy.RAISE_NOTHING
+    session = SigningSession(nanos, DHEALTH_PATH, transaction)
+    statuses = [nanos.exchange_raw(frame).status for frame in session.frames]
+    # rejected by the packet going over the buffer
+    assert statuses == [0x9000] * (len(statuses) - 1) + [ErrorType.SIGNING_DATA_TOO_LARGE]
@@ -0,0 +1,67 @@
+import pytest
+
+from ragger.bip import pack_derivation_path
+
+from apps.dHealth import dHealthClient, derivation_path_range, INS, TESTNET
+from apps.dHealth_emulator import EmulatorBackend
+from apps.dHealth_key_cache import PublicKeyCache, derive_range, device_id
+from utils import DHEALTH_PATH
+
+
+class CountingBackend(EmulatorBackend):
+    """Emulator keeping the APDUs it is sent."""
+
+    def __init__(self):
+        super().__init__("nanox")
+        self.apdus = []
+
+    def exchange_raw(self, data: bytes = b"", tick_timeout: int = 5 * 60 * 10):
+        self.apdus.append(data)
+        return super().exchange_raw(data, tick_timeout)
+
+    def ranges(self):
+        # (payload without its count, count) of each INS_GET_PUBLIC_KEY_RANGE APDU
+        return [(apdu[5:-1], apdu[-1]) for apdu in self.apdus
+                if apdu[1] == INS.INS_GET_PUBLIC_KEY_RANGE]
+
+
+@pytest.fixture
+def counting_backend():
+    return CountingBackend()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    with PublicKeyCache(str(tmp_path / "keys.sqlite")) as cache:
+        yield cache
+
+
+def range_payload(derivation_path):
+    return pack_derivation_path(derivation_path) + bytes([TESTNET])
+
+
+def test_derive_range_cached(counting_backend, cache):
+    client = dHealthClient(counting_backend)
+    device = device_id(client)
+    keys = derive_range(client, cache, DHEALTH_PATH, 10, TESTNET, device)
+    assert keys == client.get_public_key_range(DHEALTH_PATH, 10, TESTNET)
+
+    counting_backend.apdus.clear()
+    assert derive_range(client, cache, DHEALTH_PATH, 10, TESTNET, device) == keys
+    assert counting_backend.apdus == []
+
+
+def test_derive_range_missing_runs(counting_backend, cache):
+    client = dHealthClient(counting_backend)
+    device = device_id(client)
+    paths = derivation_path_range(DHEALTH_PATH, 10)
+    expected = client.get_public_key_range(DHEALTH_PATH, 10, TESTNET)
+    cached = [0, 1, 2, 5, 6]
+    cache.put_many(device, {paths[index]: expected[index] for index in cached}, TESTNET)
+
+    counting_backend.apdus.clear()
+    assert derive_range(client, cache, DHEALTH_PATH, 10, TESTNET, device) == expected
+    # only the runs 3-4 and 7-9 are derived
+    assert counting_backend.ranges() == [(range_payload(paths[3]), 2),
+                                         (range_payload(paths[7]), 3)]
+    assert len(counting_backend.apdus) == 2
@@ -1,10 +1,21 @@
+import pytest
+from copy import deepcopy
 from json import load
 
-from apps.dHealth_transaction_parser import decode_txn_context
-from apps.dHealth_transaction_builder import encode_txn_context
+from apps.dHealth_transaction_parser import decode_txn_context, decode_many
+from apps.dHealth_transaction_builder import encode_txn_context, encode_into, encode_batch
+from apps.dHealth_transfer_batch import encode_transfer_batch, decode_transfer_batch
 from utils import CORPUS_DIR, CORPUS_FILES
 
 
+def load_corpus():
+    transactions = []
+    for file in CORPUS_FILES:
+        with open(CORPUS_DIR / file, "r") as f:
+            transactions.append(load(f))
+    return transactions
+
+
 def test_nem_builder_parser():
     for file in CORPUS_FILES:
         print("Testing encoding / decoding on:", file)
@@ -13,3 +24,72 @@ def test_nem_builder_parser():
         transaction_bytes = encode_txn_context(transaction)
         transaction_decoded = decode_txn_context(transaction_bytes)
         assert transaction == transaction_decoded
+
+
+def test_hex_field_length():
+    transaction = next(transaction for transaction in load_corpus()
+                       if transaction["common_txn_header"]["transactionType"] == "TRANSFER")
+    for recipient in ("00" * 23, "00" * 25):
+        wrong = deepcopy(transaction)
+        wrong["fields"]["recipient"] = recipient
+        with pytest.raises(ValueError):
+            encode_txn_context(wrong)
+
+
+def test_decode_many():
+    transactions = load_corpus()
+    buffer = b"".join(encode_txn_context(transaction) for transaction in transactions)
+    assert list(decode_many(buffer)) == transactions
+
+
+def test_encode_batch():
+    transactions = load_corpus()
+    buffer, offsets = encode_batch(transactions)
+    assert len(offsets) == len(transactions) + 1
+    for index, transaction in enumerate(transactions):
+        transaction_bytes = encode_txn_context(transaction)
+        assert buffer[offsets[index]:offsets[index + 1]] == transaction_bytes
+
+        # Packing in place must not rely on a zeroed buffer
+        dirty = bytearray(b"\xff" * (len(transaction_bytes) + 8))
+        assert encode_into(dirty, 4, transaction) == 4 + len(transaction_bytes)
+        assert dirty[4:-4] == transaction_bytes
+
+
+def test_transfer_batch():
+    transactions = load_corpus()
+    transfer = deepcopy(next(transaction for transaction in transactions
+                             if transaction["common_txn_header"]["transactionType"] == "TRANSFER"))
+    transfer["fields"].pop("message", None)
+    transfer["fields"].pop("messageType", None)
+    payroll = []
+    for index in range(100):
+        transaction = deepcopy(transfer)
+        transaction["common_txn_header"]["deadline"] += index
+        transaction["fields"]["recipient"] = f"{index:048x}"
+        transaction["fields"]["mosaicList"][0]["amount"] = index
+        payroll.append(transaction)
+
+    # Homogeneous batch, vectorised both ways
+    buffer, offsets = encode_transfer_batch(payroll)
+    assert (buffer, offsets) == encode_batch(payroll)
+    assert decode_transfer_batch(buffer) == payroll
+
+    # Mixed batch, with the other transactions going through the scalar codec
+    mixed = payroll[:10] + transactions + payroll[10:]
+    buffer, offsets = encode_transfer_batch(mixed)
+    assert (buffer, offsets) == encode_batch(mixed)
+    assert decode_transfer_batch(buffer) == mixed
+
+    # Values of the wrong length are rejected as by the scalar codec, not misaligned
+    for recipient in (f"{0:046x}", f"{0:050x}"):
+        wrong = deepcopy(payroll)
+        wrong[3]["fields"]["recipient"] = recipient
+        with pytest.raises(ValueError, match="recipient: .* bytes instead of 24"):
+            encode_transfer_batch(wrong)
+        with pytest.raises(ValueError, match="recipient: .* bytes instead of 24"):
+            encode_txn_context(wrong[3])
+    wrong = deepcopy(payroll)
+    wrong[0]["common_txn_header"]["transactionHash"] += "00"
+    with pytest.raises(ValueError, match="transactionHash: 33 bytes instead of 32"):
+        encode_transfer_batch(wrong)
@@ -0,0 +1,83 @@
+import pytest
+
+from ragger.backend.interface import RaisePolicy
+from ragger.error import ExceptionRAPDU
+from ragger.utils import RAPDU
+
+from apps.dHealth import dHealthClient, ErrorType, SigningSession
+from apps.dHealth_emulator import EmulatorBackend
+from apps.dHealth_transcript import (Transcript, TranscriptError, TranscriptMiss,
+                                     TranscriptRecorder, TranscriptReplayer, transcript_key)
+from utils import CORPUS_FILES, DHEALTH_PATH, load_transaction_from_file
+
+FINGERPRINT = bytes(range(32))
+
+
+def run_session(backend):
+    """Public key, then signature of every transaction of the corpus, in two upload modes."""
+    client = dHealthClient(backend)
+    answers = [client.send_get_public_key_non_confirm(DHEALTH_PATH).data]
+    for transaction_filename in CORPUS_FILES:
+        transaction = load_transaction_from_file(transaction_filename)
+        with client.send_async_sign_message(DHEALTH_PATH, transaction):
+            pass
+        answers.append(client.get_async_response().data)
+        session = SigningSession(backend, DHEALTH_PATH, transaction, chunk_size=64, resumable=True)
+        with session.send_async():
+            pass
+        answers.append(client.get_async_response().data)
+    return answers
+
+
+def test_transcript_record_and_replay(tmp_path):
+    emulator = EmulatorBackend("nanox")
+    transcript = Transcript(FINGERPRINT)
+    expected = run_session(TranscriptRecorder(emulator, transcript))
+    path = tmp_path / "nanox.transcript"
+    transcript.save(path)
+
+    replayed = Transcript.load(path)
+    assert replayed.fingerprint == FINGERPRINT
+    assert replayed.answers == transcript.answers
+    assert run_session(TranscriptReplayer(emulator.device, replayed)) == expected
+
+
+def test_transcript_status_words(tmp_path):
+    transcript = Transcript(FINGERPRINT)
+    recorder = TranscriptRecorder(EmulatorBackend("nanox"), transcript)
+    transaction = load_transaction_from_file("transfer_transaction.json")
+    session = SigningSession(recorder, DHEALTH_PATH, transaction, chunk_size=32)
+    # the error is recorded before the raise policy of the recorder applies
+    with pytest.raises(ExceptionRAPDU):
+        recorder.exchange_raw(session.frames[1])
+
+    replayer = TranscriptReplayer(recorder.device, transcript)
+    replayer.raise_policy = RaisePolicy.RAISE_NOTHING
+    assert replayer.exchange_raw(session.frames[1]).status == \
+        ErrorType.INVALID_SIGNING_PACKET_ORDER
+    with pytest.raises(TranscriptMiss):
+        replayer.exchange_raw(session.frames[0])
+
+
+def test_transcript_key_chaining():
+    transaction = load_transaction_from_file("transfer_transaction.json")
+    frames = SigningSession(None, DHEALTH_PATH, transaction, chunk_size=32).frames
+    first = transcript_key(frames[0])
+    # a packet continuing an upload depends on the previous ones
+    assert transcript_key(frames[1], first) != transcript_key(frames[1], b"")
+    # other instructions do not
+    assert transcript_key(frames[0], first) == first
+
+
+def test_transcript_corrupted(tmp_path):
+    transcript = Transcript(FINGERPRINT)
+    transcript.record(transcript_key(bytes(5)), RAPDU(0x9000, b"answer"))
+    path = tmp_path / "nanox.transcript"
+    transcript.save(path)
+    content = path.read_bytes()
+    path.write_bytes(content[:-1])
+    with pytest.raises(TranscriptError):
+        Transcript.load(path)
+    path.write_bytes(b"DHTR" + bytes([2]) + content[5:])
+    with pytest.raises(TranscriptError):
+        Transcript.load(path)
@@ -1,12 +1,12 @@
+import pytest
+
 from ragger.backend import SpeculosBackend
 from ragger.backend.interface import RaisePolicy
 from ragger.navigator import NavInsID, NavIns
 
-from apps.dHealth import dHealthClient, ErrorType
-from utils import ROOT_SCREENSHOT_PATH
-
-# Proposed DHP derivation paths for tests ###
-DHEALTH_PATH = "m/44'/1'/0'/0'/0'"
+from apps.dHealth import dHealthClient, ErrorType, MAX_PUBLIC_KEY_RANGE, derivation_path_range
+from apps.dHealth_emulator import EmulatorBackend
+from utils import ROOT_SCREENSHOT_PATH, DHEALTH_PATH
 
 SPECULOS_EXPECTED_PUBLIC_KEY = "f9e5d9f4437cf656ef76da8fa17d38f6"\
                                "6569ec61cca09b28d7210d0ed18b59f0"
@@ -87,3 +87,61 @@ def test_get_public_key_confirm_refused(firmware, backend, navigator, test_name)
             rapdu = client.get_async_response()
             assert rapdu.status == ErrorType.ADDRESS_REJECTED
             assert len(rapdu.data) == 0
+
+
+def test_get_public_key_range(backend):
+    client = dHealthClient(backend)
+    keys = client.get_public_key_range(DHEALTH_PATH, 10)
+    assert len(keys) == 10
+    check_get_public_key_resp(backend, keys[0])
+    for path, key in zip(derivation_path_range(DHEALTH_PATH, 10), keys):
+        response = client.send_get_public_key_non_confirm(path).data
+        assert client.parse_get_public_key_response(response) == key
+
+
+def test_get_public_key_range_profile(backend):
+    client = dHealthClient(backend)
+    client.get_public_key_range(DHEALTH_PATH, 3)
+    profile = client.get_profile()
+    if profile is None:
+        pytest.skip("GET_PROFILE is only answered by debug builds")
+    assert profile.stages["derive"].calls == 3
+    assert profile.stages["derive"].units == 3 * 5
+    assert profile.stages["parse"].calls == 0
+    assert profile.stages["sign"].calls == 0
+    assert profile.stack_usage > 0
+
+
+# Keys of several accounts, in an order that fills, reuses and replaces the account node kept
+# by a DERIVATION_CACHE=1 build: the keys must not depend on it
+DERIVATION_CACHE_PATHS = [
+    "m/44'/1'/0'/0'/0'",
+    "m/44'/1'/0'/0'/1'",
+    "m/44'/1'/0'/1'/0'",
+    "m/44'/1'/1'/0'/0'",
+    "m/44'/1'/1'/0'/5'",
+    "m/44'/1'/0'/0'/1'",
+    "m/44'/1'/0'/0'/2'",
+]
+
+
+def test_get_public_key_derivation_cache(backend):
+    if not isinstance(backend, SpeculosBackend):
+        pytest.skip("The keys are only known for the Speculos seed")
+    client = dHealthClient(backend)
+    # SLIP-10 derivation from the seed, on the host
+    expected = dHealthClient(EmulatorBackend())
+    for path in DERIVATION_CACHE_PATHS:
+        public_key = client.parse_get_public_key_response(
+            client.send_get_public_key_non_confirm(path).data)
+        assert public_key == expected.parse_get_public_key_response(
+            expected.send_get_public_key_non_confirm(path).data), path
+    keys = client.get_public_key_range("m/44'/1'/1'/0'/0'", MAX_PUBLIC_KEY_RANGE)
+    assert keys == expected.get_public_key_range("m/44'/1'/1'/0'/0'", MAX_PUBLIC_KEY_RANGE)
+
+
+def test_get_public_key_range_too_many(backend):
+    client = dHealthClient(backend)
+    backend.raise_policy = RaisePolicy.RAISE_NOTHING
+    rapdu = client.send_get_public_key_range(DHEALTH_PATH, MAX_PUBLIC_KEY_RANGE + 1)
+    assert rapdu.status == ErrorType.WRONG_APDU_DATA_LENGTH
@@ -1,21 +1,14 @@
 import pytest
-from json import load
+
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
 
 from ragger.backend.interface import RaisePolicy
+from ragger.error import ExceptionRAPDU
 from ragger.navigator import NavInsID, NavIns
 
-from apps.dHealth import dHealthClient, ErrorType
-from apps.dHealth_transaction_builder import encode_txn_context
-from utils import ROOT_SCREENSHOT_PATH, CORPUS_DIR, CORPUS_FILES
-
-# Proposed DHP derivation paths for tests ###
-DHEALTH_PATH = "m/44'/1'/0'/0'/0'"
-
-
-def load_transaction_from_file(transaction_filename):
-    with open(CORPUS_DIR / transaction_filename, "r") as f:
-        transaction = load(f)
-    return encode_txn_context(transaction)
+from apps.dHealth import dHealthClient, ErrorType, SigningSession, PACKET_OFFSET
+from apps.dHealth_emulator import AGGREGATE_SIGNING_LENGTH
+from utils import ROOT_SCREENSHOT_PATH, CORPUS_FILES, DHEALTH_PATH, load_transaction_from_file
 
 
 def check_transaction(test_name, firmware, backend, navigator, transaction_filename):
@@ -74,3 +67,78 @@ def test_sign_tx_refused(test_name, firmware, backend, navigator):
             rapdu = client.get_async_response()
             assert rapdu.status == ErrorType.TRANSACTION_REJECTED
             assert len(rapdu.data) == 0
+
+
+def test_sign_tx_too_large(backend):
+    transaction = load_transaction_from_file("transfer_transaction.json")
+    client = dHealthClient(backend)
+    # the message is rejected by the client, before it is sent
+    transaction += bytes(client.limits.max_raw_tx)
+    with pytest.raises(ExceptionRAPDU) as error:
+        client.sign_session(DHEALTH_PATH, transaction)
+    assert error.value.status == ErrorType.SIGNING_DATA_TOO_LARGE
+
+
+def test_sign_tx_resend_packet(backend):
+    transaction = load_transaction_from_file("transfer_transaction.json")
+    session = SigningSession(backend, DHEALTH_PATH, transaction, chunk_size=32, resumable=True)
+    assert len(session.frames) > 3
+    backend.exchange_raw(session.frames[0])
+    rapdu = backend.exchange_raw(session.frames[1])
+    assert PACKET_OFFSET.unpack(rapdu.data) == (session.ends[1],)
+    # a packet sent again is acknowledged without being stored twice
+    rapdu = backend.exchange_raw(session.frames[1])
+    assert PACKET_OFFSET.unpack(rapdu.data) == (session.ends[1],)
+    # a packet after missing data is rejected
+    backend.raise_policy = RaisePolicy.RAISE_NOTHING
+    rapdu = backend.exchange_raw(session.frames[3])
+    assert rapdu.status == ErrorType.INVALID_SIGNING_PACKET_ORDER
+
+
+def test_sign_tx_compressed(firmware, backend, navigator):
+    # the inner transactions have the same signer public key
+    transaction = load_transaction_from_file("create_mosaic.json")
+    client = dHealthClient(backend)
+    session = SigningSession(backend, DHEALTH_PATH, transaction,
+                             max_references=client.limits.max_upload_references)
+    assert session.compressed
+    with session.send_async():
+        if firmware.device.startswith("nano"):
+            navigator.navigate_until_text(NavInsID.RIGHT_CLICK,
+                                          [NavInsID.BOTH_CLICK, NavIns(NavInsID.WAIT, ([0]))],
+                                          "Approve")
+        else:
+            navigator.navigate_until_text(NavInsID.USE_CASE_REVIEW_TAP,
+                                          [NavInsID.USE_CASE_REVIEW_CONFIRM,
+                                           NavInsID.USE_CASE_STATUS_DISMISS],
+                                          "Hold to sign")
+    # the expanded transaction is signed
+    public_key = client.parse_get_public_key_response(
+        client.send_get_public_key_non_confirm(DHEALTH_PATH).data)
+    Ed25519PublicKey.from_public_bytes(public_key).verify(
+        client.get_async_response().data, transaction[:AGGREGATE_SIGNING_LENGTH])
+
+
+def test_cosign_many(firmware, backend, navigator):
+    client = dHealthClient(backend)
+    # two batches, the last one answered in more than one response
+    count = client.limits.max_cosign_batch + 4
+    hashes = [bytes([i % 256]) * 32 for i in range(count)]
+
+    def review():
+        if firmware.device.startswith("nano"):
+            navigator.navigate_until_text(NavInsID.RIGHT_CLICK,
+                                          [NavInsID.BOTH_CLICK, NavIns(NavInsID.WAIT, ([0]))],
+                                          "Approve")
+        else:
+            navigator.navigate_until_text(NavInsID.USE_CASE_REVIEW_TAP,
+                                          [NavInsID.USE_CASE_REVIEW_CONFIRM,
+                                           NavInsID.USE_CASE_STATUS_DISMISS],
+                                          "Hold to sign")
+
+    signatures = client.cosign_many(DHEALTH_PATH, hashes, review)
+    assert len(signatures) == count
+    public_key = client.parse_get_public_key_response(
+        client.send_get_public_key_non_confirm(DHEALTH_PATH).data)
+    for transaction_hash, signature in zip(hashes, signatures):
+        Ed25519PublicKey.from_public_bytes(public_key).verify(signature, transaction_hash)
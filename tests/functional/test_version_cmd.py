@@ -13,3 +13,18 @@ def test_version(backend):
     # Send the GET_VERSION instruction
     version = client.send_get_version()
     assert version == (MAJOR, MINOR, PATCH)
+
+
+# In this test we check that the device reports its limits after its version
+def test_version_limits(firmware, backend):
+    client = dHealthClient(backend)
+    limits = client.send_get_limits()
+    assert limits is not None
+    assert limits.max_raw_tx == (800 if firmware.device == "nanos" else 10000)
+    assert limits.max_chunk_size == 255
+    assert limits.streamed_aggregates
+    assert limits.resumable_signing
+    assert limits.max_cosign_batch == (23 if firmware.device == "nanos" else 59)
+    assert limits.max_upload_references == (4 if firmware.device == "nanos" else 16)
+    # the version alone is still answered
+    assert client.send_get_version() == (MAJOR, MINOR, PATCH)
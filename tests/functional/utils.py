@@ -1,7 +1,31 @@
+from json import load
 from os import listdir
 from pathlib import Path
 
+from apps.dHealth import AGGREGATE_TYPES, TRANSACTION_TYPE, TRANSACTION_TYPE_OFFSET
+from apps.dHealth_emulator import (TESTNET_GENERATION_HASH, AGGREGATE_SIGNING_LENGTH,
+                                   TRANSACTION_HASH_LENGTH)
+from apps.dHealth_transaction_builder import encode_txn_context
+
 ROOT_SCREENSHOT_PATH = Path(__file__).parent.resolve()
 
 CORPUS_DIR = Path(__file__).parent.parent / "corpus"
 CORPUS_FILES = listdir(CORPUS_DIR)
+
+# Proposed DHP derivation paths for tests ###
+DHEALTH_PATH = "m/44'/1'/0'/0'/0'"
+
+
+def load_transaction_from_file(transaction_filename):
+    with open(CORPUS_DIR / transaction_filename, "r") as f:
+        return encode_txn_context(load(f))
+
+
+def signed_data(transaction):
+    """Bytes of 'transaction' signed by the device."""
+    transaction_type, = TRANSACTION_TYPE.unpack_from(transaction, TRANSACTION_TYPE_OFFSET)
+    if transaction_type not in AGGREGATE_TYPES:
+        return transaction
+    if transaction[:TRANSACTION_HASH_LENGTH] == TESTNET_GENERATION_HASH:
+        return transaction[:AGGREGATE_SIGNING_LENGTH]
+    return transaction[:TRANSACTION_HASH_LENGTH]
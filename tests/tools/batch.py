@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+
+import sys
+
+from pathlib import Path
+
+DHEALTH_LIB_DIRECTORY = (Path(__file__).resolve().parent.parent / "functional").resolve().as_posix()
+sys.path.append(DHEALTH_LIB_DIRECTORY)
+from apps.dHealth_batch import main
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+import sys
+import json
+import argparse
+
+from pathlib import Path
+
+DHEALTH_LIB_DIRECTORY = (Path(__file__).resolve().parent.parent / "functional").resolve().as_posix()
+sys.path.append(DHEALTH_LIB_DIRECTORY)
+from apps.dHealth_daemon import DeviceDaemon, DEFAULT_SOCKET_PATH, daemon_stats
+
+parser = argparse.ArgumentParser(description="Share the device between the tools over a Unix socket")
+parser.add_argument('--socket', help="Unix socket to listen on", default=DEFAULT_SOCKET_PATH)
+parser.add_argument('--speculos', help="Serve a Speculos instance of this application binary")
+parser.add_argument('--device', help="Device model emulated by Speculos", default="nanox")
+parser.add_argument('--stats', help="Print the statistics of the running daemon", action="store_true")
+args = parser.parse_args()
+
+if args.stats:
+    print(json.dumps(daemon_stats(args.socket), indent=2))
+    sys.exit(0)
+
+if args.speculos is not None:
+    from ledgered.devices import Devices
+    from ragger.backend import SpeculosBackend
+    backend = SpeculosBackend(args.speculos, Devices.get_by_name(args.device))
+else:
+    from ragger.backend import LedgerCommBackend
+    backend = LedgerCommBackend(None, interface="hid")
+
+with backend:
+    print("Serving the device on", args.socket)
+    DeviceDaemon(backend, args.socket).run()
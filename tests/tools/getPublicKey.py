@@ -5,16 +5,17 @@ import argparse
 
 from pathlib import Path
 
-from ragger.backend import LedgerCommBackend
-
 DHEALTH_LIB_DIRECTORY = (Path(__file__).resolve().parent.parent / "functional").resolve().as_posix()
 sys.path.append(DHEALTH_LIB_DIRECTORY)
 from apps.dHealth import dHealthClient, TESTNET
+from apps.dHealth_address import public_key_to_address
+from apps.dHealth_daemon import open_backend
 
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--path', help="BIP 32 path to use")
 parser.add_argument('--confirm', help="Request confirmation", action="store_true")
+parser.add_argument('--daemon', help="Unix socket of deviceDaemon.py, instead of the USB device")
 args = parser.parse_args()
 
 if args.path is None:
@@ -22,7 +23,7 @@ if args.path is None:
     args.path = "m/44'/1'/0'/0'/0'"
 
 
-with LedgerCommBackend(None, interface="hid") as backend:
+with open_backend(args.daemon) as backend:
     client = dHealthClient(backend)
 
     if args.confirm:
@@ -35,3 +36,4 @@ with LedgerCommBackend(None, interface="hid") as backend:
     public_key = client.parse_get_public_key_response(rapdu.data, TESTNET)
     print("Public Key:", public_key.hex())
     print("length: ", len(public_key.hex()))
+    print("Address:", public_key_to_address(public_key, TESTNET)[1])
@@ -1,18 +1,22 @@
 #!/usr/bin/env python3
 
 import sys
+import argparse
 
 from pathlib import Path
 
-from ragger.backend import LedgerCommBackend
-
 DHEALTH_LIB_DIRECTORY = (Path(__file__).resolve().parent.parent / "functional").resolve().as_posix()
 sys.path.append(DHEALTH_LIB_DIRECTORY)
 from apps.dHealth import dHealthClient
+from apps.dHealth_daemon import open_backend
 
 
 def main():
-    with LedgerCommBackend(None, interface="hid") as backend:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--daemon', help="Unix socket of deviceDaemon.py, instead of the USB device")
+    args = parser.parse_args()
+
+    with open_backend(args.daemon) as backend:
         zilliqa = dHealthClient(backend)
         version = zilliqa.send_get_version()
         print("v{}.{}.{}".format(version[0], version[1], version[2]))
@@ -6,17 +6,17 @@ import argparse
 
 from pathlib import Path
 
-from ragger.backend import LedgerCommBackend
-
 CORPUS_DIR = Path(__file__).parent.parent / "corpus"
 DHEALTH_LIB_DIRECTORY = (Path(__file__).resolve().parent.parent / "functional").resolve().as_posix()
 sys.path.append(DHEALTH_LIB_DIRECTORY)
 from apps.dHealth import dHealthClient
 from apps.dHealth_transaction_builder import encode_txn_context
+from apps.dHealth_daemon import open_backend
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--path', help="BIP 32 path to use")
 parser.add_argument('--file', help="Transaction in JSON format")
+parser.add_argument('--daemon', help="Unix socket of deviceDaemon.py, instead of the USB device")
 args = parser.parse_args()
 
 if args.path is None:
@@ -30,7 +30,7 @@ with open(args.file) as f:
     obj = json.load(f)
 message = encode_txn_context(obj)
 
-with LedgerCommBackend(None, interface="hid") as backend:
+with open_backend(args.daemon) as backend:
     nem = dHealthClient(backend)
 
     with nem.send_async_sign_message(args.path, message):
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# Time to format the review of each transaction of the corpus, with the formatting code of the
+# application built for the host (build/libdhp_parser.so).
+#
+# Host timings do not give the device latency, but their ratios between two builds show the
+# effect of a change of the formatting code on the time to draw review pages.
+
+import argparse
+import json
+import sys
+from ctypes import c_char_p, c_int, c_size_t
+from pathlib import Path
+from time import perf_counter
+
+DHEALTH_LIB_DIRECTORY = (Path(__file__).resolve().parent.parent / "functional").resolve().as_posix()
+sys.path.append(DHEALTH_LIB_DIRECTORY)
+from apps.dHealth_transaction_builder import encode_txn_context
+from dhp_parser import TransactionParser, ParserError
+
+CORPUS_DIR = Path(__file__).resolve().parent.parent / "corpus"
+
+
+class FormatBenchmark(TransactionParser):
+    def __init__(self):
+        super().__init__()
+        self._repeat = self._lib.dhp_parse_and_format_repeat
+        self._repeat.argtypes = [c_char_p, c_size_t, c_size_t, c_char_p, c_char_p]
+        self._repeat.restype = c_int
+
+    def _run(self, data: bytes, iterations: int) -> float:
+        start = perf_counter()
+        count = self._repeat(data, len(data), iterations, self._names, self._values)
+        elapsed = perf_counter() - start
+        if count < 0:
+            raise ParserError(count)
+        return elapsed
+
+    def format_time(self, data: bytes, iterations: int) -> (int, float):
+        """Number of fields of a transaction, and the time to format all of them, in seconds."""
+        fields = len(self.parse(data))
+        # the parse time is measured alone and subtracted
+        elapsed = self._run(data, iterations) - self._run(data, 0)
+        return fields, max(elapsed, 0.0) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time to format the review of transactions")
+    parser.add_argument("--iterations", type=int, default=2000,
+                        help="times the fields of each transaction are formatted")
+    parser.add_argument("files", nargs="*", type=Path,
+                        help="transactions of the corpus (JSON), all of them by default")
+    args = parser.parse_args()
+
+    benchmark = FormatBenchmark()
+    total_fields = 0
+    total_time = 0.0
+    print(f"{'transaction':40} {'fields':>6} {'us/review':>10} {'ns/field':>9}")
+    for path in args.files or sorted(CORPUS_DIR.glob("*.json")):
+        with open(path) as f:
+            data = encode_txn_context(json.load(f))
+        try:
+            fields, elapsed = benchmark.format_time(data, args.iterations)
+        except ParserError as e:
+            print(f"{path.stem:40} {e}")
+            continue
+        total_fields += fields
+        total_time += elapsed
+        print(f"{path.stem:40} {fields:6} {elapsed * 1e6:10.2f} {elapsed * 1e9 / fields:9.1f}")
+    if total_fields:
+        print(f"{'total':40} {total_fields:6} {total_time * 1e6:10.2f} "
+              f"{total_time * 1e9 / total_fields:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
 #pragma once
 
+// Target of the host builds, unless one is given on the command line
+#if !defined(TARGET_NANOS) && !defined(TARGET_NANOX) && !defined(TARGET_NANOS2) && \
+    !defined(TARGET_STAX)
 #define TARGET_NANOX
+#endif
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# ctypes binding to build/libdhp_parser.so: parses and formats transactions in-process,
+# with the same code as the application.
+
+from ctypes import CDLL, POINTER, c_char_p, c_int, c_size_t, create_string_buffer
+from pathlib import Path
+from struct import pack, unpack_from
+from subprocess import run
+from typing import Iterable, List, Optional, Tuple, Union
+
+PARSER_LIBRARY = (Path(__file__).parent / "build/libdhp_parser.so").resolve().as_posix()
+PARSER_BINARY = (Path(__file__).parent / "build/test_transaction_parser").resolve().as_posix()
+
+
+class ParserError(Exception):
+    def __init__(self, code: int):
+        super().__init__(f"Parsing returned {code}")
+        self.code = code
+
+
+class TransactionParser:
+    def __init__(self, library: str = PARSER_LIBRARY):
+        self._lib = CDLL(library)
+        for name in ("dhp_max_field_count", "dhp_max_fieldname_len", "dhp_max_field_len"):
+            getattr(self._lib, name).restype = c_size_t
+        self._parse = self._lib.dhp_parse_and_format
+        self._parse.argtypes = [c_char_p, c_size_t, c_char_p, c_char_p]
+        self._parse.restype = c_int
+        self._parse_chunks = self._lib.dhp_parse_chunks_and_format
+        self._parse_chunks.argtypes = [c_char_p, c_size_t, c_size_t, c_char_p, c_char_p]
+        self._parse_chunks.restype = c_int
+        self._parse_compressed = self._lib.dhp_parse_compressed_chunks_and_format
+        self._parse_compressed.argtypes = [c_char_p, POINTER(c_size_t), c_size_t, c_char_p, c_char_p]
+        self._parse_compressed.restype = c_int
+        self._parse_cosign_batch = self._lib.dhp_parse_cosign_batch_and_format
+        self._parse_cosign_batch.argtypes = [c_char_p, c_size_t, c_char_p, c_char_p]
+        self._parse_cosign_batch.restype = c_int
+        self._lib.dhp_stored_length.restype = c_size_t
+
+        self.max_field_count = self._lib.dhp_max_field_count()
+        self.max_fieldname_len = self._lib.dhp_max_fieldname_len()
+        self.max_field_len = self._lib.dhp_max_field_len()
+
+        # Output buffers are allocated once and reused for every transaction
+        self._names = create_string_buffer(self.max_field_count * self.max_fieldname_len)
+        self._values = create_string_buffer(self.max_field_count * self.max_field_len)
+
+    @staticmethod
+    def _entry(buffer, index: int, size: int) -> str:
+        entry = buffer[index * size:(index + 1) * size]
+        return entry[:entry.index(b"\0")].decode()
+
+    def parse(self, data: bytes, chunk_size: Optional[int] = None) -> List[Tuple[str, str]]:
+        """Return the (name, value) pairs of the fields shown for a transaction.
+
+        With 'chunk_size', the transaction is parsed in chunks of that size, as received in APDUs.
+        """
+        if chunk_size is None:
+            count = self._parse(data, len(data), self._names, self._values)
+        else:
+            assert chunk_size > 0
+            count = self._parse_chunks(data, len(data), chunk_size, self._names, self._values)
+        return self._fields(count)
+
+    def parse_compressed(self, chunks: List[bytes]) -> List[Tuple[str, str]]:
+        """Same as parse(), for the chunks of a compressed upload."""
+        sizes = (c_size_t * len(chunks))(*map(len, chunks))
+        count = self._parse_compressed(b"".join(chunks), sizes, len(chunks), self._names, self._values)
+        return self._fields(count)
+
+    def parse_cosign_batch(self, data: bytes) -> List[Tuple[str, str]]:
+        """Return the (name, value) pairs of the review of a COSIGN_BATCH: count || hashes."""
+        return self._fields(self._parse_cosign_batch(data, len(data), self._names, self._values))
+
+    def _fields(self, count: int) -> List[Tuple[str, str]]:
+        if count < 0:
+            raise ParserError(count)
+        return [(self._entry(self._names, i, self.max_fieldname_len),
+                 self._entry(self._values, i, self.max_field_len))
+                for i in range(count)]
+
+    def stored_length(self) -> int:
+        """Bytes of the last transaction parsed in chunks that were kept in memory."""
+        return self._lib.dhp_stored_length()
+
+
+def parse_batch(transactions: Iterable[bytes],
+                binary: str = PARSER_BINARY) -> List[Union[List[Tuple[str, str]], ParserError]]:
+    """Parse many transactions with a single launch of the test_transaction_parser batch mode.
+
+    Each result is either the (name, value) pairs of a transaction, or its ParserError.
+    """
+    stream = b"".join(pack("<I", len(data)) + data for data in transactions)
+    res = run([binary, "--batch", "-"], input=stream, capture_output=True, check=True)
+
+    results = []
+    output = res.stdout
+    offset = 0
+    while offset < len(output):
+        length, count = unpack_from("<Ii", output, offset)
+        strings = output[offset + 8:offset + 4 + length].split(b"\0")
+        offset += 4 + length
+        if count < 0:
+            results.append(ParserError(count))
+        else:
+            results.append([(strings[2 * i].decode(), strings[2 * i + 1].decode()) for i in range(count)])
+    return results
@@ -0,0 +1,171 @@
+/*
+ * Shared library exposing the transaction parser and formatter to the Python test driver,
+ * so that transactions can be checked in-process, without a process or a file per case.
+ */
+#include <stddef.h>
+#include <stdint.h>
+#include <string.h>
+
+#include "parse/dhp_parse.h"
+#include "format/format.h"
+#include "apdu/global.h"  // FIXME: transaction_context_t should be defined elsewhere
+
+transaction_context_t transactionContext;
+
+size_t dhp_max_field_count(void) {
+    return MAX_FIELD_COUNT;
+}
+
+size_t dhp_max_fieldname_len(void) {
+    return MAX_FIELDNAME_LEN;
+}
+
+size_t dhp_max_field_len(void) {
+    return MAX_FIELD_LEN;
+}
+
+static void format_fields(const fields_array_t *fields, char *names, char *values) {
+    for (int i = 0; i < fields->numFields; i++) {
+        field_t field;
+        fields_get(fields, i, &field);
+        resolve_fieldname(&field, names + (size_t) i * MAX_FIELDNAME_LEN);
+        format_field(&field, values + (size_t) i * MAX_FIELD_LEN);
+    }
+}
+
+/*
+ * Parses a transaction and formats all its fields.
+ *
+ * 'names' and 'values' are MAX_FIELD_COUNT entries of respectively MAX_FIELDNAME_LEN and
+ * MAX_FIELD_LEN characters. The 'i'th field name and value are written as C strings at
+ * entry 'i'.
+ *
+ * Returns the number of fields, or the (negative) parser error.
+ */
+int dhp_parse_and_format(const uint8_t *data, size_t length, char *names, char *values) {
+    buffer_t rawTxData;
+    fields_array_t fields;
+
+    memset(&transactionContext, 0, sizeof(transactionContext));
+
+    rawTxData.ptr = data;
+    rawTxData.size = length;
+    rawTxData.offset = 0;
+
+    int res = parse_txn_context(&rawTxData, &fields);
+    if (res != 0) {
+        return res;
+    }
+
+    format_fields(&fields, names, values);
+    return fields.numFields;
+}
+
+/*
+ * Same as dhp_parse_and_format(), but the transaction is given to the parser in chunks of
+ * 'chunk_size' bytes, as the application receives it in APDUs.
+ */
+int dhp_parse_chunks_and_format(const uint8_t *data,
+                                size_t length,
+                                size_t chunk_size,
+                                char *names,
+                                char *values) {
+    fields_array_t fields;
+
+    memset(&transactionContext, 0, sizeof(transactionContext));
+
+    size_t offset = 0;
+    do {
+        buffer_t chunk;
+        chunk.ptr = data + offset;
+        chunk.size = length - offset < chunk_size ? length - offset : chunk_size;
+        chunk.offset = 0;
+        offset += chunk.size;
+
+        int res = parse_txn_chunk(&chunk, offset == length, &fields);
+        if (res != 0) {
+            return res;
+        }
+    } while (offset < length);
+
+    format_fields(&fields, names, values);
+    return fields.numFields;
+}
+
+/*
+ * Same as dhp_parse_chunks_and_format(), for a compressed upload: 'data' is the 'count'
+ * chunks of the upload, back to back, and 'chunk_sizes' their sizes.
+ */
+int dhp_parse_compressed_chunks_and_format(const uint8_t *data,
+                                           const size_t *chunk_sizes,
+                                           size_t count,
+                                           char *names,
+                                           char *values) {
+    fields_array_t fields;
+
+    memset(&transactionContext, 0, sizeof(transactionContext));
+
+    for (size_t i = 0; i < count; i++) {
+        buffer_t chunk = {data, chunk_sizes[i], 0};
+        data += chunk_sizes[i];
+
+        int res = parse_compressed_txn_chunk(&chunk, i == count - 1, &fields);
+        if (res != 0) {
+            return res;
+        }
+    }
+
+    format_fields(&fields, names, values);
+    return fields.numFields;
+}
+
+/*
+ * Same as dhp_parse_and_format(), for the number of hashes and the hashes of a COSIGN_BATCH.
+ */
+int dhp_parse_cosign_batch_and_format(const uint8_t *data,
+                                      size_t length,
+                                      char *names,
+                                      char *values) {
+    buffer_t rawTxData = {data, length, 0};
+    fields_array_t fields;
+
+    int res = parse_cosign_batch(&rawTxData, &fields);
+    if (res != 0) {
+        return res;
+    }
+
+    format_fields(&fields, names, values);
+    return fields.numFields;
+}
+
+/*
+ * Same as dhp_parse_and_format(), but the fields are formatted 'iterations' times, as when the
+ * review pages are drawn again: see benchmark_format.py.
+ */
+int dhp_parse_and_format_repeat(const uint8_t *data,
+                                size_t length,
+                                size_t iterations,
+                                char *names,
+                                char *values) {
+    buffer_t rawTxData = {data, length, 0};
+    fields_array_t fields;
+
+    memset(&transactionContext, 0, sizeof(transactionContext));
+
+    int res = parse_txn_context(&rawTxData, &fields);
+    if (res != 0) {
+        return res;
+    }
+
+    for (size_t i = 0; i < iterations; i++) {
+        format_fields(&fields, names, values);
+    }
+    return fields.numFields;
+}
+
+/*
+ * Bytes of the last transaction still stored in the transaction context after parsing.
+ */
+size_t dhp_stored_length(void) {
+    return transactionContext.rawTxLength;
+}
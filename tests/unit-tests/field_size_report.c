@@ -0,0 +1,61 @@
+/*
+ * Size report of the fields array, for the target this is built for.
+ *
+ * Sizes are computed for the device, where pointers are 32 bits, and compared with the former
+ * table of unpacked field_t, which referenced their data with a pointer.
+ */
+#include <stdio.h>
+
+#include "parse/dhp_parse.h"
+
+#if defined(TARGET_NANOS)
+#define TARGET_LABEL           "Nano S"
+#define FORMER_MAX_FIELD_COUNT 24
+#elif defined(TARGET_NANOX)
+#define TARGET_LABEL           "Nano X"
+#define FORMER_MAX_FIELD_COUNT 60
+#elif defined(TARGET_NANOS2)
+#define TARGET_LABEL           "Nano S Plus"
+#define FORMER_MAX_FIELD_COUNT 60
+#elif defined(TARGET_STAX)
+#define TARGET_LABEL           "Stax"
+#define FORMER_MAX_FIELD_COUNT 60
+#endif
+
+#define DEVICE_POINTER_SIZE 4
+#define ALIGN(size)         (((size) + DEVICE_POINTER_SIZE - 1) / DEVICE_POINTER_SIZE * DEVICE_POINTER_SIZE)
+
+// field_t: id, dataType, length, data
+#define UNPACKED_FIELD_SIZE ALIGN(1 + 1 + 2 + DEVICE_POINTER_SIZE)
+
+// fields_array_t of field_t: numFields, arr
+static size_t unpacked_fields_size(size_t count) {
+    return ALIGN(1) + count * UNPACKED_FIELD_SIZE;
+}
+
+// fields_array_t of packed_field_t: base, numFields, arr
+static size_t packed_fields_size(size_t count) {
+    return ALIGN(DEVICE_POINTER_SIZE + 1 + count * sizeof(packed_field_t));
+}
+
+int main(void) {
+    size_t former_size = unpacked_fields_size(FORMER_MAX_FIELD_COUNT);
+    size_t fitting = 0;
+    while (packed_fields_size(fitting + 1) <= former_size) {
+        fitting++;
+    }
+
+    printf("%s\n", TARGET_LABEL);
+    printf("  field:        %zu bytes packed, %d bytes unpacked\n",
+           sizeof(packed_field_t),
+           UNPACKED_FIELD_SIZE);
+    printf("  fields array: %zu bytes for %d fields (unpacked: %zu bytes)\n",
+           packed_fields_size(MAX_FIELD_COUNT),
+           MAX_FIELD_COUNT,
+           unpacked_fields_size(MAX_FIELD_COUNT));
+    printf("  former array: %zu bytes for %d fields, which now holds %zu fields\n",
+           former_size,
+           FORMER_MAX_FIELD_COUNT,
+           fitting);
+    return 0;
+}
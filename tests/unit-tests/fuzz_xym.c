@@ -34,10 +34,11 @@ int LLVMFuzzerTestOneInput(const uint8_t *Data, size_t Size) {
     }
 
     for (int i = 0; i < fields->numFields; i++) {
-        field_t *field = &fields->arr[i];
-        resolve_fieldname(field, fieldName);
+        field_t field;
+        fields_get(fields, i, &field);
+        resolve_fieldname(&field, fieldName);
         memset(fieldValue, 0, MAX_FIELD_LEN);
-        format_field(field, fieldValue);
+        format_field(&field, fieldValue);
         printf("%s: %s\n", fieldName, fieldValue);    }
     return 0;
 }
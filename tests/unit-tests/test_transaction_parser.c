@@ -4,6 +4,12 @@
 #include <stdarg.h>
 #include <stdint.h>
 #include <stdlib.h>
+#include <string.h>
+#include <dirent.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
 
 #include "parse/dhp_parse.h"
 #include "format/format.h"
@@ -70,9 +76,10 @@ static void check_transaction_results( const char *filename )
 
     for( int i = 0; i < fields.numFields; i++ )
     {
-        const field_t *field = &fields.arr[i];
-        resolve_fieldname(field, field_name);
-        format_field(field, field_value);
+        field_t field;
+        fields_get(&fields, i, &field);
+        resolve_fieldname(&field, field_name);
+        format_field(&field, field_value);
         
         printf("%s::%s\n", field_name, field_value);
     }
@@ -82,13 +89,151 @@ static void check_transaction_results( const char *filename )
     return;
 }
 
+/*
+ * Batch mode: every transaction is parsed into the same fields array, and its results are
+ * written to stdout as one frame:
+ *   frame length (u32 LE, excluding itself) || result (i32 LE, field count or parser error) ||
+ *   field name '\0' field value '\0' for each field
+ */
+static fields_array_t batch_fields;
+static uint8_t batch_frame[8 + MAX_FIELD_COUNT * (MAX_FIELDNAME_LEN + MAX_FIELD_LEN)];
+
+static void write_le32(uint8_t *dst, uint32_t value) {
+    dst[0] = value & 0xFF;
+    dst[1] = (value >> 8) & 0xFF;
+    dst[2] = (value >> 16) & 0xFF;
+    dst[3] = (value >> 24) & 0xFF;
+}
+
+static void parse_batch_record(const uint8_t *data, size_t size) {
+    buffer_t rawTxData = {data, size, 0};
+    size_t length = 8;
+
+    memset(&transactionContext, 0, sizeof(transactionContext));
+    int res = parse_txn_context(&rawTxData, &batch_fields);
+    if (res == 0) {
+        res = batch_fields.numFields;
+        for (int i = 0; i < batch_fields.numFields; i++) {
+            field_t field;
+            fields_get(&batch_fields, i, &field);
+            resolve_fieldname(&field, (char *) batch_frame + length);
+            length += strlen((char *) batch_frame + length) + 1;
+            format_field(&field, (char *) batch_frame + length);
+            length += strlen((char *) batch_frame + length) + 1;
+        }
+    }
+
+    write_le32(batch_frame, length - 4);
+    write_le32(batch_frame + 4, (uint32_t) res);
+    fwrite(batch_frame, 1, length, stdout);
+}
+
+static void parse_batch_directory(const char *dirname) {
+    struct dirent **entries;
+    int count = scandir(dirname, &entries, NULL, alphasort);
+    if (count < 0) {
+        fprintf(stderr, "Directory opening failed %s\n", dirname);
+        exit(1);
+    }
+
+    char path[4096];
+    for (int i = 0; i < count; i++) {
+        struct stat st;
+        snprintf(path, sizeof(path), "%s/%s", dirname, entries[i]->d_name);
+        if (entries[i]->d_name[0] != '.' && stat(path, &st) == 0 && S_ISREG(st.st_mode)) {
+            if (st.st_size == 0) {
+                parse_batch_record(NULL, 0);
+            } else {
+                int fd = open(path, O_RDONLY);
+                void *data = (fd < 0) ? MAP_FAILED
+                                      : mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+                if (data == MAP_FAILED) {
+                    fprintf(stderr, "File mapping failed %s\n", path);
+                    exit(1);
+                }
+                parse_batch_record(data, st.st_size);
+                munmap(data, st.st_size);
+                close(fd);
+            }
+        }
+        free(entries[i]);
+    }
+    free(entries);
+}
+
+/*
+ * Stdin holds length-prefixed transactions: length (u32 LE) || transaction bytes.
+ * It is mapped when it is a regular file, and read in memory otherwise (e.g. a pipe).
+ */
+static void parse_batch_stream(void) {
+    struct stat st;
+    uint8_t *data = NULL;
+    size_t size = 0;
+    bool mapped = false;
+
+    if (fstat(STDIN_FILENO, &st) == 0 && S_ISREG(st.st_mode) && st.st_size > 0) {
+        data = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, STDIN_FILENO, 0);
+        mapped = (data != MAP_FAILED);
+        size = mapped ? (size_t) st.st_size : 0;
+    }
+    if (!mapped) {
+        size_t capacity = 1 << 16;
+        data = malloc(capacity);
+        size_t n;
+        while (data != NULL && (n = fread(data + size, 1, capacity - size, stdin)) > 0) {
+            size += n;
+            if (size == capacity) {
+                capacity *= 2;
+                data = realloc(data, capacity);
+            }
+        }
+        if (data == NULL) {
+            fprintf(stderr, "Malloc failed %zu\n", size);
+            exit(1);
+        }
+    }
+
+    size_t offset = 0;
+    while (offset < size) {
+        if (size - offset < 4) {
+            fprintf(stderr, "Truncated record length at offset %zu\n", offset);
+            exit(1);
+        }
+        const uint8_t *p = data + offset;
+        size_t length = p[0] | (p[1] << 8) | (p[2] << 16) | ((size_t) p[3] << 24);
+        offset += 4;
+        if (size - offset < length) {
+            fprintf(stderr, "Truncated record at offset %zu\n", offset);
+            exit(1);
+        }
+        parse_batch_record(data + offset, length);
+        offset += length;
+    }
+
+    if (mapped) {
+        munmap(data, size);
+    } else {
+        free(data);
+    }
+}
+
 int main(int argc, char *argv[]) {
+    if (argc == 3 && strcmp(argv[1], "--batch") == 0) {
+        if (strcmp(argv[2], "-") == 0) {
+            parse_batch_stream();
+        } else {
+            parse_batch_directory(argv[2]);
+        }
+        return 0;
+    }
+
     if (argc != 2) {
         fprintf(stderr, "Usage:./test_transaction_parser.c <transaction_bytes_file>\n");
+        fprintf(stderr, "      ./test_transaction_parser.c --batch <directory | - (length-prefixed stdin)>\n");
         exit(1);
     }
 
     check_transaction_results(argv[1]);
 
     return 0;
-}
\ No newline at end of file
+}
@@ -4,16 +4,17 @@ import sys
 import json
 
 from pathlib import Path
-from subprocess import run
 
 
 DHEALTH_LIB_DIRECTORY = (Path(__file__).resolve().parent.parent / "functional").resolve().as_posix()
 sys.path.append(DHEALTH_LIB_DIRECTORY)
 from apps.dHealth_transaction_builder import encode_txn_context
+from apps.dHealth_preflight import predict
+from apps.dHealth_upload import compress_upload
+from dhp_parser import TransactionParser, ParserError, parse_batch
 
 CORPUS_DIR = Path(__file__).resolve().parent.parent / "corpus"
-PARSER_BINARY = (Path(__file__).parent / "build/test_transaction_parser").resolve().as_posix()
-TEMP_TXN_FILE = (Path(__file__).parent / "temp_txn.raw").resolve().as_posix()
+PARSER = TransactionParser()
 
 
 TESTS_CASES = {
@@ -263,18 +264,13 @@ def test_parsing(filename, expected):
 
     tx_data = encode_txn_context(transaction)
 
-    with open(TEMP_TXN_FILE, 'wb') as f:
-        f.write(tx_data)
-
-    cmd = [PARSER_BINARY, TEMP_TXN_FILE]
-    res = run(cmd, capture_output=True)
-    status = res.returncode
-
-    if status != 0:
-        print("[  ERROR   ] ", res.stderr)
+    status = 0
+    try:
+        received = PARSER.parse(tx_data)
+    except ParserError as e:
+        print("[  ERROR   ] ", e)
+        status = 1
     else:
-        parsed = res.stdout.decode().strip()
-        received = [pair.split("::") for pair in parsed.split("\n")]
         if not assert_equal(len(received), len(expected), "number of fields"):
             status = 1
         else:
@@ -293,10 +289,180 @@ def test_parsing(filename, expected):
     return status
 
 
+def test_batch_parsing():
+    print("[ RUN      ] ", "batch mode")
+    transactions = []
+    for filename in TESTS_CASES:
+        with open(CORPUS_DIR / filename) as f:
+            transactions.append(encode_txn_context(json.load(f)))
+
+    status = 0
+    for filename, tx_data, received in zip(TESTS_CASES, transactions, parse_batch(transactions)):
+        if not assert_equal(received, PARSER.parse(tx_data), f"batch results of {filename}"):
+            status = 1
+
+    if status != 0:
+        print("[  FAILED  ] ", "batch mode")
+    else:
+        print("[       OK ] ", "batch mode")
+    return status
+
+
+def test_chunked_parsing():
+    print("[ RUN      ] ", "chunked parsing")
+    status = 0
+    for filename in TESTS_CASES:
+        with open(CORPUS_DIR / filename) as f:
+            tx_data = encode_txn_context(json.load(f))
+        for chunk_size in (1, 7, 255):
+            if not assert_equal(PARSER.parse(tx_data, chunk_size), PARSER.parse(tx_data),
+                                f"chunked results of {filename} ({chunk_size} bytes chunks)"):
+                status = 1
+
+    # Aggregates are not buffered: their cosignatures are dropped, and only the data of the
+    # fields of their inner transactions is kept
+    with open(CORPUS_DIR / "create_mosaic.json") as f:
+        tx_data = encode_txn_context(json.load(f))
+    tx_data += bytes(104) * 200  # cosignatures
+    if not assert_equal(PARSER.parse(tx_data, 255), PARSER.parse(tx_data), "chunked aggregate results"):
+        status = 1
+    if PARSER.stored_length() >= 200:
+        print(f"[  ERROR   ] {PARSER.stored_length()} bytes of an aggregate were kept")
+        status = 1
+
+    if status != 0:
+        print("[  FAILED  ] ", "chunked parsing")
+    else:
+        print("[       OK ] ", "chunked parsing")
+    return status
+
+
+def test_field_count_prediction():
+    print("[ RUN      ] ", "field count prediction")
+    status = 0
+    transactions = {}
+    for path in sorted(CORPUS_DIR.glob("*.json")):
+        with open(path) as f:
+            transactions[path.name] = encode_txn_context(json.load(f))
+
+    # Many mosaics and restriction values, one field per entry
+    with open(CORPUS_DIR / "transfer_transaction_not_dhp.json") as f:
+        transaction = json.load(f)
+    transaction["fields"]["mosaicList"] = [
+        {"mosaicId": 0x72C0212E67A08BCE if i % 2 else i + 1, "amount": i} for i in range(12)]
+    transactions["transfer with 12 mosaics"] = encode_txn_context(transaction)
+    with open(CORPUS_DIR / "account_address_restriction.json") as f:
+        transaction = json.load(f)
+    transaction["fields"]["restrictionDeletions"] = transaction["fields"]["restrictionAdditions"] * 7
+    transactions["restriction with 8 addresses"] = encode_txn_context(transaction)
+
+    for name, tx_data in transactions.items():
+        try:
+            expected = len(PARSER.parse(tx_data))
+        except ParserError as e:
+            print(f"[  ERROR   ] {name}: {e}")
+            status = 1
+            continue
+        prediction = predict(tx_data, "nanox")
+        if not assert_equal(prediction.field_count, expected, f"predicted fields of {name}"):
+            status = 1
+        if not assert_equal(prediction.raw_size, len(tx_data), f"predicted size of {name}"):
+            status = 1
+
+    if status != 0:
+        print("[  FAILED  ] ", "field count prediction")
+    else:
+        print("[       OK ] ", "field count prediction")
+    return status
+
+
+def test_compressed_parsing():
+    print("[ RUN      ] ", "compressed parsing")
+    status = 0
+    for filename in TESTS_CASES:
+        with open(CORPUS_DIR / filename) as f:
+            tx_data = encode_txn_context(json.load(f))
+        # small chunks split literal runs, and hold few tokens
+        for capacity, references in ((234, 16), (40, 4)):
+            chunks = compress_upload(tx_data, capacity, capacity, references)
+            if not assert_equal(PARSER.parse_compressed(chunks), PARSER.parse(tx_data),
+                                f"compressed results of {filename} ({capacity} bytes chunks)"):
+                status = 1
+
+    # references to values which are not defined
+    for chunks in ([bytes([0x80])], [bytes([0xC0]) + bytes(24), bytes([0x81])], [bytes([0xC1]) + bytes(8)]):
+        try:
+            PARSER.parse_compressed(chunks)
+        except ParserError as e:
+            if not assert_equal(e.code, -2, "error of an invalid compressed upload"):
+                status = 1
+        else:
+            print("[  ERROR   ] Invalid compressed upload was parsed")
+            status = 1
+
+    if status != 0:
+        print("[  FAILED  ] ", "compressed parsing")
+    else:
+        print("[       OK ] ", "compressed parsing")
+    return status
+
+
+def test_cosign_batch_parsing():
+    print("[ RUN      ] ", "cosign batch")
+    status = 0
+    hashes = [bytes([i]) * 32 for i in range(1, 4)]
+    expected = [("Cosignatures", "3")] + [("Agg. Tx Hash", h.hex().upper()) for h in hashes]
+    if not assert_equal(PARSER.parse_cosign_batch(bytes([3]) + b"".join(hashes)), expected,
+                        "cosign batch fields"):
+        status = 1
+
+    # missing or extra hash data, no hash, too many hashes to show
+    max_hashes = PARSER.max_field_count
+    for data, code in ((bytes([3]) + b"".join(hashes)[:-1], -2),
+                       (bytes([2]) + b"".join(hashes), -2),
+                       (bytes([0]), -2),
+                       (b"", -1),
+                       (bytes([max_hashes]) + bytes(32 * max_hashes), -3)):
+        try:
+            PARSER.parse_cosign_batch(data)
+        except ParserError as e:
+            if not assert_equal(e.code, code, f"error of a {len(data)} bytes cosign batch"):
+                status = 1
+        else:
+            print(f"[  ERROR   ] {len(data)} bytes cosign batch was parsed")
+            status = 1
+
+    if status != 0:
+        print("[  FAILED  ] ", "cosign batch")
+    else:
+        print("[       OK ] ", "cosign batch")
+    return status
+
+
 status = 0
 for filename, expected in TESTS_CASES.items():
     res = test_parsing(filename, expected)
     if res != 0:
         status = res
 
+res = test_batch_parsing()
+if res != 0:
+    status = res
+
+res = test_chunked_parsing()
+if res != 0:
+    status = res
+
+res = test_field_count_prediction()
+if res != 0:
+    status = res
+
+res = test_compressed_parsing()
+if res != 0:
+    status = res
+
+res = test_cosign_batch_parsing()
+if res != 0:
+    status = res
+
 exit(status)